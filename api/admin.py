@@ -0,0 +1,64 @@
+from typing import Optional
+from fastapi import APIRouter, Query, Depends
+from core.cache import NAMESPACES, response_cache
+from core.deadlines import deadline_stats
+from core.security import api_key_auth
+from db.breaker import db_breaker
+from db.coalesce import card_queries
+
+NAMESPACE_NAMES = list(dict.fromkeys(namespace for _, namespace in NAMESPACES))
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(api_key_auth)],
+)
+
+
+@router.get("/cache", summary="Get response cache statistics")
+def get_cache_stats():
+    """
+    Returns the response cache hits, misses, stores and invalidations of this
+    worker, with the backend in use and its size when the backend reports it.
+    'card_queries' has the fresh/stale/loaded counts of the card list query cache,
+    and how many requests shared another request's query.
+    """
+    return {**response_cache.stats(), "card_queries": card_queries.stats()}
+
+
+@router.delete("/cache", summary="Purge the response cache")
+def purge_cache(
+    namespace: Optional[str] = Query(
+        None,
+        pattern="^(" + "|".join(NAMESPACE_NAMES) + ")$",
+        description="Only purge this namespace: " + ", ".join(NAMESPACE_NAMES),
+    ),
+):
+    """
+    Invalidates cached responses, in every worker sharing the cache backend.
+    All namespaces are purged unless one is given.
+    """
+    purged = response_cache.purge([namespace] if namespace else None)
+    if namespace in (None, "cards"):
+        card_queries.clear()
+    return {"message": "Cache purged", "namespaces": purged}
+
+
+@router.get("/database", summary="Get database circuit breaker state")
+def get_database_state():
+    """
+    Returns the state of this worker's database circuit breaker (closed, open or
+    half_open), its consecutive failures and how many connections it rejected.
+    While it is not closed, catalog reads are served from memory with an
+    X-Data-Stale header.
+    """
+    return db_breaker.stats()
+
+
+@router.get("/deadlines", summary="Get request deadlines and timeouts")
+def get_deadlines():
+    """
+    Returns the request deadline of each route prefix and, per route, how many
+    requests of this worker were answered with 504 after exceeding it.
+    """
+    return deadline_stats.stats()
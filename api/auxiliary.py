@@ -1,5 +1,8 @@
+import time
 from fastapi import APIRouter, Depends, HTTPException
 from core.security import api_key_auth
+from db.breaker import db_breaker, mark_stale
+from db.catalog import get_catalog
 from db.sql import (
     get_all_bts,
     get_all_colors,
@@ -24,106 +27,127 @@ router = APIRouter(
 )
 
 
+def _catalog_aux(table):
+    """Returns an auxiliary table of the catalog, marked stale (X-Data-Stale), or answers 503."""
+    catalog = get_catalog()
+    if catalog is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    mark_stale(time.time() - catalog.built_at)
+    return catalog.aux[table]
+
+
+def _aux_table(table, loader):
+    """
+    Reads an auxiliary table, or takes it from the catalog while the database
+    circuit breaker is open or when the read fails. Tables taken from the catalog
+    are marked stale (X-Data-Stale), so they are not cached as fresh data.
+    """
+    if db_breaker.available:
+        rows = loader()
+        if rows is not None:
+            return rows
+    return _catalog_aux(table)
+
+
+def _aux_row(table, row_id, loader, detail):
+    """
+    Reads an auxiliary table row by id, or takes it from the catalog (marked stale)
+    while the database circuit breaker is open or when the read fails.
+
+    Args:
+        detail (str): Detail of the 404 answered when there is no such row.
+    """
+    if db_breaker.available:
+        row = loader(row_id)
+        if row is not None:
+            if not row:
+                raise HTTPException(status_code=404, detail=detail)
+            return row
+    for row in _catalog_aux(table):
+        if row["id"] == row_id:
+            return row
+    raise HTTPException(status_code=404, detail=detail)
+
+
 @router.get("/bts", summary="Get all BT sets")
 def get_all_bts_endpoint():
     """Retrieves all available BT (Booster Set) information"""
-    return get_all_bts()
+    return _aux_table("bts", get_all_bts)
 
 
 @router.get("/colors", summary="Get all colors")
 def get_all_colors_endpoint():
     """Retrieves all available card colors"""
-    return get_all_colors()
+    return _aux_table("colors", get_all_colors)
 
 
 @router.get("/card-types", summary="Get all card types")
 def get_all_card_types_endpoint():
     """Retrieves all available card types (Digimon, Option, Tamer, etc.)"""
-    return get_all_card_types()
+    return _aux_table("card_types", get_all_card_types)
 
 
 @router.get("/rarities", summary="Get all rarities")
 def get_all_rarities_endpoint():
     """Retrieves all available card rarity levels"""
-    return get_all_rarities()
+    return _aux_table("rarities", get_all_rarities)
 
 
 @router.get("/stages", summary="Get all evolution stages")
 def get_all_stages_endpoint():
     """Retrieves all available Digimon evolution stages"""
-    return get_all_stages()
+    return _aux_table("stages", get_all_stages)
 
 
 @router.get("/attributes", summary="Get all attributes")
 def get_all_attributes_endpoint():
     """Retrieves all available Digimon attributes"""
-    return get_all_attributes()
+    return _aux_table("attributes", get_all_attributes)
 
 
 @router.get("/types", summary="Get all Digimon types")
 def get_all_types_endpoint():
     """Retrieves all available Digimon types (Dragon, Beast, etc.)"""
-    return get_all_types()
+    return _aux_table("types", get_all_types)
 
 
 @router.get("/bts/{bt_id}", summary="Get BT set by ID")
 def get_bt(bt_id: int):
     """Retrieves a specific BT set by its ID"""
-    bt = get_bt_by_id(bt_id)
-    if not bt:
-        raise HTTPException(status_code=404, detail="BT set not found")
-    return bt
+    return _aux_row("bts", bt_id, get_bt_by_id, "BT set not found")
 
 
 @router.get("/colors/{color_id}", summary="Get color by ID")
 def get_color(color_id: int):
     """Retrieves a specific color by its ID"""
-    color = get_color_by_id(color_id)
-    if not color:
-        raise HTTPException(status_code=404, detail="Color not found")
-    return color
+    return _aux_row("colors", color_id, get_color_by_id, "Color not found")
 
 
 @router.get("/card-types/{card_type_id}", summary="Get card type by ID")
 def get_card_type(card_type_id: int):
     """Retrieves a specific card type by its ID"""
-    card_type = get_card_type_by_id(card_type_id)
-    if not card_type:
-        raise HTTPException(status_code=404, detail="Card type not found")
-    return card_type
+    return _aux_row("card_types", card_type_id, get_card_type_by_id, "Card type not found")
 
 
 @router.get("/rarities/{rarity_id}", summary="Get rarity by ID")
 def get_rarity(rarity_id: int):
     """Retrieves a specific rarity by its ID"""
-    rarity = get_rarity_by_id(rarity_id)
-    if not rarity:
-        raise HTTPException(status_code=404, detail="Rarity not found")
-    return rarity
+    return _aux_row("rarities", rarity_id, get_rarity_by_id, "Rarity not found")
 
 
 @router.get("/stages/{stage_id}", summary="Get stage by ID")
 def get_stage(stage_id: int):
     """Retrieves a specific evolution stage by its ID"""
-    stage = get_stage_by_id(stage_id)
-    if not stage:
-        raise HTTPException(status_code=404, detail="Stage not found")
-    return stage
+    return _aux_row("stages", stage_id, get_stage_by_id, "Stage not found")
 
 
 @router.get("/attributes/{attribute_id}", summary="Get attribute by ID")
 def get_attribute(attribute_id: int):
     """Retrieves a specific attribute by its ID"""
-    attribute = get_attribute_by_id(attribute_id)
-    if not attribute:
-        raise HTTPException(status_code=404, detail="Attribute not found")
-    return attribute
+    return _aux_row("attributes", attribute_id, get_attribute_by_id, "Attribute not found")
 
 
 @router.get("/types/{type_id}", summary="Get type by ID")
 def get_type(type_id: int):
     """Retrieves a specific Digimon type by its ID"""
-    digi_type = get_type_by_id(type_id)
-    if not digi_type:
-        raise HTTPException(status_code=404, detail="Type not found")
-    return digi_type
+    return _aux_row("types", type_id, get_type_by_id, "Type not found")
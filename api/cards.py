@@ -1,14 +1,35 @@
-from fastapi import APIRouter, Query, Depends, HTTPException, Response
+import time
+import zlib
+from typing import Optional
+from fastapi import APIRouter, Query, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from core.formats import FORMAT_QUERY, NORMALIZE_QUERY, fields_query, format_rows, parse_fields
 from core.security import api_key_auth
 from db.sql import (
+    CARD_FIELDS,
+    CARD_FULL_FIELDS,
+    CARD_LIST_FIELDS,
+    SEARCH_WITH_ALTERNATIVES_FIELDS,
     get_all_cards,
     get_all_cards_full_info,
     get_single_card_by_card_number,
     get_card_with_alternatives_by_card_number,
     search_cards_by_name,
     search_cards_with_alternatives_by_name,
-    get_all_cards_with_ids
+    get_all_cards_with_ids,
+    get_card_usage_details,
+    get_card_changes,
 )
+from db.autocomplete import MAX_SUGGESTIONS, get_autocomplete_index
+from db.breaker import db_breaker, mark_stale
+from db.catalog import CATALOG_FILE, get_catalog, is_known_card, main_card_number
+from db.coalesce import card_queries
+from db.deck_index import deck_card_index
+from db.evolution import get_evolution_index
+from db.shards import get_shard_index
+from db.similarity import get_similarity_index
+from db.snapshot import build_snapshot, latest_snapshot, snapshot_path
+from db.tags import get_tag_index
 
 router = APIRouter(
     prefix="/cards",
@@ -16,52 +37,379 @@ router = APIRouter(
     dependencies=[Depends(api_key_auth)],
 )
 
+TAGS_DESCRIPTION = "Only cards with all these keyword/timing tags (e.g. Blocker, On Play)"
+
+
+def _required_catalog():
+    """
+    Returns the current catalog, or raises 503 when none could be loaded (the
+    database is unavailable). While the circuit breaker is open the catalog is
+    served as stale data (see get_catalog).
+    """
+    catalog = get_catalog()
+    if catalog is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return catalog
+
+
+def _available_catalog(fallback=False):
+    """
+    Returns the catalog served while the database is unavailable, or raises 503.
+
+    With fallback, the catalog replaces a query that failed: the response is marked
+    stale (X-Data-Stale) even while the circuit breaker is still closed, so it is
+    not cached as fresh data.
+    """
+    catalog = _required_catalog()
+    if fallback:
+        mark_stale(time.time() - catalog.built_at)
+    return catalog
+
+
+def _project(card, fields):
+    """Returns the requested fields of a card, or the card itself if fields is None."""
+    return card if fields is None else {field: card[field] for field in fields}
+
+
+def _catalog_cards(include_alternative, fields, fallback=False):
+    """
+    Card list rows taken from the catalog (mapped catalog file, or when the database
+    cannot answer), read for this response only.
+    """
+    return _available_catalog(fallback).records(fields, include_alternative)
+
+
+# Field of /cards/ids/ -> (aux table, aux field matching the catalog value)
+_ID_FIELDS = {
+    "card_type": ("card_types", "name"),
+    "rarity": ("rarities", "name"),
+    "color_one": ("colors", "name"),
+    "color_two": ("colors", "name"),
+    "color_three": ("colors", "name"),
+    "stage": ("stages", "name"),
+    "attribute": ("attributes", "name"),
+    "type_one": ("types", "name"),
+    "type_two": ("types", "name"),
+    "bt_abbreviation": ("bts", "abbreviation"),
+}
+
+
+def _catalog_cards_with_ids(include_alternative, fallback=False):
+    """Same rows as get_all_cards_with_ids, from the catalog and its aux tables."""
+    catalog = _available_catalog(fallback)
+    ids = {
+        (table, key): {row[key]: row["id"] for row in catalog.aux[table]}
+        for table, key in set(_ID_FIELDS.values())
+    }
+    lookups = {field: ids[_ID_FIELDS[field]] for field in CARD_LIST_FIELDS if field in _ID_FIELDS}
+    return catalog.records(CARD_LIST_FIELDS, include_alternative, lookups)
+
+
+def _catalog_card(card_number, fields=None, fallback=False):
+    """Same result as get_single_card_by_card_number, from the catalog."""
+    card = _available_catalog(fallback).by_number.get(card_number)
+    if card is None or card["alternative"]:
+        raise HTTPException(status_code=404, detail="Card not found")
+    return _project(card, fields)
+
+
+def _catalog_alternatives(card_number, fields=None, fallback=False):
+    """Same result as get_card_with_alternatives_by_card_number, from the catalog."""
+    catalog = _available_catalog(fallback)
+    main_card = catalog.by_number.get(card_number)
+    if main_card is None or main_card["alternative"]:
+        raise HTTPException(status_code=404, detail="Card not found")
+    return [_project(main_card, fields)] + [
+        _project(catalog.cards[position], ["id", "card_number"])
+        for position in catalog.alternative_positions(card_number)
+    ]
+
+
+def _search_cards(name_part, fields=None):
+    """Searches the database, or the catalog when the database cannot answer."""
+    if db_breaker.available:
+        cards = search_cards_by_name(name_part, fields)
+        if cards is not None:
+            return cards
+    name_part = name_part.casefold()
+    catalog = _available_catalog(fallback=True)
+    names = catalog.column("name")
+    return [
+        {field: card[field] for field in fields or CARD_FULL_FIELDS}
+        for card in (
+            catalog.cards[position]
+            for position in catalog.main_positions()
+            if name_part in names[position].casefold()
+        )
+    ]
+
+
+def _cards_with_tags(tags, include_alternative=True, fields=None):
+    """Resolves a tag filter with the catalog tag index instead of querying the database."""
+    catalog = _required_catalog()
+    cards = [catalog.cards[position] for position in get_tag_index(catalog).match(tags)]
+    if not include_alternative:
+        cards = [card for card in cards if not card["alternative"]]
+    if fields:
+        cards = [{field: card[field] for field in fields} for card in cards]
+    return cards
+
 
 @router.get("/", summary="Get all cards")
 def list_cards(
+    request: Request,
+    response: Response,
     include_alternative: bool = Query(True, description="Include alternative artwork versions"),
+    tags: Optional[list[str]] = Query(None, description=TAGS_DESCRIPTION),
+    fields: Optional[str] = fields_query(CARD_FIELDS),
+    format: str = FORMAT_QUERY,
+    normalize: bool = NORMALIZE_QUERY,
 ):
-    cards = get_all_cards(include_alternative)
-    if cards is None:
-        raise HTTPException(
-            status_code=500, detail="Internal server error retrieving cards"
+    fields = parse_fields(fields, CARD_FIELDS)
+    if tags:
+        return format_rows(
+            _cards_with_tags(tags, include_alternative, fields or CARD_LIST_FIELDS),
+            format, normalize, request, response,
         )
-    return cards
+    if CATALOG_FILE:
+        # Read from the mapped file shared by the workers instead of a copy per worker
+        cards = _catalog_cards(include_alternative, fields or CARD_LIST_FIELDS)
+    else:
+        cards = card_queries.get(
+            ("cards", include_alternative, tuple(fields or ())),
+            lambda: get_all_cards(include_alternative, fields),
+        )
+    if cards is None:
+        # The query failed with no earlier result to serve: the catalog, or 503
+        cards = _catalog_cards(include_alternative, fields or CARD_LIST_FIELDS, fallback=True)
+    return format_rows(cards, format, normalize, request, response)
 
 
 @router.get("/ids/", summary="Get all cards with foreign key IDs instead of names")
 def list_cards_with_ids(
+    request: Request,
+    response: Response,
     include_alternative: bool = Query(True, description="Include alternative artwork versions"),
+    format: str = FORMAT_QUERY,
 ):
-    cards = get_all_cards_with_ids(include_alternative)
-    if cards is None:
-        raise HTTPException(
-            status_code=500, detail="Internal server error retrieving cards"
+    if CATALOG_FILE:
+        cards = _catalog_cards_with_ids(include_alternative)
+    else:
+        cards = card_queries.get(
+            ("ids", include_alternative), lambda: get_all_cards_with_ids(include_alternative)
         )
-    return cards
+    if cards is None:
+        cards = _catalog_cards_with_ids(include_alternative, fallback=True)
+    return format_rows(cards, format, request=request, response=response)
 
 
 @router.get("/full/", summary="Get cards with full details")
 def list_cards_full_info(
+    request: Request,
+    response: Response,
     include_alternative: bool = Query(True, description="Include alternative artwork versions"),
+    tags: Optional[list[str]] = Query(None, description=TAGS_DESCRIPTION),
+    fields: Optional[str] = fields_query(CARD_FIELDS),
+    format: str = FORMAT_QUERY,
+    normalize: bool = NORMALIZE_QUERY,
 ):
-    cards = get_all_cards_full_info(include_alternative)
+    fields = parse_fields(fields, CARD_FIELDS)
+    if tags:
+        return format_rows(
+            _cards_with_tags(tags, include_alternative, fields),
+            format, normalize, request, response,
+        )
+    if CATALOG_FILE:
+        cards = _catalog_cards(include_alternative, fields or CARD_FULL_FIELDS)
+    else:
+        cards = card_queries.get(
+            ("full", include_alternative, tuple(fields or ())),
+            lambda: get_all_cards_full_info(include_alternative, fields),
+        )
     if cards is None:
+        cards = _catalog_cards(include_alternative, fields or CARD_FULL_FIELDS, fallback=True)
+    return format_rows(cards, format, normalize, request, response)
+
+
+@router.get("/tags/", summary="Get keyword and timing tags")
+def list_card_tags():
+    """
+    Lists the keyword (<Blocker>, <Piercing>...) and timing ([On Play], [When Digivolving]...)
+    tags found in card effects, with the number of cards carrying each one.
+    """
+    catalog = _required_catalog()
+    return get_tag_index(catalog).counts()
+
+
+def _shard_response(request, response, kind, name, include_alternative, fields):
+    catalog = _required_catalog()
+    shard = get_shard_index(catalog).get(kind, name)
+    if shard is None:
+        raise HTTPException(status_code=404, detail="No cards found")
+
+    etag = shard.etag if include_alternative else shard.main_etag
+    if fields:
+        # Each projection is its own representation of the shard
+        etag = f'{etag[:-1]}-{zlib.crc32(",".join(fields).encode()):08x}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    positions = shard.positions if include_alternative else shard.main_positions
+    return [_project(catalog.cards[position], fields) for position in positions]
+
+
+@router.get("/shards/", summary="Get the ETag of every card shard")
+def list_card_shards(
+    include_alternative: bool = Query(True, description="Include alternative artwork versions"),
+):
+    """
+    Lists every set, color and card type shard with its card count and ETag.
+    Clients compare the ETags with their cached ones and only fetch the changed shards.
+    """
+    catalog = _required_catalog()
+    return get_shard_index(catalog).manifest(include_alternative)
+
+
+@router.get("/by-set/{bt_abbreviation}", summary="Get the cards of a BT set")
+def list_cards_by_set(
+    request: Request,
+    response: Response,
+    bt_abbreviation: str,
+    include_alternative: bool = Query(True, description="Include alternative artwork versions"),
+    fields: Optional[str] = fields_query(CARD_FIELDS),
+):
+    """Returns the full details of every card in a BT set. Supports If-None-Match."""
+    fields = parse_fields(fields, CARD_FIELDS)
+    return _shard_response(request, response, "set", bt_abbreviation, include_alternative, fields)
+
+
+@router.get("/by-color/{color}", summary="Get the cards of a color")
+def list_cards_by_color(
+    request: Request,
+    response: Response,
+    color: str,
+    include_alternative: bool = Query(True, description="Include alternative artwork versions"),
+    fields: Optional[str] = fields_query(CARD_FIELDS),
+):
+    """Returns the full details of every card with the color. Supports If-None-Match."""
+    fields = parse_fields(fields, CARD_FIELDS)
+    return _shard_response(request, response, "color", color, include_alternative, fields)
+
+
+@router.get("/by-type/{card_type}", summary="Get the cards of a card type")
+def list_cards_by_type(
+    request: Request,
+    response: Response,
+    card_type: str,
+    include_alternative: bool = Query(True, description="Include alternative artwork versions"),
+    fields: Optional[str] = fields_query(CARD_FIELDS),
+):
+    """Returns the full details of every card of the card type. Supports If-None-Match."""
+    fields = parse_fields(fields, CARD_FIELDS)
+    return _shard_response(request, response, "type", card_type, include_alternative, fields)
+
+
+@router.get("/snapshot/", summary="Get the latest catalog snapshot file")
+def get_catalog_snapshot():
+    """
+    Returns the manifest of the latest catalog snapshot: file name, download URL,
+    SHA-256, size, catalog version and number of cards.
+
+    Snapshots are built with 'python -m db.maintenance snapshot'; if none was built
+    yet, one is exported from the current catalog. The catalog version can be passed
+    to /cards/changes to catch up with later changes.
+    """
+    manifest = latest_snapshot()
+    if manifest is None:
+        manifest = build_snapshot(_required_catalog())
+    if manifest is None:
+        raise HTTPException(
+            status_code=500, detail="Internal server error retrieving snapshot"
+        )
+    return {**manifest, "url": f"/cards/snapshot/{manifest['file']}"}
+
+
+@router.get("/snapshot/{file_name}", summary="Download a catalog snapshot file")
+def download_catalog_snapshot(request: Request, file_name: str):
+    """
+    Downloads a snapshot file. File names contain their content hash, so the
+    response is immutable and can be cached forever.
+    """
+    path = snapshot_path(file_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
+    etag = '"' + file_name.removesuffix(".dcgsnap") + '"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="application/octet-stream", headers=headers)
+
+
+@router.get("/changes", summary="Get catalog changes since a version")
+def list_card_changes(
+    response: Response,
+    since: Optional[int] = Query(None, ge=0, description="Catalog version the client already has"),
+):
+    """
+    Returns the cards inserted, updated or deleted after a catalog version, and the new version token.
+
+    To start syncing, call without 'since' to get the current version, then download
+    /cards/full/; later calls with 'since' return only the changed cards. When 'reset'
+    is true the changes are not available (first sync, pruned history or an auxiliary
+    table changed) and the whole catalog must be downloaded again.
+    """
+    # Polled for new changes: never served from a client or proxy cache
+    response.headers["Cache-Control"] = "no-store"
+    try:
+        changes = get_card_changes(since)
+    except Exception:
+        # This indicates that there was a problem with the query or server
+        raise HTTPException(
+            status_code=500, detail="Internal server error retrieving changes"
+        )
+    if changes is None:
+        raise HTTPException(
+            status_code=500, detail="Internal server error retrieving changes"
+        )
+    return changes
+
+
+@router.get("/autocomplete", summary="Autocomplete card names and numbers")
+def autocomplete_cards(
+    q: str = Query(..., min_length=1, description="Start of a card name, of any word in it, or of a card number"),
+    limit: int = Query(MAX_SUGGESTIONS, gt=0, le=MAX_SUGGESTIONS, description="Number of suggestions"),
+):
+    """
+    Suggests card names and card numbers starting with the typed text, ignoring case and accents,
+    ranked by how many copies are used in decks and owned in the collection.
+    """
+    catalog = _required_catalog()
+    index = get_autocomplete_index(catalog)
+    if index is None:
         raise HTTPException(
             status_code=500, detail="Internal server error retrieving cards"
         )
-    return cards
+    return index.suggest(q, limit)
 
 
 @router.get("/{card_number}", summary="Get card by card number")
-def get_card(card_number: str):
+def get_card(card_number: str, fields: Optional[str] = fields_query(CARD_FIELDS)):
+    fields = parse_fields(fields, CARD_FIELDS)
+    if is_known_card(card_number) is False:
+        raise HTTPException(status_code=404, detail="Card not found")
+    if not db_breaker.available:
+        return _catalog_card(card_number, fields)
     try:
-        card = get_single_card_by_card_number(card_number)
+        card = get_single_card_by_card_number(card_number, fields)
     except Exception:
         # This indicates that there was a problem with the query or server
         raise HTTPException(
             status_code=500, detail="Internal server error retrieving card"
         )
+    if card is None:
+        return _catalog_card(card_number, fields, fallback=True)
     if not card:
         # This indicates that the chart is not in the database.
         raise HTTPException(status_code=404, detail="Card not found")
@@ -69,26 +417,149 @@ def get_card(card_number: str):
 
 
 @router.get("/{card_number}/alternatives", summary="Get card with alternative versions")
-def get_card_alternatives(card_number: str):
+def get_card_alternatives(
+    card_number: str,
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated fields of the main card, any of: " + ", ".join(CARD_FIELDS),
+    ),
+):
+    fields = parse_fields(fields, CARD_FIELDS)
+    if is_known_card(card_number) is False:
+        raise HTTPException(status_code=404, detail="Card not found")
+    if not db_breaker.available:
+        return _catalog_alternatives(card_number, fields)
     try:
-        cards = get_card_with_alternatives_by_card_number(card_number)
+        cards = get_card_with_alternatives_by_card_number(card_number, fields)
     except Exception:
         # This indicates that there was a problem with the query or server
         raise HTTPException(
             status_code=500, detail="Internal server error retrieving cards"
         )
+    if cards is None:
+        return _catalog_alternatives(card_number, fields, fallback=True)
     if not cards:
         # This indicates that the chart is not in the database.
         raise HTTPException(status_code=404, detail="Card not found")
     return cards
 
 
+@router.get("/{card_number}/decks", summary="Get decks that use a card")
+def get_card_decks(card_number: str, response: Response):
+    """
+    Lists the decks that contain a card, with the quantity committed to each one,
+    and compares the total committed across decks with the quantity owned in the collection.
+    """
+    # Changes with every deck write: clients must revalidate instead of the hour of /cards/
+    response.headers["Cache-Control"] = "no-cache"
+    if is_known_card(card_number) is False:
+        raise HTTPException(status_code=404, detail="Card not found")
+    deck_quantities = deck_card_index.decks_for_card(card_number)
+    if deck_quantities is None:
+        raise HTTPException(
+            status_code=500, detail="Internal server error retrieving card usage"
+        )
+    try:
+        details = get_card_usage_details(card_number, list(deck_quantities))
+    except Exception:
+        # This indicates that there was a problem with the query or server
+        raise HTTPException(
+            status_code=500, detail="Internal server error retrieving card usage"
+        )
+    if details is None:
+        raise HTTPException(
+            status_code=500, detail="Internal server error retrieving card usage"
+        )
+
+    owned_quantity, deck_names = details
+    committed_quantity = sum(deck_quantities.values())
+    return {
+        "card_number": card_number,
+        "owned_quantity": owned_quantity,
+        "committed_quantity": committed_quantity,
+        "missing_quantity": max(committed_quantity - owned_quantity, 0),
+        "decks": [
+            {"deck_id": deck_id, "name": deck_names.get(deck_id), "quantity": quantity}
+            for deck_id, quantity in sorted(deck_quantities.items())
+        ],
+    }
+
+
+@router.get("/{card_number}/similar", summary="Get cards similar to a card")
+def get_similar_cards(
+    card_number: str,
+    limit: int = Query(10, gt=0, le=50, description="Number of similar cards"),
+    fields: Optional[str] = fields_query(CARD_FIELDS),
+):
+    """
+    Finds the cards most similar to a card by colors, stage, types, cost/DP and effect wording.
+    Alternative artworks are matched through their main card.
+    """
+    fields = parse_fields(fields, CARD_FIELDS)
+    catalog = _required_catalog()
+
+    index = get_similarity_index(catalog)
+    main_number = main_card_number(card_number)
+    results = index.top_k([main_number], limit)
+    if main_number not in results:
+        raise HTTPException(status_code=404, detail="Card not found")
+
+    similar = []
+    for number, similarity in results[main_number]:
+        card = dict(_project(catalog.by_number[number], fields))
+        card["similarity"] = similarity
+        similar.append(card)
+    return similar
+
+
+def _evolution_options(card_number, direction, fields):
+    catalog = _required_catalog()
+    if main_card_number(card_number) not in catalog.by_number:
+        raise HTTPException(status_code=404, detail="Card not found")
+
+    index = get_evolution_index(catalog)
+    if direction == "to":
+        card_numbers = index.evolves_to(card_number)
+    else:
+        card_numbers = index.evolves_from(card_number)
+    return [_project(catalog.by_number[number], fields) for number in card_numbers]
+
+
+@router.get("/{card_number}/evolves-to", summary="Get cards a card can digivolve into")
+def get_card_evolves_to(card_number: str, fields: Optional[str] = fields_query(CARD_FIELDS)):
+    """
+    Lists the Digimon one level above the card that share at least one of its colors.
+    """
+    return _evolution_options(card_number, "to", parse_fields(fields, CARD_FIELDS))
+
+
+@router.get("/{card_number}/evolves-from", summary="Get cards that can digivolve into a card")
+def get_card_evolves_from(card_number: str, fields: Optional[str] = fields_query(CARD_FIELDS)):
+    """
+    Lists the Digimon and Digi-Eggs one level below the card that share at least one of its colors.
+    """
+    return _evolution_options(card_number, "from", parse_fields(fields, CARD_FIELDS))
+
+
 @router.get("/search/", summary="Search cards by name")
 def search_cards(
-    name_part: str = Query(..., min_length=2, description="Partial card name to search")
+    name_part: str = Query(..., min_length=2, description="Partial card name to search"),
+    tags: Optional[list[str]] = Query(None, description=TAGS_DESCRIPTION),
+    fields: Optional[str] = fields_query(CARD_FIELDS),
 ):
+    fields = parse_fields(fields, CARD_FIELDS)
     try:
-        cards = search_cards_by_name(name_part)
+        if tags:
+            # The tag filter matches on card_number, even if it is not returned
+            cards = _search_cards(name_part, fields and fields + ["card_number"])
+            tagged = {card["card_number"] for card in _cards_with_tags(tags)}
+            cards = [card for card in cards if card["card_number"] in tagged]
+            if fields:
+                cards = [{field: card[field] for field in fields} for card in cards]
+        else:
+            cards = _search_cards(name_part, fields)
+    except HTTPException:
+        raise
     except Exception:
         # This indicates that there was a problem with the query or server
         raise HTTPException(
@@ -104,15 +575,19 @@ def search_cards(
 
 @router.get("/search-with-alternatives/", summary="Search cards with alternatives")
 def search_cards_with_alternatives(
-    name_part: str = Query(..., min_length=2, description="Partial card name to search")
+    name_part: str = Query(..., min_length=2, description="Partial card name to search"),
+    fields: Optional[str] = fields_query(SEARCH_WITH_ALTERNATIVES_FIELDS),
 ):
+    fields = parse_fields(fields, SEARCH_WITH_ALTERNATIVES_FIELDS)
     try:
-        cards = search_cards_with_alternatives_by_name(name_part)
+        cards = search_cards_with_alternatives_by_name(name_part, fields)
     except Exception:
         # This indicates that there was a problem with the query or server
         raise HTTPException(
             status_code=500, detail="Internal server error during search"
         )
+    if cards is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
     if not cards:
         # This indicates that the chart is not in the database.
         raise HTTPException(
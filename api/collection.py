@@ -1,6 +1,21 @@
-from fastapi import APIRouter, Query, Depends, HTTPException
+from math import ceil
+from fastapi import APIRouter, Query, Depends, HTTPException, Request, Response
+from typing import Optional
+from core.formats import FORMAT_QUERY, NORMALIZE_QUERY, fields_query, format_rows, parse_fields
 from core.security import api_key_auth
-from db.sql import get_collection, add_card_to_collection, delete_card_from_collection
+from db.sql import (
+    CARD_FIELDS,
+    COLLECTION_SORT_COLUMNS,
+    get_collection,
+    get_collection_stats,
+    add_card_to_collection,
+    delete_card_from_collection,
+)
+from db.catalog import get_catalog, is_known_card
+from db.counts import cached_collection_count
+
+# Fields /collection/ can return: card fields plus the owned quantity
+COLLECTION_ALLOWED_FIELDS = list(CARD_FIELDS) + ["quantity"]
 
 router = APIRouter(
     prefix="/collection",
@@ -11,17 +26,135 @@ router = APIRouter(
 
 @router.get("/", summary="Get user collection")
 def get_user_collection(
+    request: Request,
+    response: Response,
     page: int = Query(1, gt=0, description="Page number for pagination"),
     per_page: int = Query(25, gt=0, le=100, description="Number of items per page"),
+    include_alternative: bool = Query(True, description="Include alternative artwork versions"),
+    color: Optional[str] = Query(None, description="Color name (any of the card colors)"),
+    card_type: Optional[str] = Query(None, description="Card type name"),
+    rarity: Optional[str] = Query(None, description="Rarity name"),
+    stage: Optional[str] = Query(None, description="Evolution stage name"),
+    bt: Optional[str] = Query(None, description="BT set abbreviation, e.g. BT5"),
+    name: Optional[str] = Query(None, min_length=2, description="Partial card name"),
+    min_quantity: Optional[int] = Query(None, ge=0, description="Minimum owned quantity"),
+    max_quantity: Optional[int] = Query(None, ge=0, description="Maximum owned quantity"),
+    sort_by: str = Query(
+        "card_number",
+        pattern="^(" + "|".join(COLLECTION_SORT_COLUMNS) + ")$",
+        description="Sort key: " + ", ".join(COLLECTION_SORT_COLUMNS),
+    ),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Sort order: asc or desc"),
+    fields: Optional[str] = fields_query(COLLECTION_ALLOWED_FIELDS),
+    format: str = FORMAT_QUERY,
+    normalize: bool = NORMALIZE_QUERY,
 ):
     """
-    Retrieves the user's card collection with pagination.
+    Retrieves the user's card collection with filters, sorting and pagination.
+
+    Page metadata is returned in headers: X-Total-Count (matching cards), X-Total-Pages,
+    and a Link header with first/prev/next/last page URLs. The total is counted once
+    per filter combination and reused until the collection changes.
 
     Parameters:
     - page: Page number (default: 1)
     - per_page: Items per page (max: 100, default: 25)
+    - include_alternative: Include alternative artworks (default: true)
+    - color, card_type, rarity, stage, bt: Exact auxiliary values to filter by
+    - name: Partial card name
+    - min_quantity / max_quantity: Owned quantity thresholds
+    - sort_by: card_number, name, quantity, cost, rarity or bt (default: card_number)
+    - order: asc or desc (default: asc)
+    - fields: Comma-separated fields to return, only their tables are joined (default: card list fields and quantity)
+    - format: json or columnar (default: json)
+    - normalize: Auxiliary fields as ids with side-loaded dictionaries (default: false)
     """
-    return get_collection(page, per_page)
+    fields = parse_fields(fields, COLLECTION_ALLOWED_FIELDS)
+    filters = {
+        "color": color,
+        "card_type": card_type,
+        "rarity": rarity,
+        "stage": stage,
+        "bt": bt,
+        "name": name,
+        "min_quantity": min_quantity,
+        "max_quantity": max_quantity,
+    }
+    total = cached_collection_count(include_alternative, filters)
+    if total is not None:
+        _set_page_headers(request, response, page, per_page, total)
+    collection = get_collection(
+        page, per_page, include_alternative, filters, sort_by, order == "desc", fields
+    )
+    if collection is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return format_rows(collection, format, normalize, request, response)
+
+
+def _set_page_headers(request, response, page, per_page, total):
+    total_pages = ceil(total / per_page)
+    response.headers["X-Total-Count"] = str(total)
+    response.headers["X-Total-Pages"] = str(total_pages)
+
+    links = {"first": 1, "last": max(total_pages, 1)}
+    if page > 1:
+        links["prev"] = min(page - 1, max(total_pages, 1))
+    if page < total_pages:
+        links["next"] = page + 1
+    response.headers["Link"] = ", ".join(
+        f'<{request.url.include_query_params(page=number)}>; rel="{rel}"'
+        for rel, number in links.items()
+    )
+
+
+@router.get("/stats", summary="Get collection statistics")
+def get_user_collection_stats():
+    """
+    Returns owned versus existing cards per BT set, rarity, card type and color, plus overall totals.
+
+    Counts are read from counters maintained on every collection write, so the cost
+    does not depend on the collection size. For each group:
+    - owned_cards / catalog_cards: main cards owned / existing (completion is their ratio)
+    - owned_alternatives / catalog_alternatives: the same for alternative artworks
+    - total_quantity: copies owned, alternatives included
+    """
+    stats = get_collection_stats()
+    if stats is None:
+        raise HTTPException(
+            status_code=500, detail="Internal server error retrieving collection statistics"
+        )
+    catalog = get_catalog()
+    catalog_totals = catalog.dimension_totals() if catalog else {}
+
+    groups = {}
+    for dimension, name, alternative in catalog_totals:
+        groups.setdefault((dimension, name), _empty_stats_group(name))
+    for row in stats:
+        name = None if row["dimension"] == "all" else row["name"]
+        group = groups.setdefault((row["dimension"], name), _empty_stats_group(name))
+        if row["alternative"]:
+            group["owned_alternatives"] = row["unique_cards"]
+        else:
+            group["owned_cards"] = row["unique_cards"]
+        group["total_quantity"] += row["total_quantity"]
+
+    result = {"all": None, "bt": [], "rarity": [], "card_type": [], "color": []}
+    for (dimension, name), group in sorted(groups.items(), key=lambda item: str(item[0])):
+        group["catalog_cards"] = catalog_totals.get((dimension, name, 0), 0)
+        group["catalog_alternatives"] = catalog_totals.get((dimension, name, 1), 0)
+        group["completion"] = (
+            round(group["owned_cards"] / group["catalog_cards"], 4) if group["catalog_cards"] else None
+        )
+        if dimension == "all":
+            group.pop("name")
+            result["all"] = group
+        elif dimension in result:
+            result[dimension].append(group)
+    return result
+
+
+def _empty_stats_group(name):
+    return {"name": name, "owned_cards": 0, "owned_alternatives": 0, "total_quantity": 0}
 
 
 @router.post("/add", summary="Add card to collection")
@@ -36,6 +169,8 @@ def add_to_collection(
     - card_number: The card number to add
     - quantity: Number of copies to add (default: 1)
     """
+    if is_known_card(card_number) is False:
+        raise HTTPException(status_code=400, detail="Unknown card number")
     success = add_card_to_collection(card_number, quantity)
     if not success:
         raise HTTPException(status_code=400, detail="Failed to add card")
@@ -1,14 +1,21 @@
 from fastapi import APIRouter, Query, Depends, HTTPException
 from typing import Optional
+from core.deadlines import time_remaining
 from core.security import api_key_auth
 from db.sql import (
     get_all_decks,
+    get_deck_by_id,
     create_deck,
     get_deck_cards,
+    get_deck_cards_full,
     add_card_to_deck,
     update_card_in_deck,
     delete_card_from_deck,
 )
+from db.catalog import get_catalog, is_known_card
+from db.cooccurrence import cooccurrence_model
+from db.deck_index import deck_card_index
+from db.evolution import get_evolution_index
 
 router = APIRouter(
     prefix="/decks",
@@ -16,11 +23,19 @@ router = APIRouter(
     dependencies=[Depends(api_key_auth)],
 )
 
+# Seconds a suggestion request waits for a model that is still building
+MODEL_WAIT = 5
+# Seconds clients are told to wait before asking again for suggestions
+MODEL_RETRY_AFTER = 5
+
 
 @router.get("/", summary="Get all decks")
 def list_decks():
     """Retrieves all created decks"""
-    return get_all_decks()
+    decks = get_all_decks()
+    if decks is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return decks
 
 
 @router.post("/add", summary="Create new deck")
@@ -42,19 +57,131 @@ def create_new_deck(
 
 
 @router.get("/{deck_id}/cards", summary="Get cards in a deck")
-def get_deck_cards_endpoint(deck_id: int):
+def get_deck_cards_endpoint(
+    deck_id: int,
+    expand: Optional[str] = Query(
+        None, pattern="^full$", description="Use 'full' to embed complete card details"
+    ),
+    include_alternatives: bool = Query(
+        False, description="Embed alternative versions (only with expand=full)"
+    ),
+):
     """
     Retrieves all cards in a specific deck
 
     Parameters:
     - deck_id: Numeric ID of the deck
+    - expand: 'full' returns every card with the same details as /cards/{card_number}
+    - include_alternatives: With expand=full, adds an 'alternatives' list to each card
     """
-    cards = get_deck_cards(deck_id)
+    if expand == "full":
+        cards = get_deck_cards_full(deck_id, include_alternatives)
+    else:
+        cards = get_deck_cards(deck_id)
+    if cards is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
     if not cards:
         raise HTTPException(status_code=404, detail="Deck not found or empty")
     return cards
 
 
+@router.get("/{deck_id}/suggestions", summary="Suggest cards for a deck")
+def suggest_cards_for_deck(
+    deck_id: int,
+    limit: int = Query(10, gt=0, le=50, description="Number of suggestions"),
+    metric: str = Query("pmi", pattern="^(pmi|lift)$", description="Scoring metric: pmi or lift"),
+    min_support: int = Query(1, gt=0, description="Minimum number of decks sharing a pair"),
+    match_colors: bool = Query(True, description="Only suggest cards sharing a color with the deck"),
+):
+    """
+    Suggests cards that are frequently played together with the cards already in the deck
+
+    Parameters:
+    - deck_id: ID of the deck
+    - limit: Number of suggestions (max: 50, default: 10)
+    - metric: 'pmi' (pointwise mutual information) or 'lift'
+    - min_support: Ignore card pairs shared by fewer decks
+    - match_colors: Restrict suggestions to the deck colors (its color_id, or the colors of its cards)
+    """
+    deck = get_deck_by_id(deck_id)
+    if deck is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    if not deck:
+        raise HTTPException(status_code=404, detail="Deck not found")
+
+    if not cooccurrence_model.ready:
+        cooccurrence_model.start()
+        # Half of the time left at most, so the 503 is sent before the deadline
+        remaining = time_remaining()
+        timeout = MODEL_WAIT if remaining is None else max(min(MODEL_WAIT, remaining / 2), 0)
+        if not cooccurrence_model.wait(timeout):
+            raise HTTPException(
+                status_code=503,
+                detail="Suggestion model is still building",
+                headers={"Retry-After": str(MODEL_RETRY_AFTER)},
+            )
+
+    deck_cards = deck_card_index.cards_in_deck(deck_id)
+    if deck_cards is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    catalog = get_catalog()
+
+    deck_colors = set()
+    if match_colors and catalog is not None:
+        if deck.get("color_id") is not None:
+            deck_colors = {
+                color["name"] for color in catalog.aux["colors"] if color["id"] == deck["color_id"]
+            }
+        if not deck_colors:
+            for card_number in deck_cards:
+                card = catalog.by_number.get(card_number)
+                if card is not None:
+                    deck_colors.update((card["color_one"], card["color_two"], card["color_three"]))
+        deck_colors.discard(None)
+
+    def _matches_colors(card_number):
+        card = catalog.by_number.get(card_number)
+        if card is None:
+            return False
+        colors = {card["color_one"], card["color_two"], card["color_three"]} - {None}
+        # Colorless cards fit in any deck
+        return not colors or not deck_colors or bool(colors & deck_colors)
+
+    candidate_filter = _matches_colors if match_colors and catalog is not None else None
+    suggestions = cooccurrence_model.suggest(
+        deck_cards, metric, min_support, candidate_filter, limit
+    )
+    for suggestion in suggestions:
+        card = catalog.by_number.get(suggestion["card_number"]) if catalog else None
+        suggestion["name"] = card["name"] if card else None
+        suggestion["image_url"] = card["image_url"] if card else None
+    return suggestions
+
+
+@router.get("/{deck_id}/evolution-lines", summary="Get evolution lines in a deck")
+def get_deck_evolution_lines(deck_id: int):
+    """
+    Builds the digivolution graph between the cards of a deck
+
+    Parameters:
+    - deck_id: ID of the deck
+
+    Returns the in-deck edges, the evolution lines (every chain from a card
+    without a parent to a card without a child in the deck, the first 200) and
+    the cards that cannot digivolve from or into any other card of the deck.
+    """
+    deck_cards = deck_card_index.cards_in_deck(deck_id)
+    if deck_cards is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    if not deck_cards:
+        raise HTTPException(status_code=404, detail="Deck not found or empty")
+
+    catalog = get_catalog()
+    if catalog is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return get_evolution_index(catalog).deck_lines(deck_cards)
+
+
 @router.post("/{deck_id}/cards/add", summary="Add card to deck")
 def add_card_to_deck_endpoint(
     deck_id: int,
@@ -69,6 +196,8 @@ def add_card_to_deck_endpoint(
     - card_number: Card number to add
     - quantity: Number of copies to add (default: 1)
     """
+    if is_known_card(card_number) is False:
+        raise HTTPException(status_code=400, detail="Unknown card number")
     success = add_card_to_deck(deck_id, card_number, quantity)
     if not success:
         raise HTTPException(status_code=400, detail="Failed to add card to deck")
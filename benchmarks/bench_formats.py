@@ -0,0 +1,103 @@
+"""
+Compares the encodings of the bulk card endpoints: size, encode time and decode time.
+
+Usage:
+    python -m benchmarks.bench_formats               Rows of /cards/full/ from the database
+    python -m benchmarks.bench_formats --synthetic N N generated rows, no database needed
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import msgpack
+from fastapi.encoders import jsonable_encoder
+
+
+def synthetic_cards(count):
+    rng = random.Random(1)
+    colors = ["Red", "Blue", "Yellow", "Green", "Black", "Purple", "White", None]
+    return [
+        {
+            "id": i + 1,
+            "card_number": f"BT{i % 20 + 1}-{i:03d}",
+            "name": f"Digimon {i}",
+            "dp": rng.choice([None, 3000, 5000, 7000, 12000]),
+            "card_type": rng.choice(["Digimon", "Option", "Tamer", "Digi-Egg"]),
+            "rarity": rng.choice(["C", "U", "R", "SR", "SEC"]),
+            "color_one": rng.choice(colors[:-1]),
+            "color_two": rng.choice(colors),
+            "color_three": None,
+            "image_url": f"https://images.example.com/cards/{i}.png",
+            "cost": rng.randint(0, 12),
+            "stage": rng.choice(["Rookie", "Champion", "Ultimate", "Mega", None]),
+            "attribute": rng.choice(["Vaccine", "Data", "Virus", None]),
+            "type_one": rng.choice(["Dragon", "Beast", "Machine"]),
+            "type_two": None,
+            "evolution_cost_one": rng.choice([None, 1, 2, 3]),
+            "evolution_cost_two": None,
+            "effect": "[On Play] Delete 1 of your opponent's Digimon with 4000 DP or less. " * 2,
+            "evolution_effect": rng.choice([None, "[When Digivolving] <Draw 1>"]),
+            "security_effect": None,
+            "bt_abbreviation": f"BT{i % 20 + 1}",
+            "alternative": int(i % 10 == 0),
+        }
+        for i in range(count)
+    ]
+
+
+def _timed(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def run(cards, repeat=5):
+    encoders = {
+        # What FastAPI does for a returned list
+        "json (jsonable_encoder)": (
+            lambda: json.dumps(jsonable_encoder(cards)).encode(),
+            json.loads,
+        ),
+        "json (direct)": (
+            lambda: json.dumps(cards, separators=(",", ":"), default=str).encode(),
+            json.loads,
+        ),
+        "msgpack": (
+            lambda: msgpack.packb(cards, default=str, use_bin_type=True),
+            msgpack.unpackb,
+        ),
+    }
+    print(f"{len(cards)} rows, best of {repeat}")
+    print(f"{'encoding':<26}{'bytes':>12}{'encode ms':>12}{'decode ms':>12}")
+    for name, (encode, decode) in encoders.items():
+        payload, encode_time = _timed(encode, repeat)
+        _, decode_time = _timed(lambda: decode(payload), repeat)
+        print(f"{name:<26}{len(payload):>12}{encode_time * 1000:>12.1f}{decode_time * 1000:>12.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_formats")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="Use N generated rows")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        cards = synthetic_cards(args.synthetic)
+    else:
+        from db.sql import get_all_cards_full_info
+
+        cards = get_all_cards_full_info(True)
+        if not cards:
+            print("Could not read cards from the database, use --synthetic N")
+            return 1
+        cards = cards.to_list()
+    run(cards, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
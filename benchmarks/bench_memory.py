@@ -0,0 +1,72 @@
+"""
+Measures the memory held per card by the catalog representations: the list of
+dicts returned by a dictionary cursor, CardRecords and a mapped catalog file.
+
+Usage:
+    python -m benchmarks.bench_memory               Cards of the database
+    python -m benchmarks.bench_memory --synthetic N N generated cards, no database needed
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from benchmarks.bench_formats import synthetic_cards
+from db.catalog_file import MappedCatalogFile, write_catalog_file
+from db.records import CardRecords
+
+
+def _retained(build):
+    """Returns the result of build() and the bytes it still holds once built."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def run(cards):
+    # Decoding JSON gives every row its own value strings, as a database driver does
+    payload = json.dumps(cards, default=str)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.dcgcat")
+        write_catalog_file(cards, {}, 0, path)
+
+        representations = {
+            "list of dicts": lambda: json.loads(payload),
+            "CardRecords": lambda: CardRecords.from_dicts(json.loads(payload)),
+            "mapped file (heap)": lambda: MappedCatalogFile(path),
+        }
+        print(f"{len(cards)} cards, catalog file {os.path.getsize(path)} bytes")
+        print(f"{'representation':<22}{'bytes':>14}{'bytes/card':>12}")
+        for name, build in representations.items():
+            result, size = _retained(build)
+            print(f"{name:<22}{size:>14}{size / len(cards):>12.1f}")
+            del result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_memory")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="Use N generated cards")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        cards = synthetic_cards(args.synthetic)
+    else:
+        from db.sql import get_all_cards_full_info
+
+        cards = get_all_cards_full_info(True)
+        if not cards:
+            print("Could not read cards from the database, use --synthetic N")
+            return 1
+        cards = cards.to_list()
+    run(cards)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
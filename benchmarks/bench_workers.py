@@ -0,0 +1,121 @@
+"""
+Measures the memory of several worker processes holding the catalog, as
+`uvicorn main:app --workers N` runs them: each worker loading its own copy
+(CardRecords and the shard/tag indexes) against each worker mapping the shared
+catalog file. Reports the RSS and the PSS (shared pages divided between the
+processes mapping them) added by the catalog, from /proc/self/smaps_rollup.
+
+Usage:
+    python -m benchmarks.bench_workers --workers 8               Cards of the database
+    python -m benchmarks.bench_workers --workers 8 --synthetic N N generated cards
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+from benchmarks.bench_formats import synthetic_cards
+from db.catalog_file import MappedCatalogFile, write_catalog_file
+from db.records import CardRecords
+from db.shards import ShardIndex
+from db.tags import TagIndex
+
+SMAPS_ROLLUP = "/proc/self/smaps_rollup"
+
+
+def _memory():
+    """Returns (rss, pss) of the current process in bytes."""
+    values = {}
+    with open(SMAPS_ROLLUP) as file:
+        for line in file:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0]] = int(parts[1]) * 1024
+    return values["Rss:"], values["Pss:"]
+
+
+def _own_copy(payload_path, catalog_path):
+    with open(payload_path) as file:
+        cards = CardRecords.from_dicts(json.load(file))
+    return cards, ShardIndex.from_cards(cards), TagIndex.from_cards(cards)
+
+
+def _mapped_file(payload_path, catalog_path):
+    mapped = MappedCatalogFile(catalog_path)
+    # Serve every row once, as /cards/full/ does, so all the pages are mapped in
+    mapped.cards.records(list(mapped.columns)).json_rows()
+    return mapped
+
+
+MODES = {"own copy": _own_copy, "mapped file": _mapped_file}
+
+
+def _worker(mode, payload_path, catalog_path, barrier, results):
+    before = _memory()
+    catalog = MODES[mode](payload_path, catalog_path)
+    # Measure while every worker holds the catalog, so shared pages are divided between them
+    barrier.wait()
+    after = _memory()
+    barrier.wait()
+    results.put((after[0] - before[0], after[1] - before[1]))
+    del catalog
+
+
+def run(cards, workers):
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        payload_path = os.path.join(directory, "cards.json")
+        with open(payload_path, "w") as file:
+            json.dump(cards, file, default=str)
+        catalog_path = os.path.join(directory, "catalog.dcgcat")
+        write_catalog_file(cards, {}, 0, catalog_path)
+
+        print(f"{len(cards)} cards, {workers} workers, catalog file {os.path.getsize(catalog_path)} bytes")
+        print(f"{'mode':<14}{'RSS/worker':>14}{'PSS/worker':>14}{'PSS total':>14}")
+        for mode in MODES:
+            barrier = context.Barrier(workers)
+            results = context.Queue()
+            processes = [
+                context.Process(
+                    target=_worker, args=(mode, payload_path, catalog_path, barrier, results)
+                )
+                for _ in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            measures = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+            rss = sum(measure[0] for measure in measures) / workers
+            pss = sum(measure[1] for measure in measures)
+            print(f"{mode:<14}{rss:>14.0f}{pss / workers:>14.0f}{pss:>14.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_workers")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="Use N generated cards")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(SMAPS_ROLLUP):
+        print(f"{SMAPS_ROLLUP} is not available, this benchmark needs Linux")
+        return 1
+
+    if args.synthetic:
+        cards = synthetic_cards(args.synthetic)
+    else:
+        from db.sql import get_all_cards_full_info
+
+        cards = get_all_cards_full_info(True)
+        if not cards:
+            print("Could not read cards from the database, use --synthetic N")
+            return 1
+        cards = cards.to_list()
+    run(cards, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
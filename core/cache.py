@@ -0,0 +1,254 @@
+import fnmatch
+import os
+import threading
+import msgpack
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+from fastapi import Request
+from core.cache_backends import CACHE_BACKEND, shared_cache
+from core.formats import wants_msgpack
+from core.security import API_KEY
+from db.sql import register_write_listener
+from db.versions import version_watcher
+
+# Responses larger than this are never cached
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(8 * 1024 * 1024)))
+
+# Path prefix -> seconds a GET response is cached, the longest matching prefix wins.
+# 0 disables caching for the prefix.
+ROUTE_TTLS = {
+    "/aux/": 3600,
+    "/cards/": 300,
+    "/cards/changes": 0,
+    "/cards/snapshot/": 0,
+    "/collection/": 60,
+    "/decks/": 60,
+}
+
+# Path pattern (fnmatch) -> namespace of its responses, the first match wins
+NAMESPACES = [
+    ("/cards/*/decks", "card_usage"),
+    ("/cards/*", "cards"),
+    ("/aux/*", "aux"),
+    ("/collection/*", "collection"),
+    ("/decks/*", "decks"),
+]
+
+# Written table -> namespaces of the responses that depend on it
+INVALIDATIONS = {
+    "Collection": ["collection", "card_usage"],
+    "Decks": ["decks", "card_usage"],
+    "DeckCards": ["decks", "card_usage"],
+}
+
+# Data version -> namespaces purged when another process changed it
+VERSION_INVALIDATIONS = {
+    "catalog": ["cards", "card_usage"],
+    "collection": ["collection", "card_usage"],
+    "decks": ["decks", "card_usage"],
+}
+
+# Response headers that are not replayed from the cache
+_SKIPPED_HEADERS = {"content-length", "date", "server"}
+
+
+def route_ttl(path):
+    """Returns the cache TTL of a path, 0 if its responses are not cached."""
+    ttl = 0
+    matched = ""
+    for prefix, prefix_ttl in ROUTE_TTLS.items():
+        if path.startswith(prefix) and len(prefix) > len(matched):
+            matched, ttl = prefix, prefix_ttl
+    return ttl
+
+
+def route_namespace(path):
+    """Returns the namespace of a path, None if it has none."""
+    for pattern, namespace in NAMESPACES:
+        if fnmatch.fnmatchcase(path, pattern):
+            return namespace
+    return None
+
+
+def cache_key(request):
+    """
+    Normalized key of a GET request: path, sorted query parameters and the
+    requested encoding (responses vary on Accept).
+    """
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    accept = "msgpack" if wants_msgpack(request) else "json"
+    return f"{request.url.path}?{query}#{accept}"
+
+
+class ResponseCache:
+    """
+    Response cache stored in a CacheBackend, so workers and nodes sharing a
+    backend share their cached responses.
+
+    Keys contain the current generation of their namespace. Invalidating a
+    namespace increments its generation, which orphans the old entries (they expire
+    or are evicted by the backend) for every process at once. A response computed
+    while a write happened is stored under the old generation and never served.
+
+    An increment the backend could not make (error, Redis backoff) stays pending:
+    this process bypasses the cache for the namespace and retries the increment
+    on its next lookups, until one succeeds and the other processes miss as well.
+    A generation the backend could not read bypasses the cache too: entries are
+    neither read nor stored under a generation that may not be the current one.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._stats = {
+            "hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "failed_invalidations": 0,
+        }
+
+    def generation(self, namespace):
+        """
+        Returns:
+            int or None: Current generation of the namespace, or None while its
+                invalidation is pending or the backend cannot read it (the cache
+                must not be used).
+        """
+        if self._pending:
+            self._invalidate(list(self._pending))
+            if namespace in self._pending:
+                return None
+        return self.backend.counter(f"generation:{namespace}")
+
+    def _invalidate(self, namespaces):
+        # Returns the namespaces whose generation could not be incremented
+        failed = [
+            namespace
+            for namespace in namespaces
+            if self.backend.incr(f"generation:{namespace}") is None
+        ]
+        with self._lock:
+            self._pending.difference_update(namespaces)
+            self._pending.update(failed)
+        return failed
+
+    def _key(self, namespace, generation, key):
+        return f"response:{namespace}:{generation}:{key}"
+
+    def get(self, namespace, generation, key):
+        """Returns the cached (status_code, headers, body), or None (always with no generation)."""
+        if generation is None:
+            return None
+        value = self.backend.get(self._key(namespace, generation, key))
+        with self._lock:
+            self._stats["hits" if value is not None else "misses"] += 1
+        if value is None:
+            return None
+        status_code, headers, body = msgpack.unpackb(value)
+        return status_code, headers, body
+
+    def set(self, namespace, generation, key, status_code, headers, body, ttl):
+        """Stores a response, unless it is too large or there is no generation."""
+        if generation is None or len(body) > RESPONSE_CACHE_MAX_ENTRY_BYTES:
+            return
+        self.backend.set(
+            self._key(namespace, generation, key),
+            msgpack.packb([status_code, headers, body], use_bin_type=True),
+            ttl,
+        )
+        with self._lock:
+            self._stats["stores"] += 1
+
+    def purge(self, namespaces=None):
+        """
+        Invalidates the responses of the namespaces, or of every namespace.
+
+        Returns:
+            list[str]: The invalidated namespaces.
+        """
+        if namespaces is None:
+            namespaces = list(dict.fromkeys(namespace for _, namespace in NAMESPACES))
+        failed = self._invalidate(namespaces)
+        with self._lock:
+            self._stats["invalidations"] += len(namespaces)
+            self._stats["failed_invalidations"] += len(failed)
+        return namespaces
+
+    def stats(self):
+        """Hit/miss counters of this process, and the size of the backend."""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "pending_invalidations": sorted(self._pending),
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "backend": CACHE_BACKEND,
+                **self.backend.stats(),
+            }
+
+
+response_cache = ResponseCache(shared_cache)
+
+
+def _authorized(request):
+    # Cached responses skip the route dependencies, so the API key is checked here
+    return request.headers.get("authorization") == f"Bearer {API_KEY}"
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+        ttl = route_ttl(path) if request.method == "GET" else 0
+        namespace = route_namespace(path)
+        if not ttl or namespace is None or not _authorized(request):
+            return await call_next(request)
+
+        key = cache_key(request)
+        # Backends may do network or disk I/O, keep it off the event loop
+        generation = await run_in_threadpool(response_cache.generation, namespace)
+        if generation is None:
+            return await call_next(request)
+        cached = await run_in_threadpool(response_cache.get, namespace, generation, key)
+        if cached is not None:
+            status_code, headers, body = cached
+            # The key ignores conditional headers, so answer them like the route would
+            etag = headers.get("etag")
+            if etag is not None and request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers={"ETag": etag, "X-Cache": "HIT"})
+            return Response(
+                content=body, status_code=status_code, headers={**headers, "X-Cache": "HIT"}
+            )
+
+        response = await call_next(request)
+        if response.status_code != 200 or "x-data-stale" in response.headers:
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = {
+            key: value for key, value in response.headers.items() if key not in _SKIPPED_HEADERS
+        }
+        await run_in_threadpool(
+            response_cache.set, namespace, generation, key, response.status_code, headers, body, ttl
+        )
+        return Response(
+            content=body, status_code=response.status_code, headers={**headers, "X-Cache": "MISS"}
+        )
+
+
+def _on_write(table, **details):
+    namespaces = INVALIDATIONS.get(table)
+    if namespaces:
+        response_cache.purge(namespaces)
+
+
+register_write_listener(_on_write)
+
+
+def _on_version_change(name):
+    # A shared backend already saw the generation bumps of the other workers' writes,
+    # only catalog loads (which bypass the write listeners) remain to be purged
+    if name == "catalog" or not shared_cache.shared:
+        response_cache.purge(VERSION_INVALIDATIONS[name])
+
+
+for _name in VERSION_INVALIDATIONS:
+    version_watcher.register(_name, lambda name=_name: _on_version_change(name))
@@ -0,0 +1,406 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from urllib.parse import urlparse
+from db.breaker import CircuitBreaker
+
+# Backend shared by the response cache and the catalog: memory, sqlite or redis
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+# File of the sqlite backend, shared by the workers of one host
+CACHE_PATH = os.getenv("CACHE_PATH", "cache/cache.sqlite3")
+# Server of the redis backend (any server speaking the Redis protocol)
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+# Upper bound of the values kept by the memory and sqlite backends, in bytes
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Writes between two cleanups of the sqlite backend
+CLEANUP_INTERVAL = 32
+# Prefix of every key, so the cache can share a Redis database
+KEY_PREFIX = "dcgapi:"
+# Consecutive Redis errors after which the server is skipped for CACHE_BACKOFF_SECONDS
+CACHE_BREAKER_FAILURES = int(os.getenv("CACHE_BREAKER_FAILURES", "3"))
+CACHE_BACKOFF_SECONDS = float(os.getenv("CACHE_BACKOFF_SECONDS", "5"))
+
+
+class CacheBackend(ABC):
+    """
+    Byte-valued key/value store with per-key TTLs and counters.
+
+    Backends never raise on connection problems: a failed get is a miss and a
+    failed set is dropped, so the API keeps working (uncached) if the cache is down.
+    """
+
+    # True if other processes see the same entries
+    shared = False
+
+    @abstractmethod
+    def get(self, key):
+        """Returns the value of a key, or None if it is missing or expired."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """Stores a value for ttl seconds."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def incr(self, key):
+        """Increments a counter that never expires and returns its new value (None on errors)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def counter(self, key):
+        """
+        Returns the value of a counter, 0 if it was never incremented, or None if the
+        backend could not read it (callers must not assume any value then).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        """Removes every value and counter."""
+        raise NotImplementedError
+
+    def stats(self):
+        """Returns backend specific size information."""
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """Process-local LRU store bounded by the total size of its values."""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._bytes += len(value)
+            while self._bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self._max_bytes,
+                "evictions": self._evictions,
+            }
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    File-backed store shared by the workers of one host. The file is opened in
+    WAL mode so readers do not block the writer; each thread has its own connection.
+    Every CLEANUP_INTERVAL writes, expired entries are deleted and the least
+    recently read ones are evicted until the values fit in max_bytes.
+    """
+
+    shared = True
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._local = threading.local()
+        self._sets = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, read_at REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS entries_read_at ON entries (read_at)")
+        connection.execute("CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE entries SET read_at = ? WHERE key = ?", (now, key))
+            return bytes(row[0])
+        except sqlite3.Error:
+            return None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, expires_at, read_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now + ttl, now),
+                )
+                self._sets += 1
+                if self._sets % CLEANUP_INTERVAL == 0:
+                    self._cleanup(connection, now)
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            pass
+
+    def _cleanup(self, connection, now):
+        connection.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        (total,) = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if total <= self._max_bytes:
+            return
+        rows = connection.execute("SELECT key, size FROM entries ORDER BY read_at").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self._max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+    def incr(self, key):
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT INTO counters (key, value) VALUES (?, 1) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + 1",
+                (key,),
+            )
+            return connection.execute(
+                "SELECT value FROM counters WHERE key = ?", (key,)
+            ).fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    def counter(self, key):
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM counters WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else 0
+
+    def clear(self):
+        try:
+            connection = self._connection()
+            connection.execute("DELETE FROM entries")
+            connection.execute("DELETE FROM counters")
+        except sqlite3.Error:
+            pass
+
+    def stats(self):
+        try:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        except sqlite3.Error:
+            return {}
+        return {"entries": entries, "bytes": size, "max_bytes": self._max_bytes}
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend(CacheBackend):
+    """
+    Store on a server speaking the Redis protocol (RESP), shared by every node.
+    Eviction is left to the server's maxmemory policy. Each thread keeps its own
+    connection and reconnects after an error. After CACHE_BREAKER_FAILURES errors
+    in a row the server is skipped (every call is a miss) for CACHE_BACKOFF_SECONDS,
+    then one call probes it, so a down server does not cost a timeout per request.
+    """
+
+    shared = True
+
+    def __init__(self, url=CACHE_URL, timeout=0.5):
+        parsed = urlparse(url)
+        self._address = (parsed.hostname or "localhost", parsed.port or 6379)
+        self._password = parsed.password
+        self._db = int(parsed.path.lstrip("/") or 0)
+        self._timeout = timeout
+        self._local = threading.local()
+        self._breaker = CircuitBreaker(CACHE_BREAKER_FAILURES, CACHE_BACKOFF_SECONDS)
+        self.errors = 0
+
+    def _socket(self):
+        sock = getattr(self._local, "socket", None)
+        if sock is None:
+            sock = socket.create_connection(self._address, timeout=self._timeout)
+            self._local.socket = sock
+            self._local.buffer = sock.makefile("rb")
+            if self._password:
+                self._send("AUTH", self._password)
+            if self._db:
+                self._send("SELECT", self._db)
+        return sock
+
+    def _send(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(f"${len(arg)}\r\n".encode() + arg + b"\r\n")
+        self._local.socket.sendall(b"".join(parts))
+        return self._read()
+
+    def _read(self):
+        line = self._local.buffer.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._local.buffer.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    def command(self, *args):
+        """Runs a command, returning None if the server cannot be reached or is backed off."""
+        if not self._breaker.allow():
+            return None
+        try:
+            self._socket()
+            reply = self._send(*args)
+        except OSError:
+            self.errors += 1
+            self._breaker.record_failure()
+            self._close()
+            return None
+        except RedisError:
+            # The server answered, only the command failed
+            self.errors += 1
+            self._breaker.record_success()
+            self._close()
+            return None
+        self._breaker.record_success()
+        return reply
+
+    def _close(self):
+        sock = getattr(self._local, "socket", None)
+        self._local.socket = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def get(self, key):
+        return self.command("GET", KEY_PREFIX + key)
+
+    def set(self, key, value, ttl):
+        self.command("SET", KEY_PREFIX + key, value, "PX", max(int(ttl * 1000), 1))
+
+    def incr(self, key):
+        return self.command("INCR", KEY_PREFIX + key)
+
+    def counter(self, key):
+        # INCRBY 0 answers 0 for a missing counter, so None only means an error
+        return self.command("INCRBY", KEY_PREFIX + key, 0)
+
+    def clear(self):
+        cursor = "0"
+        while True:
+            reply = self.command("SCAN", cursor, "MATCH", KEY_PREFIX + "*", "COUNT", 500)
+            if reply is None:
+                return
+            cursor, keys = reply[0].decode(), reply[1]
+            if keys:
+                self.command("DEL", *keys)
+            if cursor == "0":
+                return
+
+    def stats(self):
+        return {
+            "server": f"{self._address[0]}:{self._address[1]}",
+            "errors": self.errors,
+            "breaker": self._breaker.stats(),
+        }
+
+
+def create_backend(name=CACHE_BACKEND):
+    """Returns the backend selected by name (CACHE_BACKEND): memory, sqlite or redis."""
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"Unknown CACHE_BACKEND {name!r}, expected memory, sqlite or redis")
+
+
+shared_cache = create_backend()
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+from fastapi import Request
+
+# Seconds a request may spend in the data layer when no route prefix matches
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "10"))
+
+# Path prefix -> request deadline in seconds, the longest matching prefix wins
+ROUTE_DEADLINES = {
+    "/admin/": 30,
+    "/aux/": 3,
+    "/cards/": 5,
+    # The first request builds the snapshot file
+    "/cards/snapshot/": 60,
+    "/collection/": 5,
+    "/decks/": 5,
+}
+
+# Deadline of the current request, set by DeadlineMiddleware
+_deadline = ContextVar("deadline", default=None)
+
+
+def route_deadline(path):
+    """Returns the deadline of a path in seconds."""
+    deadline = REQUEST_DEADLINE
+    matched = ""
+    for prefix, prefix_deadline in ROUTE_DEADLINES.items():
+        if path.startswith(prefix) and len(prefix) > len(matched):
+            matched, deadline = prefix, prefix_deadline
+    return deadline
+
+
+def start_deadline(seconds):
+    """
+    Starts the deadline of the current request.
+
+    Returns:
+        dict: State of the deadline ('expires_at', and 'exceeded' once the data layer
+            gave up). It is shared with the threads running the endpoint, which see a
+            copy of the context but the same dict.
+    """
+    state = {"expires_at": time.monotonic() + seconds}
+    _deadline.set(state)
+    return state
+
+
+def time_remaining():
+    """
+    Returns:
+        float or None: Seconds left before the current request's deadline, or None
+            outside of a request (background jobs).
+    """
+    state = _deadline.get()
+    if state is None:
+        return None
+    return state["expires_at"] - time.monotonic()
+
+
+def mark_deadline_exceeded():
+    """Records that the data layer stopped work because the deadline passed."""
+    state = _deadline.get()
+    if state is not None:
+        state["exceeded"] = True
+
+
+class DeadlineStats:
+    """
+    Requests per route that exceeded their deadline (answered with 504), and that
+    were answered anyway (e.g. from the catalog) after the data layer hit it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timeouts = {}
+        self._fallbacks = {}
+
+    def record(self, route, fallback=False):
+        counts = self._fallbacks if fallback else self._timeouts
+        with self._lock:
+            counts[route] = counts.get(route, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "default": REQUEST_DEADLINE,
+                "deadlines": ROUTE_DEADLINES,
+                "timeouts": dict(self._timeouts),
+                "fallbacks": dict(self._fallbacks),
+            }
+
+
+deadline_stats = DeadlineStats()
+
+
+class DeadlineMiddleware(BaseHTTPMiddleware):
+    """
+    Gives every request a deadline (ROUTE_DEADLINES). The data layer turns the time
+    left into connect/read timeouts and a MySQL max_execution_time, so a slow
+    database ends the request instead of holding the worker. A request that failed
+    (error response or unhandled exception) once its data layer hit the deadline,
+    or after its deadline, is answered with 504. A response the endpoint still
+    built, such as a stale catalog fallback, is kept.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        state = start_deadline(route_deadline(request.url.path))
+        try:
+            response = await call_next(request)
+        except Exception:
+            # A timed out query surfaces as whatever the endpoint did not catch
+            if not self._deadline_hit(state):
+                raise
+            return self._timeout_response(request)
+
+        if response.status_code >= 500 and self._deadline_hit(state):
+            return self._timeout_response(request)
+        if state.get("exceeded"):
+            deadline_stats.record(self._route(request), fallback=True)
+        return response
+
+    @staticmethod
+    def _deadline_hit(state):
+        return state.get("exceeded") or time.monotonic() >= state["expires_at"]
+
+    @staticmethod
+    def _route(request):
+        route = request.scope.get("route")
+        return route.path if route is not None else request.url.path
+
+    @classmethod
+    def _timeout_response(cls, request):
+        deadline_stats.record(cls._route(request))
+        return JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
@@ -0,0 +1,235 @@
+import json
+import msgpack
+from fastapi import HTTPException, Query, Response
+from db.catalog import get_catalog
+from db.catalog_file import MappedRecords
+from db.records import CardRecords
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Card field -> (aux table in Catalog.aux, column holding the value shown for the field)
+AUX_FIELDS = {
+    "card_type": ("card_types", "name"),
+    "rarity": ("rarities", "name"),
+    "color_one": ("colors", "name"),
+    "color_two": ("colors", "name"),
+    "color_three": ("colors", "name"),
+    "stage": ("stages", "name"),
+    "attribute": ("attributes", "name"),
+    "type_one": ("types", "name"),
+    "type_two": ("types", "name"),
+    "bt_abbreviation": ("bts", "abbreviation"),
+}
+
+FORMAT_QUERY = Query(
+    "json",
+    pattern="^(json|columnar)$",
+    description="json: a list of row objects; columnar: one array of values per column",
+)
+NORMALIZE_QUERY = Query(
+    False,
+    description="Return auxiliary fields as ids, with the id -> name dictionaries side-loaded in 'aux'",
+)
+
+
+def fields_query(allowed):
+    """Query parameter declaring the comma-separated fields an endpoint can return."""
+    return Query(
+        None,
+        description="Comma-separated fields to return, any of: " + ", ".join(allowed),
+    )
+
+
+def parse_fields(fields, allowed):
+    """
+    Parses and validates a fields query parameter.
+
+    Args:
+        fields (str or None): Comma-separated field names.
+        allowed (Iterable[str]): Fields the endpoint can return.
+
+    Returns:
+        list[str] or None: The requested fields in order, or None to return the default fields.
+    """
+    if fields is None:
+        return None
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in allowed]
+    if not requested or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid fields: {', '.join(unknown) or fields!r}. Allowed: {', '.join(allowed)}",
+        )
+    return requested
+
+
+def _aux_ids(catalog):
+    """(aux table, value) -> id lookups of a catalog snapshot."""
+    ids = {}
+    for table, column in set(AUX_FIELDS.values()):
+        ids[table] = {row[column]: row["id"] for row in catalog.aux.get(table) or []}
+    return ids
+
+
+def _normalize(rows, columns):
+    catalog = get_catalog()
+    if catalog is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    ids = catalog.derived("aux_ids", _aux_ids)
+
+    lookups = {
+        column: ids[AUX_FIELDS[column][0]] for column in columns if column in AUX_FIELDS
+    }
+    normalized = []
+    for row in rows:
+        row = dict(row)
+        for column, lookup in lookups.items():
+            if row[column] is not None:
+                row[column] = lookup.get(row[column])
+        normalized.append(row)
+
+    aux = {}
+    for column in lookups:
+        table, value_column = AUX_FIELDS[column]
+        aux[table] = {
+            str(entry["id"]): entry[value_column] for entry in catalog.aux.get(table) or []
+        }
+    return normalized, aux
+
+
+def _accepted_media_types(accept):
+    """
+    Parses an Accept header.
+
+    Returns:
+        dict[str, float]: Media range (lowercase, without parameters) -> quality.
+            Ranges with an invalid quality are skipped.
+    """
+    accepted = {}
+    for media_range in accept.split(","):
+        media_type, *parameters = media_range.split(";")
+        media_type = media_type.strip().lower()
+        if not media_type:
+            continue
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = None
+        if quality is not None:
+            accepted[media_type] = max(quality, accepted.get(media_type, 0.0))
+    return accepted
+
+
+def _quality(accepted, media_type):
+    # The most specific range matching the media type gives its quality
+    main_type = media_type.split("/")[0]
+    for media_range in (media_type, main_type + "/*", "*/*"):
+        if media_range in accepted:
+            return accepted[media_range]
+    return 0.0
+
+
+def wants_msgpack(request):
+    """
+    Returns True if the request asks for MessagePack: an Accept media range names
+    it with a quality above 0, not below the quality given to JSON. Wildcards
+    alone keep JSON, the default encoding.
+    """
+    accept = request.headers.get("accept", "") if request is not None else ""
+    accepted = _accepted_media_types(accept)
+    msgpack_quality = max(accepted.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    return msgpack_quality > 0 and msgpack_quality >= _quality(accepted, "application/json")
+
+
+def _msgpack_default(value):
+    # Decimals, dates and other driver types, encoded as JSON would encode them
+    return str(value)
+
+
+def format_rows(rows, format="json", normalize=False, request=None, response=None):
+    """
+    Serializes list endpoint rows in the requested format and encoding.
+
+    The default (JSON rows, not normalized) returns the rows unchanged so FastAPI
+    encodes them as before. Otherwise the payload is encoded here in one call,
+    skipping the per-row jsonable_encoder pass:
+    - columnar: {"count": n, "columns": {field: [values]}}
+    - json normalized: {"items": [rows], "aux": {...}}
+    - columnar normalized: the columnar payload plus "aux"
+
+    The payload is encoded as MessagePack instead of JSON when the request has
+    'Accept: application/msgpack'.
+
+    CardRecords are converted to dicts here, at serialization time; the columnar
+    format reads their columns directly. MappedRecords encode JSON themselves,
+    from the mapped catalog file.
+
+    Args:
+        rows (list[dict], CardRecords or MappedRecords): Rows with the same keys.
+        format (str): 'json' or 'columnar'.
+        normalize (bool): Replace auxiliary names by ids and side-load the aux tables.
+        request (Request): Request used for content negotiation.
+        response (Response): Injected response. Vary is set on it, and its headers
+            are copied because a Response returned directly ignores them.
+
+    Returns:
+        list[dict] or Response: The rows, or a response with the encoded payload.
+    """
+    if response is not None:
+        response.headers["Vary"] = "Accept"
+    msgpack_requested = wants_msgpack(request)
+    mapped = isinstance(rows, MappedRecords)
+    if format == "json" and not normalize and not msgpack_requested and not mapped:
+        return rows.to_list() if isinstance(rows, CardRecords) else rows
+
+    headers = None
+    if response is not None:
+        headers = {
+            key: value for key, value in response.headers.items() if key != "content-length"
+        }
+    if mapped and not normalize and not msgpack_requested:
+        return Response(
+            content=rows.json_rows() if format == "json" else rows.json_columns(),
+            media_type="application/json",
+            headers=headers,
+        )
+
+    records = rows if isinstance(rows, (CardRecords, MappedRecords)) else None
+    if records is not None:
+        columns = list(records.columns)
+        if normalize or format != "columnar":
+            rows = records.to_list()
+    else:
+        columns = list(rows[0].keys()) if rows else []
+    aux = None
+    if normalize:
+        rows, aux = _normalize(rows, columns)
+
+    if format == "json" and not normalize:
+        payload = rows
+    elif format == "columnar":
+        if records is not None and not normalize:
+            values = {column: list(records.column(column)) for column in columns}
+        else:
+            values = {column: [row[column] for row in rows] for column in columns}
+        payload = {"count": len(rows), "columns": values}
+    else:
+        payload = {"items": rows}
+    if aux is not None:
+        payload["aux"] = aux
+
+    if msgpack_requested:
+        return Response(
+            content=msgpack.packb(payload, default=_msgpack_default, use_bin_type=True),
+            media_type=MSGPACK_MEDIA_TYPES[0],
+            headers=headers,
+        )
+    return Response(
+        content=json.dumps(payload, separators=(",", ":"), default=str),
+        media_type="application/json",
+        headers=headers,
+    )
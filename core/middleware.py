@@ -1,6 +1,7 @@
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 from fastapi import Request
+from db.breaker import track_stale_data
 
 
 class CacheControlMiddleware(BaseHTTPMiddleware):
@@ -20,8 +21,25 @@ class CacheControlMiddleware(BaseHTTPMiddleware):
             # We do not add cache header
             return response
 
-        # Routes that can be cached
+        # Routes that can be cached, unless the route set its own policy
         if path.startswith("/aux/") or path.startswith("/cards/"):
-            response.headers["Cache-Control"] = "public, max-age=3600"
+            if "cache-control" not in response.headers:
+                response.headers["Cache-Control"] = "public, max-age=3600"
 
         return response
+
+
+class StaleDataMiddleware(BaseHTTPMiddleware):
+    """
+    Flags responses built from data kept in memory while the database was
+    unavailable: X-Data-Stale holds the age of that data in seconds, and clients
+    must revalidate instead of caching it.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        stale = track_stale_data()
+        response: Response = await call_next(request)
+        if "age" in stale:
+            response.headers["X-Data-Stale"] = str(int(stale["age"]))
+            response.headers["Cache-Control"] = "no-cache"
+        return response
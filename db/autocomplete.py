@@ -0,0 +1,234 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from mysql.connector import Error
+from core.deadlines import mark_deadline_exceeded, time_remaining
+from db.coalesce import SingleFlight
+from db.deck_index import deck_card_index
+from db.sql import get_collection_quantities, register_write_listener
+from db.versions import version_watcher
+
+# Suggestions kept on every trie node, the maximum a query can ask for
+MAX_SUGGESTIONS = 10
+# Seconds an index ranked without the collection (unreadable) is served before reading it again
+AUTOCOMPLETE_RETRY_SECONDS = float(os.getenv("AUTOCOMPLETE_RETRY_SECONDS", "30"))
+
+_SEPARATORS_RE = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    """
+    Folds accents and case and collapses punctuation to single spaces,
+    so 'Agumon (X Antibody)' matches 'agumon x antibody' and 'BT12-0' matches 'bt12 0'.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _SEPARATORS_RE.sub(" ", stripped.casefold()).strip()
+
+
+class AutocompleteIndex:
+    """
+    Prefix trie over normalized card names and card numbers.
+
+    Every node stores the best MAX_SUGGESTIONS entries below it, ranked by
+    popularity, so a query walks len(prefix) nodes and returns a precomputed list.
+    A name is suggested once, represented by its most popular printing, and it
+    can be reached from the start of any of its words.
+    """
+
+    def __init__(self):
+        # Node: [children, suggestions], suggestions as (-score, label, entry)
+        self._root = [{}, []]
+        self._entries = []
+
+    @classmethod
+    def build(cls, catalog, popularity):
+        """
+        Args:
+            catalog (Catalog): Catalog snapshot to index.
+            popularity (dict[str, int]): Copies of each card number used in decks and the collection.
+        """
+        index = cls()
+        by_name = {}
+        for card in catalog.cards:
+            score = popularity.get(card["card_number"], 0)
+            if not card["alternative"]:
+                index._add(
+                    [normalize(card["card_number"])],
+                    card["card_number"],
+                    {"card_number": card["card_number"], "name": card["name"], "image_url": card["image_url"]},
+                    score,
+                )
+            group = by_name.setdefault(card["name"], {"score": 0, "best": None})
+            group["score"] += score
+            if not card["alternative"] and (
+                group["best"] is None or score > popularity.get(group["best"]["card_number"], 0)
+            ):
+                group["best"] = card
+
+        for name, group in by_name.items():
+            card = group["best"]
+            if card is None:
+                continue
+            words = normalize(name).split(" ")
+            keys = [" ".join(words[start:]) for start in range(len(words))]
+            index._add(
+                keys,
+                name,
+                {"card_number": card["card_number"], "name": name, "image_url": card["image_url"]},
+                group["score"],
+            )
+        return index
+
+    def _add(self, keys, label, entry, score):
+        entry_id = len(self._entries)
+        self._entries.append(entry)
+        ranked = (-score, label, entry_id)
+
+        # Walk each key once, sharing nodes reached by several keys
+        visited = set()
+        for key in keys:
+            node = self._root
+            for char in key:
+                node = node[0].setdefault(char, [{}, []])
+                if id(node) in visited:
+                    continue
+                visited.add(id(node))
+                suggestions = node[1]
+                if len(suggestions) < MAX_SUGGESTIONS or ranked < suggestions[-1]:
+                    suggestions.append(ranked)
+                    suggestions.sort()
+                    del suggestions[MAX_SUGGESTIONS:]
+
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        """
+        Returns:
+            list[dict]: Up to limit entries (card_number, name, image_url) whose name
+                or card number starts with the query, most popular first.
+        """
+        node = self._root
+        for char in normalize(query):
+            node = node[0].get(char)
+            if node is None:
+                return []
+        return [self._entries[entry_id] for _, _, entry_id in node[1][:limit]]
+
+
+def card_popularity(include_collection=True):
+    """
+    Args:
+        include_collection (bool): Count the copies owned in the collection.
+
+    Returns:
+        dict[str, int] or None: Copies of each card number owned in the collection plus
+            used in decks, or None if the collection could not be read.
+    """
+    popularity = {}
+    if include_collection:
+        try:
+            quantities = get_collection_quantities()
+        except Error:
+            quantities = None
+        if quantities is None:
+            return None
+        popularity.update(quantities)
+    # Without the deck index, popularity only counts the collection
+    for cards in (deck_card_index.all_decks() or {}).values():
+        for card_number, quantity in cards.items():
+            popularity[card_number] = popularity.get(card_number, 0) + quantity
+    return popularity
+
+
+class AutocompleteCache:
+    """
+    Autocomplete index shared by the requests, built on its own thread (see
+    SingleFlight) outside of any request deadline.
+
+    Collection and deck writes and new catalog snapshots only mark the index
+    outdated: the next request starts a rebuild in the background, and the
+    current index is served until the new one replaces it. Only a request
+    arriving before the first index waits for it, until its own deadline.
+
+    If the collection cannot be read, the index is ranked by deck usage only and
+    served as well, and the collection is read again once retry_seconds have
+    passed, so an unavailable database does not cost a full build per keystroke.
+    """
+
+    def __init__(self, retry_seconds=AUTOCOMPLETE_RETRY_SECONDS):
+        self._retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._builds = SingleFlight()
+        self._index = None
+        # Catalog snapshot and number of writes seen when the index was built
+        self._catalog = None
+        self._built_after = 0
+        self._writes = 0
+        # Monotonic time a degraded index is rebuilt after, None for a complete index
+        self._retry_at = None
+
+    def get(self, catalog):
+        """
+        Returns:
+            AutocompleteIndex or None: The current index, or None if the request
+                deadline passed while the first one was built.
+        """
+        with self._lock:
+            index = self._index
+            outdated = index is not None and (
+                self._catalog is not catalog
+                or self._built_after != self._writes
+                or (self._retry_at is not None and time.monotonic() >= self._retry_at)
+            )
+        if index is not None:
+            if outdated:
+                self._builds.start("autocomplete", lambda: self._build(catalog))
+            return index
+        try:
+            return self._builds.do(
+                "autocomplete", lambda: self._build(catalog), timeout=time_remaining()
+            )
+        except TimeoutError:
+            mark_deadline_exceeded()
+            return None
+
+    def _build(self, catalog):
+        with self._lock:
+            writes = self._writes
+        popularity = card_popularity()
+        retry_at = None
+        if popularity is None:
+            popularity = card_popularity(include_collection=False)
+            retry_at = time.monotonic() + self._retry_seconds
+        index = AutocompleteIndex.build(catalog, popularity)
+        with self._lock:
+            self._index = index
+            self._catalog = catalog
+            # Writes made during the build may be missing, they leave the index outdated
+            self._built_after = writes
+            self._retry_at = retry_at
+        return index
+
+    def mark_outdated(self):
+        """Has the next request rebuild the index, after a collection or deck change."""
+        with self._lock:
+            self._writes += 1
+
+
+autocomplete_cache = AutocompleteCache()
+
+
+def get_autocomplete_index(catalog):
+    """Returns the autocomplete index of the current catalog (see AutocompleteCache.get)."""
+    return autocomplete_cache.get(catalog)
+
+
+def _on_write(table, **details):
+    if table in ("Collection", "Decks", "DeckCards"):
+        autocomplete_cache.mark_outdated()
+
+
+register_write_listener(_on_write)
+version_watcher.register("collection", autocomplete_cache.mark_outdated)
+version_watcher.register("decks", autocomplete_cache.mark_outdated)
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+# Consecutive connection failures that open the circuit
+DB_BREAKER_FAILURES = int(os.getenv("DB_BREAKER_FAILURES", "5"))
+# Seconds the circuit stays open before a probe connection is allowed
+DB_BREAKER_RESET_SECONDS = float(os.getenv("DB_BREAKER_RESET_SECONDS", "15"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency for a while instead of waiting out its
+    timeout on every request.
+
+    closed: calls go through, consecutive failures are counted. After
+    failure_threshold of them the circuit opens.
+    open: calls are rejected at once. After reset_timeout seconds it is half open.
+    half_open: one probe call goes through, the others are rejected. A success
+    closes the circuit, a failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=DB_BREAKER_FAILURES, reset_timeout=DB_BREAKER_RESET_SECONDS):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {"failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    @property
+    def available(self):
+        """False while calls are being rejected (open or half open)."""
+        return self.state == CLOSED
+
+    def allow(self):
+        """Returns True if a call may be attempted now."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._stats["failures"] += 1
+            if self._state == HALF_OPEN or self._failures >= self._failure_threshold:
+                if self._state != OPEN:
+                    self._stats["opened"] += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            return {
+                **self._stats,
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self._failure_threshold,
+                "reset_timeout": self._reset_timeout,
+            }
+
+
+# Guards the MySQL connections of this worker
+db_breaker = CircuitBreaker()
+
+
+# Age of the stale data served by the current request, set by StaleDataMiddleware
+_stale_data = ContextVar("stale_data", default=None)
+
+
+def track_stale_data():
+    """
+    Starts tracking stale data for the current request.
+
+    Returns:
+        dict: Holder filled by mark_stale(). It is shared with the threads running
+            the endpoint, which see a copy of the context but the same holder.
+    """
+    holder = {}
+    _stale_data.set(holder)
+    return holder
+
+
+def mark_stale(age):
+    """Records that the current request serves data loaded age seconds ago."""
+    holder = _stale_data.get()
+    if holder is not None:
+        holder["age"] = max(holder.get("age", 0), age)
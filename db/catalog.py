@@ -0,0 +1,357 @@
+import os
+import threading
+import time
+import msgpack
+from core.cache_backends import shared_cache
+from core.deadlines import mark_deadline_exceeded, time_remaining
+from db.breaker import db_breaker, mark_stale
+from db.catalog_file import MappedCards, open_catalog_file
+from db.coalesce import SingleFlight
+from db.records import CardRecords
+from db.sql import (
+    get_all_cards_full_info,
+    get_all_bts,
+    get_all_colors,
+    get_all_card_types,
+    get_all_rarities,
+    get_all_stages,
+    get_all_attributes,
+    get_all_types,
+    get_catalog_version,
+)
+from db.versions import version_watcher
+
+# Seconds a loaded catalog is served before it is reloaded (same as the HTTP cache)
+CATALOG_TTL = int(os.getenv("CATALOG_TTL", "3600"))
+# Key of the catalog columns in a shared cache backend
+CATALOG_CACHE_KEY = "catalog:columns"
+# File the catalog is memory-mapped from, shared by the workers of a host.
+# Empty: each worker keeps its own copy of the rows.
+CATALOG_FILE = os.getenv("CATALOG_FILE", "")
+
+
+class Catalog:
+    """
+    Read-only snapshot of every card (main and alternative versions) with full
+    details, plus the auxiliary tables.
+
+    Indexes built from the catalog are attached with derived(), so they are built
+    once per snapshot and replaced together with it. Indexes already built (read
+    from a catalog file) are passed as derived, by name.
+
+    cards is CardRecords (column-oriented, see db.records), the rows of a mapped
+    catalog file (see db.catalog_file) or a list of dicts. Records and mapped
+    rows are decoded into dicts on access.
+
+    version is the catalog version (see get_catalog_version) read before the rows,
+    so the rows hold at least every change up to it; None if it is unknown.
+    """
+
+    def __init__(self, cards, aux, by_number=None, built_at=None, version=None, derived=None):
+        self.cards = cards
+        self.aux = aux
+        self.version = version
+        if by_number is None and isinstance(cards, CardRecords):
+            by_number = cards.index("card_number")
+        elif by_number is None:
+            by_number = {card["card_number"]: card for card in cards}
+        self.by_number = by_number
+        self.built_at = time.time() if built_at is None else built_at
+        self._derived = dict(derived or {})
+        # Reentrant: a builder may use other derived indexes (main_positions)
+        self._lock = threading.RLock()
+
+    def derived(self, name, builder):
+        """
+        Returns the index registered under name, building it on first use.
+
+        Args:
+            name (str): Unique name of the index.
+            builder (callable): Called as builder(catalog) to build the index. A builder
+                returning None (data it needs could not be read) is not stored, the
+                next call builds again.
+        """
+        index = self._derived.get(name)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._derived.get(name)
+            if index is None:
+                index = builder(self)
+                if index is not None:
+                    self._derived[name] = index
+            return index
+
+    def column(self, name):
+        """
+        Returns the values of a field in row order. Columns of a mapped catalog file
+        and of a list catalog are decoded on each call, not kept with the snapshot.
+        """
+        if isinstance(self.cards, (CardRecords, MappedCards)):
+            return self.cards.column(name)
+        return [card[name] for card in self.cards]
+
+    def records(self, fields, include_alternative=True, lookups=None):
+        """
+        Returns the catalog rows of the given fields, for one response.
+
+        For a mapped catalog file, a MappedRecords view encoding the response from
+        the mapped bytes. Otherwise CardRecords sharing the catalog columns when
+        every row is returned; the main rows only are copied for the response.
+
+        Args:
+            fields (list[str]): Fields of the rows.
+            include_alternative (bool): Include the alternative artworks.
+            lookups (dict): Field -> {value: replacement}, values missing from a
+                lookup become None.
+        """
+        positions = None if include_alternative else self.main_positions()
+        if isinstance(self.cards, MappedCards):
+            return self.cards.records(fields, positions, lookups)
+        columns = []
+        for field in fields:
+            values = self.column(field)
+            if positions is not None:
+                values = [values[position] for position in positions]
+            lookup = (lookups or {}).get(field)
+            if lookup is not None:
+                values = [None if value is None else lookup.get(value) for value in values]
+            columns.append(values)
+        length = len(self.cards) if positions is None else len(positions)
+        return CardRecords(fields, columns, length)
+
+    def main_positions(self):
+        """Returns the positions of the cards that are not alternative artworks."""
+        return self.derived("main_positions", _build_main_positions)
+
+    def main_cards(self):
+        """Returns the cards that are not alternative artworks."""
+        return [self.cards[position] for position in self.main_positions()]
+
+    def alternative_positions(self, card_number):
+        """Returns the positions of the alternative artworks of a main card number."""
+        return self.derived("alternatives", _build_alternatives).get(card_number, ())
+
+    def dimension_totals(self):
+        """
+        Returns:
+            dict[tuple, int]: Number of cards per (dimension, name, alternative), with the
+                dimensions used by the collection statistics ('all', 'bt', 'rarity',
+                'card_type', 'color'). The 'all' dimension has name None.
+        """
+        return self.derived("dimension_totals", _build_dimension_totals)
+
+
+def _build_main_positions(catalog):
+    return tuple(
+        position
+        for position, alternative in enumerate(catalog.column("alternative"))
+        if not alternative
+    )
+
+
+def _build_alternatives(catalog):
+    # Main card number -> positions of its alternative artworks, in catalog order
+    alternatives = {}
+    card_numbers = catalog.column("card_number")
+    for position, alternative in enumerate(catalog.column("alternative")):
+        if alternative:
+            alternatives.setdefault(main_card_number(card_numbers[position]), []).append(position)
+    return {card_number: tuple(positions) for card_number, positions in alternatives.items()}
+
+
+def _build_dimension_totals(catalog):
+    totals = {}
+    for card in catalog.cards:
+        alternative = int(card["alternative"])
+        keys = {
+            ("bt", card["bt_abbreviation"]),
+            ("rarity", card["rarity"]),
+            ("card_type", card["card_type"]),
+            ("color", card["color_one"]),
+            ("color", card["color_two"]),
+            ("color", card["color_three"]),
+        }
+        keys = {key for key in keys if key[1] is not None} | {("all", None)}
+        for dimension, name in keys:
+            key = (dimension, name, alternative)
+            totals[key] = totals.get(key, 0) + 1
+    return totals
+
+
+def main_card_number(card_number):
+    """Returns the card number of the main card of an alternative artwork (BT1-001_P1 -> BT1-001)."""
+    return card_number.split("_")[0]
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+_reloading = False
+# Runs the first load, shared by every request waiting for it
+_first_load = SingleFlight()
+
+
+def load_catalog(use_cache=True):
+    """
+    Loads a new catalog snapshot from the database.
+
+    With CATALOG_FILE set, the catalog is memory-mapped from that file, which is
+    rebuilt from the database when it is older than CATALOG_TTL or behind the
+    catalog version. Otherwise, with a shared cache backend (sqlite or redis), the
+    rows are read from the cache when another worker loaded them recently, and
+    stored there after a database read, so the workers of a fleet query the
+    catalog once per CATALOG_TTL.
+
+    Args:
+        use_cache (bool): Read the shared cache before the database.
+
+    Returns:
+        Catalog or None: The snapshot, or None if the cards could not be read.
+    """
+    if CATALOG_FILE:
+        mapped = open_catalog_file(CATALOG_FILE, _load_rows, CATALOG_TTL)
+        if mapped is None:
+            return None
+        return Catalog(
+            mapped.cards,
+            mapped.aux,
+            by_number=mapped.by_number,
+            built_at=mapped.built_at,
+            version=mapped.catalog_version,
+            derived={
+                "main_positions": mapped.main_positions,
+                "shards": mapped.shards,
+                "tags": mapped.tags,
+            },
+        )
+
+    if use_cache and shared_cache.shared:
+        cached = shared_cache.get(CATALOG_CACHE_KEY)
+        if cached is not None:
+            data = msgpack.unpackb(cached)
+            return Catalog(
+                CardRecords.from_columns(data["columns"]), data["aux"], version=data.get("version")
+            )
+
+    # Read before the rows: a change committed in between is in the rows, but the
+    # version stays old enough for clients to fetch it again from /cards/changes
+    version = get_catalog_version()
+    data = _load_rows()
+    if data is None:
+        return None
+    cards, aux = data
+    if shared_cache.shared:
+        shared_cache.set(
+            CATALOG_CACHE_KEY,
+            msgpack.packb(
+                {"columns": cards.to_columns(), "aux": aux, "version": version},
+                default=str,
+                use_bin_type=True,
+            ),
+            CATALOG_TTL,
+        )
+    return Catalog(cards, aux, version=version)
+
+
+def _load_rows():
+    # None unless every table was read, a partial catalog is never stored
+    cards = get_all_cards_full_info(True)
+    if not cards:
+        return None
+    aux = {
+        "bts": get_all_bts(),
+        "colors": get_all_colors(),
+        "card_types": get_all_card_types(),
+        "rarities": get_all_rarities(),
+        "stages": get_all_stages(),
+        "attributes": get_all_attributes(),
+        "types": get_all_types(),
+    }
+    if any(rows is None for rows in aux.values()):
+        return None
+    return cards, aux
+
+
+def _reload_catalog():
+    global _catalog, _reloading
+    try:
+        fresh = load_catalog()
+        if fresh is not None:
+            _catalog = fresh
+    finally:
+        _reloading = False
+
+
+def get_catalog():
+    """
+    Returns the current catalog snapshot. Once it is older than CATALOG_TTL, one
+    background thread reloads it and the old snapshot keeps being served meanwhile
+    (and if the reload fails). Only the first load blocks: it runs on its own
+    thread, outside of any request deadline, and every caller waits for it until
+    its own deadline. While the database circuit breaker is open, the snapshot is
+    marked as stale data for the current request.
+
+    Returns:
+        Catalog or None: The snapshot, or None if none could ever be loaded or the
+            request deadline passed while waiting for the first one.
+    """
+    global _reloading
+    catalog = _catalog
+    if catalog is not None:
+        if not db_breaker.available:
+            mark_stale(time.time() - catalog.built_at)
+        if time.time() - catalog.built_at >= CATALOG_TTL:
+            with _catalog_lock:
+                if not _reloading and _catalog is catalog:
+                    _reloading = True
+                    threading.Thread(
+                        target=_reload_catalog, name="catalog-reload", daemon=True
+                    ).start()
+        return catalog
+
+    try:
+        return _first_load.do("catalog", _load_first_catalog, timeout=time_remaining())
+    except TimeoutError:
+        mark_deadline_exceeded()
+        return None
+
+
+def _load_first_catalog():
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = load_catalog()
+        return _catalog
+
+
+def is_known_card(card_number):
+    """
+    Checks a card number (main or alternative artwork) against the current catalog,
+    so unknown numbers are rejected without opening a database connection. The
+    check is a lookup in the catalog's card number index (a hash or, for a mapped
+    catalog file, a binary search), kept current by the catalog version polling.
+    It never waits for the catalog: before the first one is loaded, the first load
+    is started and the check is skipped.
+
+    Returns:
+        bool or None: Whether the card exists, or None if no catalog is loaded yet
+            (callers then leave the decision to the database).
+    """
+    if _catalog is None:
+        _first_load.start("catalog", _load_first_catalog)
+        return None
+    return card_number in get_catalog().by_number
+
+
+def refresh_catalog():
+    """
+    Loads a new snapshot from the database (bypassing the shared cache) and swaps
+    it in, readers keep the previous one until the swap.
+    """
+    global _catalog
+    fresh = load_catalog(use_cache=False)
+    if fresh is not None:
+        _catalog = fresh
+
+
+version_watcher.register("catalog", refresh_catalog)
@@ -0,0 +1,552 @@
+import fcntl
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from db.records import CardRecords
+from db.shards import Shard, ShardIndex
+from db.sql import get_catalog_version
+from db.tags import TagIndex
+
+FORMAT_VERSION = 3
+MAGIC = b"DCGCATM\x00"
+_HEADER_LENGTH = struct.Struct("<I")
+# Sections start on 8 byte boundaries so they can be cast to int64 arrays
+_ALIGNMENT = 8
+# String id of None in string columns
+NULL_STRING = 0xFFFFFFFF
+# Value of None in integer columns
+NULL_INT = -(2 ** 63)
+# Characters a JSON string escapes: strings without them are copied between quotes
+_JSON_ESCAPED = re.compile(r'["\\\x00-\x1f]')
+
+
+class _Sections:
+    """Concatenates aligned binary sections and records their [offset, length]."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def add(self, data):
+        padding = -self.size % _ALIGNMENT
+        if padding:
+            self.parts.append(b"\x00" * padding)
+            self.size += padding
+        location = [self.size, len(data)]
+        self.parts.append(data)
+        self.size += len(data)
+        return location
+
+
+class _StringTable:
+    """Deduplicated UTF-8 strings, addressed by id."""
+
+    def __init__(self):
+        self.ids = {}
+        self.data = []
+        self.offsets = [0]
+        # 1 for the strings encoded in JSON as their UTF-8 bytes between quotes
+        self.plain = bytearray()
+
+    def add(self, value):
+        string_id = self.ids.get(value)
+        if string_id is None:
+            encoded = value.encode()
+            string_id = self.ids[value] = len(self.data)
+            self.data.append(encoded)
+            self.offsets.append(self.offsets[-1] + len(encoded))
+            self.plain.append(_JSON_ESCAPED.search(value) is None)
+        return string_id
+
+
+def _column_kind(values):
+    present = [value for value in values if value is not None]
+    if all(type(value) is int and -(2 ** 63) < value < 2 ** 63 for value in present):
+        return "int"
+    if all(isinstance(value, str) for value in present):
+        return "str"
+    return "json"
+
+
+def write_catalog_file(cards, aux, catalog_version, path):
+    """
+    Writes the catalog in the memory-mappable layout read by MappedCatalogFile.
+
+    Layout: MAGIC, the header length (uint32, little endian), the JSON header and
+    the sections, each aligned on 8 bytes. Integer columns are int64 arrays,
+    string and JSON columns are uint32 arrays of ids into a shared, deduplicated
+    string table (offsets array, UTF-8 blob and one byte per string set when the
+    string needs no JSON escaping). The card_number index is the row numbers
+    sorted by card number, the main positions the row numbers of the cards that
+    are not alternative artworks. The shard index (see db.shards) stores the row
+    numbers of each shard as uint32 arrays and its ETags, the tag index (see
+    db.tags) one little-endian bitmap per tag, so workers mapping the file do not
+    build them. Arrays use the byte order of the writing host.
+
+    Args:
+        cards (CardRecords or list[dict]): Catalog rows, all with the same keys.
+        aux (dict): Auxiliary tables.
+        catalog_version (int): Catalog version (see get_catalog_version) of the data.
+        path (str): File to write.
+    """
+    if not isinstance(cards, CardRecords):
+        cards = CardRecords.from_dicts(cards)
+    sections = _Sections()
+    strings = _StringTable()
+
+    column_sections = []
+    for column in cards.columns:
+        values = list(cards.column(column))
+        kind = _column_kind(values)
+        if kind == "int":
+            data = struct.pack(
+                f"={len(values)}q", *(NULL_INT if value is None else value for value in values)
+            )
+        else:
+            if kind == "json":
+                values = [
+                    None if value is None else json.dumps(value, separators=(",", ":"), default=str)
+                    for value in values
+                ]
+            data = struct.pack(
+                f"={len(values)}I",
+                *(NULL_STRING if value is None else strings.add(value) for value in values),
+            )
+        column_sections.append([column, kind, sections.add(data)])
+
+    card_numbers = cards.column("card_number") if cards.columns else []
+    order = sorted(range(len(cards)), key=card_numbers.__getitem__)
+    index = sections.add(struct.pack(f"={len(order)}I", *order))
+    alternatives = cards.column("alternative") if "alternative" in cards.columns else None
+    main = [
+        position
+        for position in range(len(cards))
+        if alternatives is None or not alternatives[position]
+    ]
+    main_positions = sections.add(struct.pack(f"={len(main)}I", *main))
+    shards = [
+        [
+            shard.kind,
+            shard.name,
+            sections.add(struct.pack(f"={len(shard.positions)}I", *shard.positions)),
+            sections.add(struct.pack(f"={len(shard.main_positions)}I", *shard.main_positions)),
+            shard.etag,
+            shard.main_etag,
+        ]
+        for shard in ShardIndex.from_cards(cards).shards()
+    ]
+    bitmap_length = (len(cards) + 7) // 8
+    tags = [
+        [name, sections.add(bitmap.to_bytes(bitmap_length, "little"))]
+        for name, bitmap in TagIndex.from_cards(cards).items()
+    ]
+    aux_section = sections.add(json.dumps(aux, separators=(",", ":"), default=str).encode())
+    string_offsets = sections.add(struct.pack(f"={len(strings.offsets)}Q", *strings.offsets))
+    string_data = sections.add(b"".join(strings.data))
+    string_plain = sections.add(bytes(strings.plain))
+
+    header = json.dumps(
+        {
+            "format": FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "catalog_version": catalog_version,
+            "rows": len(cards),
+            "columns": column_sections,
+            "index": index,
+            "main_positions": main_positions,
+            "shards": shards,
+            "tags": tags,
+            "aux": aux_section,
+            "string_offsets": string_offsets,
+            "string_data": string_data,
+            "string_plain": string_plain,
+        },
+        separators=(",", ":"),
+    ).encode()
+    data_start = len(MAGIC) + _HEADER_LENGTH.size + len(header)
+
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(_HEADER_LENGTH.pack(len(header)))
+        file.write(header)
+        file.write(b"\x00" * (-data_start % _ALIGNMENT))
+        for part in sections.parts:
+            file.write(part)
+
+
+class MappedCards:
+    """
+    Read-only sequence of the catalog rows over the mapped file. Rows are decoded
+    into new dicts when accessed; nothing is kept in the worker's memory.
+    """
+
+    def __init__(self, mapped):
+        self._mapped = mapped
+        self._length = mapped.header["rows"]
+        self._decoders = [(column, mapped.decoder(column)) for column in mapped.columns]
+
+    def __len__(self):
+        return self._length
+
+    def row(self, position):
+        return {column: decode(position) for column, decode in self._decoders}
+
+    def column(self, name):
+        """Returns the values of a field in row order, decoding only that column."""
+        decode = self._mapped.decoder(name)
+        return [decode(position) for position in range(self._length)]
+
+    def records(self, fields, positions=None, lookups=None):
+        """Returns a MappedRecords view of some fields, of every row or of the rows at positions."""
+        return MappedRecords(self._mapped, fields, positions, lookups)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self.row(row) for row in range(*position.indices(self._length))]
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError("card position out of range")
+        return self.row(position)
+
+    def __iter__(self):
+        for position in range(self._length):
+            yield self.row(position)
+
+
+class MappedRecords:
+    """
+    Rows of a response read from the mapped file: some fields of every row, or of
+    the rows at positions. Like CardRecords, rows and columns are decoded when
+    accessed, and json_rows / json_columns encode the JSON payload straight from
+    the mapped sections. Nothing decoded is kept, so serving a list does not leave
+    a copy of the catalog in the worker.
+
+    lookups maps a field to {value: replacement} (e.g. aux name -> id); values
+    missing from it become None.
+    """
+
+    def __init__(self, mapped, fields, positions=None, lookups=None):
+        self.columns = tuple(fields)
+        self._mapped = mapped
+        self._positions = range(mapped.header["rows"]) if positions is None else positions
+        self._lookups = lookups or {}
+
+    def _decoder(self, name):
+        decode = self._mapped.decoder(name)
+        lookup = self._lookups.get(name)
+        if lookup is None:
+            return decode
+
+        def decode_lookup(position):
+            value = decode(position)
+            return None if value is None else lookup.get(value)
+
+        return decode_lookup
+
+    def _encoder(self, name):
+        lookup = self._lookups.get(name)
+        if lookup is None:
+            return self._mapped.json_encoder(name)
+        decode = self._mapped.decoder(name)
+        literals = {}
+
+        def encode_lookup(position):
+            value = decode(position)
+            literal = literals.get(value)
+            if literal is None:
+                replacement = None if value is None else lookup.get(value)
+                literal = literals[value] = json.dumps(replacement, default=str).encode()
+            return literal
+
+        return encode_lookup
+
+    def column(self, name):
+        """Returns the values of a field in row order."""
+        if name not in self.columns:
+            raise ValueError(f"{name} is not a records field")
+        decode = self._decoder(name)
+        return [decode(position) for position in self._positions]
+
+    def row(self, index):
+        position = self._positions[index]
+        return {name: self._decoder(name)(position) for name in self.columns}
+
+    def to_list(self):
+        decoders = [(name, self._decoder(name)) for name in self.columns]
+        return [
+            {name: decode(position) for name, decode in decoders} for position in self._positions
+        ]
+
+    def json_rows(self):
+        """Returns the rows as a JSON array of objects (bytes)."""
+        # Appended row by row: the response is the only large buffer of the request
+        encoders = [
+            (json.dumps(name).encode() + b":", self._encoder(name)) for name in self.columns
+        ]
+        body = bytearray(b"[")
+        for index, position in enumerate(self._positions):
+            if index:
+                body += b","
+            body += b"{" + b",".join([key + encode(position) for key, encode in encoders]) + b"}"
+        body += b"]"
+        return bytes(body)
+
+    def json_columns(self):
+        """Returns the columnar payload ({"count": n, "columns": {...}}) as JSON (bytes)."""
+        body = bytearray(b'{"count":%d,"columns":{' % len(self))
+        for column, name in enumerate(self.columns):
+            encode = self._encoder(name)
+            body += (b"," if column else b"") + json.dumps(name).encode() + b":["
+            for index, position in enumerate(self._positions):
+                if index:
+                    body += b","
+                body += encode(position)
+            body += b"]"
+        body += b"}}"
+        return bytes(body)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(row) for row in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("record index out of range")
+        return self.row(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.row(index)
+
+
+class MappedIndex:
+    """Read-only card_number -> row mapping, a binary search over the sorted index."""
+
+    def __init__(self, mapped, cards):
+        self._cards = cards
+        self._order = mapped.array("I", mapped.header["index"])
+        self._card_number = None
+        if "card_number" in mapped.columns:
+            self._card_number = mapped.decoder("card_number")
+
+    def position(self, card_number):
+        """Returns the row of a card number, or None if it is not in the catalog."""
+        low, high = 0, len(self._order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._card_number(self._order[middle]) < card_number:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._order):
+            position = self._order[low]
+            if self._card_number(position) == card_number:
+                return position
+        return None
+
+    def get(self, card_number, default=None):
+        position = self.position(card_number) if isinstance(card_number, str) else None
+        return default if position is None else self._cards.row(position)
+
+    def __getitem__(self, card_number):
+        card = self.get(card_number)
+        if card is None:
+            raise KeyError(card_number)
+        return card
+
+    def __contains__(self, card_number):
+        return isinstance(card_number, str) and self.position(card_number) is not None
+
+    def __len__(self):
+        return len(self._order)
+
+
+class MappedCatalogFile:
+    """
+    A catalog file mapped read-only into memory. Workers mapping the same file
+    share its pages through the OS page cache, so each one only holds the small
+    header and the aux tables. The card number, main positions, shard and tag
+    indexes are read from the file too. Replacing the file (os.replace) does not
+    affect the open mappings: a worker keeps reading the old data until it maps
+    the new file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.built_at = os.fstat(file.fileno()).st_mtime
+        self._view = memoryview(self._mmap)
+        if self._view[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a catalog file")
+        (length,) = _HEADER_LENGTH.unpack(self._view[len(MAGIC):len(MAGIC) + _HEADER_LENGTH.size])
+        header_start = len(MAGIC) + _HEADER_LENGTH.size
+        self.header = json.loads(bytes(self._view[header_start:header_start + length]))
+        if self.header["format"] != FORMAT_VERSION or self.header["byteorder"] != sys.byteorder:
+            raise ValueError(f"Unsupported catalog file {path}")
+        data_start = header_start + length
+        self._data_start = data_start + (-data_start % _ALIGNMENT)
+
+        self._string_offsets = self.array("Q", self.header["string_offsets"])
+        self._string_data = self.section(self.header["string_data"])
+        self._string_plain = self.section(self.header["string_plain"])
+        # Column -> (kind, location), in the order of the fields
+        self.columns = {
+            column: (kind, location) for column, kind, location in self.header["columns"]
+        }
+        self.main_positions = self.array("I", self.header["main_positions"])
+        self.aux = json.loads(bytes(self.section(self.header["aux"])))
+        self.cards = MappedCards(self)
+        self.by_number = MappedIndex(self, self.cards)
+        self.shards = ShardIndex.from_shards(
+            Shard(kind, name, self.array("I", positions), self.array("I", main_positions), etag, main_etag)
+            for kind, name, positions, main_positions, etag, main_etag in self.header["shards"]
+        )
+        self.tags = TagIndex(
+            {name.casefold(): name for name, _ in self.header["tags"]},
+            {name.casefold(): self.section(location) for name, location in self.header["tags"]},
+            self.header["rows"],
+        )
+
+    @property
+    def catalog_version(self):
+        return self.header["catalog_version"]
+
+    def section(self, location):
+        """Returns a zero-copy view of a section."""
+        offset, length = location
+        return self._view[self._data_start + offset:self._data_start + offset + length]
+
+    def array(self, typecode, location):
+        """Returns a zero-copy view of a section as an array of typecode items."""
+        return self.section(location).cast(typecode)
+
+    def string(self, string_id):
+        return str(
+            self._string_data[self._string_offsets[string_id]:self._string_offsets[string_id + 1]],
+            "utf-8",
+        )
+
+    def json_string(self, string_id):
+        """Returns a string of the table as a JSON string literal (bytes)."""
+        start, end = self._string_offsets[string_id], self._string_offsets[string_id + 1]
+        if self._string_plain[string_id]:
+            return b'"' + self._string_data[start:end] + b'"'
+        return json.dumps(self.string(string_id), ensure_ascii=False).encode()
+
+    def _column(self, name):
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise ValueError(f"{name} is not a catalog column") from None
+
+    def decoder(self, name):
+        """Returns a function decoding the value of a column at a row."""
+        return self.column_decoder(*self._column(name))
+
+    def json_encoder(self, name):
+        """
+        Returns a function giving the JSON literal (bytes) of the value of a column
+        at a row, sliced from the mapped sections: strings without characters to
+        escape and JSON values are copied as stored.
+        """
+        kind, location = self._column(name)
+        if kind == "int":
+            values = self.array("q", location)
+            return lambda row: b"null" if values[row] == NULL_INT else b"%d" % values[row]
+        ids = self.array("I", location)
+        if kind == "str":
+            return lambda row: b"null" if ids[row] == NULL_STRING else self.json_string(ids[row])
+        offsets, data = self._string_offsets, self._string_data
+
+        def encode_json(row):
+            string_id = ids[row]
+            if string_id == NULL_STRING:
+                return b"null"
+            return bytes(data[offsets[string_id]:offsets[string_id + 1]])
+
+        return encode_json
+
+    def column_decoder(self, kind, location):
+        """Returns a function decoding the value of a column at a row."""
+        if kind == "int":
+            values = self.array("q", location)
+            return lambda row: None if values[row] == NULL_INT else values[row]
+        ids = self.array("I", location)
+        if kind == "str":
+            return lambda row: None if ids[row] == NULL_STRING else self.string(ids[row])
+        return lambda row: None if ids[row] == NULL_STRING else json.loads(self.string(ids[row]))
+
+
+@contextmanager
+def _file_lock(path):
+    # Serializes the rebuilds of the workers of a host, the others wait and map the result
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _open_existing(path):
+    try:
+        return MappedCatalogFile(path)
+    except (OSError, ValueError):
+        return None
+
+
+def open_catalog_file(path, load, max_age):
+    """
+    Maps the catalog file, rebuilding it first when it is missing, older than
+    max_age seconds or not at the current catalog version. The first worker to
+    notice rebuilds it (into a temporary file renamed over the old one) while the
+    others wait, then every worker maps the same file.
+
+    Args:
+        path (str): Catalog file shared by the workers.
+        load (callable): Returns (cards, aux) read from the database, or None.
+        max_age (float): Seconds before the file is rebuilt.
+
+    Returns:
+        MappedCatalogFile or None: The mapped file. If the database cannot be read,
+            the existing file whatever its age, or None if there is none.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    catalog_version = get_catalog_version()
+
+    with _file_lock(path):
+        mapped = _open_existing(path)
+        if (
+            mapped is not None
+            and catalog_version is not None
+            and mapped.catalog_version == catalog_version
+            and mapped.built_at + max_age > time.time()
+        ):
+            return mapped
+
+        data = load()
+        if data is None:
+            return mapped
+        cards, aux = data
+        descriptor, temp_path = tempfile.mkstemp(dir=directory or ".", suffix=".tmp")
+        os.close(descriptor)
+        try:
+            write_catalog_file(cards, aux, catalog_version or 0, temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return MappedCatalogFile(path)
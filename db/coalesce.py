@@ -0,0 +1,208 @@
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from core.deadlines import mark_deadline_exceeded, time_remaining
+from db.breaker import db_breaker, mark_stale
+from db.versions import version_watcher
+
+# Seconds a query result is served as fresh
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "60"))
+# Further seconds a result is served while it is refreshed in the background
+QUERY_CACHE_STALE_TTL = int(os.getenv("QUERY_CACHE_STALE_TTL", "600"))
+# Distinct queries (endpoint and parameters) whose results are kept
+QUERY_CACHE_MAX_ENTRIES = 32
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the
+    function and every caller waits for it and receives the same result or exception.
+
+    The function runs on its own thread, outside of the request deadline of the
+    caller that started it: cut short by that deadline it would fail for every
+    caller waiting on it. Each caller, the one that started it included, waits
+    at most its own timeout and then raises TimeoutError, leaving the function
+    to finish for the others (and the next callers). The function stays bounded
+    by the default connection and query timeouts.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def start(self, key, function):
+        """Starts function for key unless a call is already running, returns the call."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                return call
+            call = self._calls[key] = _Call()
+            self.executed += 1
+        # A new, empty context: the thread sees no request deadline
+        threading.Thread(
+            target=contextvars.Context().run,
+            args=(self._run, key, call, function),
+            name="single-flight",
+            daemon=True,
+        ).start()
+        return call
+
+    def _run(self, key, call, function):
+        try:
+            call.result = function()
+        except BaseException as error:
+            call.error = error
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do(self, key, function, timeout=None):
+        call = self.start(key, function)
+        if not call.done.wait(timeout if timeout is None else max(timeout, 0)):
+            raise TimeoutError(f"Gave up waiting for the call shared on {key!r}")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+class StaleWhileRevalidateCache:
+    """
+    Small LRU cache of query results.
+
+    A result younger than ttl is returned as is. A result younger than
+    ttl + stale_ttl is returned too, and one background thread reloads it. Older or
+    missing results are loaded through a SingleFlight, so concurrent callers on
+    expiry share one database query. The shared query runs on its own thread,
+    outside of any request deadline, and each caller (the first one included)
+    only waits for it until its own deadline.
+    Failed loads (None) are not stored: the expired result is served instead if
+    there is one, as it is while the database circuit breaker is open, otherwise
+    None is returned. Results served while the database is unavailable are marked stale.
+    """
+
+    def __init__(
+        self,
+        ttl=QUERY_CACHE_TTL,
+        stale_ttl=QUERY_CACHE_STALE_TTL,
+        max_entries=QUERY_CACHE_MAX_ENTRIES,
+    ):
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._stats = {"fresh": 0, "stale": 0, "loads": 0, "refreshes": 0, "fallbacks": 0}
+
+    def get(self, key, loader):
+        """
+        Returns the result of loader() for key, cached as described above.
+
+        Args:
+            key (Hashable): Identifies the query and its parameters.
+            loader (callable): Runs the query.
+        """
+        available = db_breaker.available
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, loaded_at = entry
+                age = time.monotonic() - loaded_at
+                if not available:
+                    mark_stale(age)
+                if age < self._ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["fresh"] += 1
+                    return value
+                if age < self._ttl + self._stale_ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["stale"] += 1
+                    self._refresh_in_background(key, loader)
+                    return value
+                if not available:
+                    self._stats["fallbacks"] += 1
+                    return value
+            self._stats["loads"] += 1
+        try:
+            value, stale_age = self._flight.do(
+                key, lambda: self._load(key, loader), timeout=time_remaining()
+            )
+        except TimeoutError:
+            mark_deadline_exceeded()
+            value, stale_age = self._expired(key)
+        if stale_age is not None:
+            # Every caller sharing the load reports the staleness, not only the leader
+            mark_stale(stale_age)
+        return value
+
+    def _load(self, key, loader):
+        """Returns (value, None), or (expired value, its age) if the load failed."""
+        value = loader()
+        with self._lock:
+            if value is not None:
+                self._entries[key] = (value, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+                return value, None
+        return self._expired(key)
+
+    def _expired(self, key):
+        """Returns (expired value, its age), or (None, None) if there is none."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            self._stats["fallbacks"] += 1
+            return entry[0], time.monotonic() - entry[1]
+
+    def _refresh_in_background(self, key, loader):
+        # Called with the lock held
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        self._stats["refreshes"] += 1
+
+        def refresh():
+            try:
+                self._flight.do(key, lambda: self._load(key, loader))
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="query-refresh", daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "coalesced": self._flight.shared,
+            }
+
+
+# Results of the full card list queries
+card_queries = StaleWhileRevalidateCache()
+version_watcher.register("catalog", card_queries.clear)
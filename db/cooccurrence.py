@@ -0,0 +1,160 @@
+import math
+import threading
+from db.deck_index import deck_card_index
+from db.versions import version_watcher
+
+
+class CooccurrenceModel:
+    """
+    Sparse card co-occurrence matrix over deck membership.
+
+    pair_counts[a][b] is the number of decks containing both a and b, and
+    card_counts[a] the number of decks containing a. The matrix is built once in a
+    background thread and then updated incrementally from DeckCards changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._decks = {}
+        self._card_counts = {}
+        self._pair_counts = {}
+        # Membership changes received while a build is running, replayed afterwards
+        self._pending = []
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def start(self):
+        """Starts a background (re)build unless one is already running."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._pending = []
+            self._thread = threading.Thread(target=self._build, daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout):
+        """Waits up to timeout seconds for the model. Returns True if it is ready."""
+        return self._ready.wait(timeout)
+
+    def _build(self):
+        try:
+            all_decks = deck_card_index.all_decks()
+            if all_decks is None:
+                # Not ready, the next start() builds again
+                print("Co-occurrence build error: deck index unavailable")
+                return
+            decks = {deck_id: set(cards) for deck_id, cards in all_decks.items()}
+            card_counts, pair_counts = {}, {}
+            for cards in decks.values():
+                for card in cards:
+                    card_counts[card] = card_counts.get(card, 0) + 1
+                    row = pair_counts.setdefault(card, {})
+                    for other in cards:
+                        if other != card:
+                            row[other] = row.get(other, 0) + 1
+
+            with self._lock:
+                self._decks = decks
+                self._card_counts = card_counts
+                self._pair_counts = pair_counts
+                # Membership changes are idempotent set operations, so replaying
+                # everything received since the build started converges to the current state
+                for deck_id, card_number, added in self._pending:
+                    self._apply(deck_id, card_number, added)
+                self._pending = []
+                self._ready.set()
+        except Exception as e:
+            print(f"Co-occurrence build error: {e}")
+        finally:
+            with self._lock:
+                self._thread = None
+
+    def on_membership_change(self, deck_id, card_number, added):
+        """Membership listener for deck_card_index."""
+        with self._lock:
+            if self._thread is not None:
+                self._pending.append((deck_id, card_number, added))
+            if self._ready.is_set():
+                self._apply(deck_id, card_number, added)
+
+    def _apply(self, deck_id, card_number, added):
+        # Must be called with the lock held
+        cards = self._decks.setdefault(deck_id, set())
+        if added == (card_number in cards):
+            return
+        delta = 1 if added else -1
+        if added:
+            cards.add(card_number)
+        else:
+            cards.discard(card_number)
+
+        self._card_counts[card_number] = self._card_counts.get(card_number, 0) + delta
+        row = self._pair_counts.setdefault(card_number, {})
+        for other in cards:
+            if other == card_number:
+                continue
+            other_row = self._pair_counts.setdefault(other, {})
+            row[other] = row.get(other, 0) + delta
+            other_row[card_number] = other_row.get(card_number, 0) + delta
+            if row[other] <= 0:
+                del row[other]
+                del other_row[card_number]
+
+        if self._card_counts[card_number] <= 0:
+            del self._card_counts[card_number]
+            self._pair_counts.pop(card_number, None)
+        if not cards:
+            del self._decks[deck_id]
+
+    def suggest(self, deck_cards, metric="pmi", min_support=1, candidate_filter=None, limit=10):
+        """
+        Scores every card that co-occurs with the given cards.
+
+        The score is a sparse vector-matrix product: the indicator vector of the deck
+        times the co-occurrence matrix, with each co-occurrence weighted by its lift
+        or its pointwise mutual information (PMI).
+
+        Args:
+            deck_cards (Iterable[str]): Card numbers already in the deck.
+            metric (str): 'pmi' or 'lift'.
+            min_support (int): Minimum number of shared decks for a pair to count.
+            candidate_filter (callable, optional): Returns False for card numbers to skip.
+            limit (int): Number of suggestions to return.
+
+        Returns:
+            list[dict]: card_number, score and co_occurrences, best first.
+        """
+        deck_cards = set(deck_cards)
+        with self._lock:
+            total_decks = len(self._decks)
+            scores, supports = {}, {}
+            for card in deck_cards:
+                card_count = self._card_counts.get(card)
+                if not card_count:
+                    continue
+                for other, together in self._pair_counts.get(card, {}).items():
+                    if together < min_support or other in deck_cards:
+                        continue
+                    lift = total_decks * together / (card_count * self._card_counts[other])
+                    weight = math.log(lift) if metric == "pmi" else lift
+                    scores[other] = scores.get(other, 0.0) + weight
+                    supports[other] = supports.get(other, 0) + together
+
+        if candidate_filter is not None:
+            scores = {card: score for card, score in scores.items() if candidate_filter(card)}
+
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [
+            {"card_number": card, "score": round(score, 4), "co_occurrences": supports[card]}
+            for card, score in best
+        ]
+
+
+cooccurrence_model = CooccurrenceModel()
+deck_card_index.register_membership_listener(cooccurrence_model.on_membership_change)
+# Registered after the deck index reset, the rebuild reads the reloaded index
+version_watcher.register("decks", cooccurrence_model.start)
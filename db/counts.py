@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from db.sql import count_collection, register_write_listener
+from db.versions import version_watcher
+
+# Distinct filter combinations whose counts are kept
+MAX_CACHED_COUNTS = 256
+
+
+class CountCache:
+    """
+    Small LRU cache of COUNT(*) results, cleared whenever the counted table is written.
+
+    A generation number is bumped on every clear, so a count computed while a write
+    happened is returned to its caller but never stored.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_COUNTS):
+        self._max_entries = max_entries
+        self._counts = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+            generation = self._generation
+
+        count = compute()
+        if count is None:
+            return None
+
+        with self._lock:
+            if generation == self._generation:
+                self._counts[key] = count
+                self._counts.move_to_end(key)
+                while len(self._counts) > self._max_entries:
+                    self._counts.popitem(last=False)
+        return count
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._counts.clear()
+
+
+collection_counts = CountCache()
+
+
+def cached_collection_count(include_alternative=True, filters=None):
+    """
+    Returns the number of collection entries matching the filters, running
+    count_collection only if this combination was not counted since the last write.
+
+    Returns:
+        int or None: Number of matching entries, or None if connection fails.
+    """
+    filters = filters or {}
+    key = (include_alternative, tuple(sorted((k, v) for k, v in filters.items() if v is not None)))
+    return collection_counts.get_or_compute(
+        key, lambda: count_collection(include_alternative, filters)
+    )
+
+
+def _on_write(table, **details):
+    if table == "Collection":
+        collection_counts.clear()
+
+
+register_write_listener(_on_write)
+version_watcher.register("collection", collection_counts.clear)
@@ -0,0 +1,142 @@
+import threading
+from core.deadlines import mark_deadline_exceeded, time_remaining
+from db.coalesce import SingleFlight
+from db.sql import get_all_deck_card_entries, register_write_listener
+from db.versions import version_watcher
+
+
+class DeckCardIndex:
+    """
+    In-memory index over DeckCards in both directions:
+    card_number -> {deck_id: quantity} and deck_id -> {card_number: quantity}.
+
+    It is loaded from the database on first use and then kept up to date by the
+    write listener, so lookups never scan DeckCards. The load runs on its own
+    thread, outside of any request deadline, and lookups wait for it until their
+    own deadline. If the database cannot be read, lookups return None and the
+    next one tries to load it again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_card = None
+        self._by_deck = None
+        self._membership_listeners = []
+        self._loads = SingleFlight()
+
+    def _load(self):
+        # Returns False if DeckCards could not be read; nothing is stored then, so an
+        # empty index is never served as the truth. The lock is held during the read
+        # so writes committed meanwhile are applied after it.
+        with self._lock:
+            if self._by_card is not None:
+                return True
+            entries = get_all_deck_card_entries()
+            if entries is None:
+                return False
+            by_card, by_deck = {}, {}
+            for entry in entries:
+                by_card.setdefault(entry["card_number"], {})[entry["deck_id"]] = entry["quantity"]
+                by_deck.setdefault(entry["deck_id"], {})[entry["card_number"]] = entry["quantity"]
+            self._by_deck = by_deck
+            self._by_card = by_card
+            return True
+
+    def _read(self, read):
+        # Returns read() with the lock held, loading the index first if needed,
+        # or None if it could not be loaded before the request deadline
+        if self._by_card is None:
+            try:
+                if not self._loads.do("deck_cards", self._load, timeout=time_remaining()):
+                    return None
+            except TimeoutError:
+                mark_deadline_exceeded()
+                return None
+        with self._lock:
+            if self._by_card is None:
+                # Reset since it was loaded
+                return None
+            return read()
+
+    def decks_for_card(self, card_number):
+        """
+        Returns:
+            dict[int, int] or None: Quantity of the card in every deck that uses it,
+                or None if the index could not be loaded.
+        """
+        return self._read(lambda: dict(self._by_card.get(card_number, {})))
+
+    def cards_in_deck(self, deck_id):
+        """
+        Returns:
+            dict[str, int] or None: Quantity of every card in the deck, or None if
+                the index could not be loaded.
+        """
+        return self._read(lambda: dict(self._by_deck.get(deck_id, {})))
+
+    def all_decks(self):
+        """
+        Returns:
+            dict[int, dict[str, int]] or None: Copy of the deck -> cards mapping, or
+                None if the index could not be loaded.
+        """
+        return self._read(
+            lambda: {deck_id: dict(cards) for deck_id, cards in self._by_deck.items()}
+        )
+
+    def register_membership_listener(self, listener):
+        """
+        Registers a callable notified when a card enters or leaves a deck.
+        Listeners run while the index lock is held, so they see changes in commit order.
+
+        Args:
+            listener (callable): Called as listener(deck_id, card_number, added).
+        """
+        self._membership_listeners.append(listener)
+
+    def set_quantity(self, deck_id, card_number, quantity):
+        """
+        Applies a committed DeckCards change. A quantity of 0 removes the entry.
+        """
+        with self._lock:
+            if self._by_card is None:
+                # Not loaded yet, the next load reads the committed state
+                return
+            deck_cards = self._by_deck.setdefault(deck_id, {})
+            was_member = card_number in deck_cards
+            if quantity > 0:
+                deck_cards[card_number] = quantity
+                self._by_card.setdefault(card_number, {})[deck_id] = quantity
+            else:
+                deck_cards.pop(card_number, None)
+                card_decks = self._by_card.get(card_number, {})
+                card_decks.pop(deck_id, None)
+                if not card_decks:
+                    self._by_card.pop(card_number, None)
+                if not deck_cards:
+                    self._by_deck.pop(deck_id, None)
+
+            is_member = quantity > 0
+            if was_member != is_member:
+                for listener in self._membership_listeners:
+                    listener(deck_id, card_number, is_member)
+
+    def reset(self):
+        """Drops the index so it is reloaded from the database on next use."""
+        with self._lock:
+            self._by_card = None
+            self._by_deck = None
+
+
+deck_card_index = DeckCardIndex()
+
+
+def _on_write(table, **details):
+    if table == "DeckCards":
+        deck_card_index.set_quantity(
+            details["deck_id"], details["card_number"], details["quantity"]
+        )
+
+
+register_write_listener(_on_write)
+version_watcher.register("decks", deck_card_index.reset)
@@ -0,0 +1,141 @@
+from db.catalog import main_card_number
+
+# Digimon level of each evolution stage, matched case-insensitively
+STAGE_LEVELS = {
+    "digi-egg": 2,
+    "in-training": 2,
+    "rookie": 3,
+    "champion": 4,
+    "ultimate": 5,
+    "mega": 6,
+}
+
+# Card types that can be placed under a digivolution / that can digivolve
+SOURCE_CARD_TYPES = {"digimon", "digi-egg"}
+TARGET_CARD_TYPES = {"digimon"}
+
+# Upper bound of evolution lines listed for a deck, the first ones in depth-first order
+MAX_DECK_LINES = 200
+
+
+def _level(card):
+    stage = card["stage"]
+    return STAGE_LEVELS.get(stage.casefold()) if stage else None
+
+
+def _colors(card):
+    return frozenset(
+        color for color in (card["color_one"], card["color_two"], card["color_three"]) if color
+    )
+
+
+def _card_type(card):
+    return (card["card_type"] or "").casefold()
+
+
+class EvolutionIndex:
+    """
+    Digivolution adjacency over the main cards of a catalog.
+
+    A Digimon of level N and colors C can digivolve into any Digimon of level N + 1
+    sharing at least one color. Cards with the same level and colors have the same
+    neighbours, so each adjacency list is stored once per (level, colors) group and
+    every card points to its group's tuples.
+    """
+
+    def __init__(self, forward, backward):
+        self._forward = forward
+        self._backward = backward
+
+    @classmethod
+    def build(cls, catalog):
+        # (level, color) -> card numbers, split by the role the card can play
+        sources_by_level_color, targets_by_level_color = {}, {}
+        groups = {}
+        for card in catalog.main_cards():
+            level = _level(card)
+            colors = _colors(card)
+            if level is None or not colors:
+                continue
+            card_type = _card_type(card)
+            for color in colors:
+                if card_type in SOURCE_CARD_TYPES:
+                    sources_by_level_color.setdefault((level, color), []).append(card["card_number"])
+                if card_type in TARGET_CARD_TYPES:
+                    targets_by_level_color.setdefault((level, color), []).append(card["card_number"])
+            groups.setdefault((level, colors, card_type), []).append(card["card_number"])
+
+        forward, backward = {}, {}
+        for (level, colors, card_type), card_numbers in groups.items():
+            evolves_to = ()
+            if card_type in SOURCE_CARD_TYPES:
+                evolves_to = cls._union(targets_by_level_color, level + 1, colors)
+            evolves_from = ()
+            if card_type in TARGET_CARD_TYPES:
+                evolves_from = cls._union(sources_by_level_color, level - 1, colors)
+            for card_number in card_numbers:
+                forward[card_number] = evolves_to
+                backward[card_number] = evolves_from
+        return cls(forward, backward)
+
+    @staticmethod
+    def _union(buckets, level, colors):
+        card_numbers = set()
+        for color in colors:
+            card_numbers.update(buckets.get((level, color), ()))
+        return tuple(sorted(card_numbers))
+
+    def evolves_to(self, card_number):
+        """Returns the card numbers the card can digivolve into."""
+        return self._forward.get(main_card_number(card_number), ())
+
+    def evolves_from(self, card_number):
+        """Returns the card numbers that can digivolve into the card."""
+        return self._backward.get(main_card_number(card_number), ())
+
+    def __contains__(self, card_number):
+        return main_card_number(card_number) in self._forward
+
+    def deck_lines(self, card_numbers):
+        """
+        Builds the evolution graph restricted to the cards of a deck.
+
+        Args:
+            card_numbers (Iterable[str]): Card numbers in the deck (alternatives allowed).
+
+        Returns:
+            dict: 'edges' as [from, to] pairs, 'lines' as every chain from a card
+                with no parent in the deck to a card with no child in the deck (the
+                first MAX_DECK_LINES in depth-first order, roots and children sorted
+                by card number), and 'unconnected' cards with no evolution partner
+                in the deck.
+        """
+        deck = {main_card_number(card_number) for card_number in card_numbers}
+        children = {
+            card: [target for target in self.evolves_to(card) if target in deck]
+            for card in deck
+        }
+        has_parent = {target for targets in children.values() for target in targets}
+
+        edges = [[card, target] for card in sorted(deck) for target in children[card]]
+
+        lines = []
+        roots = sorted(card for card in deck if card not in has_parent and children[card])
+        stack = [[root] for root in reversed(roots)]
+        while stack and len(lines) < MAX_DECK_LINES:
+            line = stack.pop()
+            # A card already in the line would close a cycle
+            next_cards = [target for target in children[line[-1]] if target not in line]
+            if not next_cards:
+                lines.append(line)
+                continue
+            for target in reversed(next_cards):
+                stack.append(line + [target])
+
+        unconnected = sorted(card for card in deck if not children[card] and card not in has_parent)
+        return {"edges": edges, "lines": lines, "unconnected": unconnected}
+
+
+def get_evolution_index(catalog):
+    """Returns the evolution index of a catalog snapshot, building it on first use."""
+    return catalog.derived("evolution", EvolutionIndex.build)
@@ -0,0 +1,79 @@
+"""
+Maintenance commands for the API database.
+
+Usage:
+    python -m db.maintenance schema          Create the tables owned by the API
+    python -m db.maintenance stats --check   Compare collection statistics with a full recount
+    python -m db.maintenance stats --rebuild Recompute collection statistics from scratch
+    python -m db.maintenance prune-changes 90 Delete catalog change records older than 90 days
+    python -m db.maintenance snapshot        Export the catalog to a downloadable snapshot file
+"""
+import argparse
+import sys
+from db.catalog import load_catalog
+from db.snapshot import build_snapshot
+from db.sql import (
+    ensure_schema,
+    check_collection_stats,
+    rebuild_collection_stats,
+    prune_card_changes,
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m db.maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("schema", help="Create the tables owned by the API")
+    stats = commands.add_parser("stats", help="Check or rebuild collection statistics")
+    stats.add_argument("--check", action="store_true", help="Only report inconsistencies")
+    stats.add_argument("--rebuild", action="store_true", help="Recompute every counter")
+    prune = commands.add_parser("prune-changes", help="Delete old catalog change records")
+    prune.add_argument("keep_days", type=int, help="Days of change history to keep")
+    commands.add_parser("snapshot", help="Export the catalog to a snapshot file")
+    args = parser.parse_args(argv)
+
+    if not ensure_schema():
+        print("Could not connect to the database")
+        return 1
+
+    if args.command == "schema":
+        print("Schema ready")
+        return 0
+
+    if args.command == "snapshot":
+        manifest = build_snapshot(load_catalog(use_cache=False))
+        if manifest is None:
+            print("Could not read the catalog")
+            return 1
+        print(f"{manifest['file']}: {manifest['rows']} cards, {manifest['size']} bytes")
+        return 0
+
+    if args.command == "prune-changes":
+        deleted = prune_card_changes(args.keep_days)
+        if deleted is None:
+            print("Could not prune catalog changes")
+            return 1
+        print(f"{deleted} change records deleted")
+        return 0
+
+    if args.rebuild:
+        if not rebuild_collection_stats():
+            print("Could not rebuild collection statistics")
+            return 1
+        print("Collection statistics rebuilt")
+
+    differences = check_collection_stats()
+    if differences is None:
+        print("Could not check collection statistics")
+        return 1
+    for difference in differences:
+        print(
+            f"{difference['dimension']} {difference['value_id']} alternative={difference['alternative']}: "
+            f"stored {difference['stored']}, expected {difference['expected']}"
+        )
+    print(f"{len(differences)} inconsistent counters")
+    return 1 if differences and not args.rebuild else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+from array import array
+
+# Columns of integers without NULLs are stored as int64 arrays
+_INT64_MIN, _INT64_MAX = -(2 ** 63), 2 ** 63 - 1
+
+
+def _compact_column(values, strings):
+    """
+    Stores a column in the smallest form that keeps its values: an int64 array if
+    every value is a non-NULL integer, otherwise a tuple whose equal strings share
+    one object (aux names such as colors or rarities repeat on every card).
+    """
+    if values and all(type(value) is int and _INT64_MIN <= value <= _INT64_MAX for value in values):
+        return array("q", values)
+    return tuple(
+        strings.setdefault(value, value) if type(value) is str else value for value in values
+    )
+
+
+class CardRecords:
+    """
+    Column-oriented card rows: one compact column per field instead of one dict
+    per row repeating every key. Rows are decoded into dicts only when accessed
+    (indexing, iteration), so code written for lists of dicts keeps working, and
+    serializers can read the columns directly.
+    """
+
+    __slots__ = ("columns", "_values", "_length")
+
+    def __init__(self, columns, values, length):
+        self.columns = tuple(columns)
+        self._values = values
+        self._length = length
+
+    @classmethod
+    def from_tuples(cls, columns, rows):
+        """
+        Builds the records from row tuples, such as a plain cursor's fetchall().
+
+        Args:
+            columns (Iterable[str]): Field names, in the order of the tuple values.
+            rows (list[tuple]): Rows.
+        """
+        columns = list(columns)
+        strings = {}
+        transposed = list(zip(*rows)) if rows else [() for _ in columns]
+        values = [_compact_column(column, strings) for column in transposed]
+        return cls(columns, values, len(rows))
+
+    @classmethod
+    def from_dicts(cls, rows):
+        """Builds the records from a list of dicts with the same keys."""
+        columns = list(rows[0].keys()) if rows else []
+        return cls.from_tuples(columns, [tuple(row[column] for column in columns) for row in rows])
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Builds the records from {field: [values]} (see to_columns)."""
+        names = list(columns)
+        return cls.from_tuples(names, list(zip(*(columns[name] for name in names))))
+
+    def column(self, name):
+        """Returns the values of a field in row order."""
+        return self._values[self.columns.index(name)]
+
+    def to_columns(self):
+        """Returns {field: [values]}."""
+        return {name: list(values) for name, values in zip(self.columns, self._values)}
+
+    def row(self, position):
+        return {name: values[position] for name, values in zip(self.columns, self._values)}
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self.row(row) for row in range(*position.indices(self._length))]
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError("card position out of range")
+        return self.row(position)
+
+    def __iter__(self):
+        for position in range(self._length):
+            yield self.row(position)
+
+    def to_list(self):
+        """Returns the rows as a list of dicts, for serialization."""
+        return list(self)
+
+    def index(self, name):
+        """Returns a RecordIndex on a field whose values are unique."""
+        return RecordIndex(self, name)
+
+
+class RecordIndex:
+    """Read-only field value -> row mapping over CardRecords, holding positions only."""
+
+    __slots__ = ("_records", "_positions")
+
+    def __init__(self, records, name):
+        self._records = records
+        self._positions = {value: position for position, value in enumerate(records.column(name))}
+
+    def get(self, value, default=None):
+        position = self._positions.get(value)
+        return default if position is None else self._records.row(position)
+
+    def __getitem__(self, value):
+        return self._records.row(self._positions[value])
+
+    def __contains__(self, value):
+        return value in self._positions
+
+    def __len__(self):
+        return len(self._positions)
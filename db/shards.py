@@ -0,0 +1,105 @@
+import hashlib
+import json
+
+# Shard kind -> catalog fields whose values name the shards a card belongs to
+SHARD_FIELDS = {
+    "set": ["bt_abbreviation"],
+    "color": ["color_one", "color_two", "color_three"],
+    "type": ["card_type"],
+}
+
+
+def _etag(cards):
+    payload = json.dumps(cards, sort_keys=True, default=str).encode()
+    return '"' + hashlib.sha256(payload).hexdigest()[:32] + '"'
+
+
+class Shard:
+    """
+    Catalog positions of the cards of one shard, with an ETag per variant.
+    Positions are tuples, or arrays mapped from a catalog file.
+    """
+
+    __slots__ = ("kind", "name", "positions", "main_positions", "etag", "main_etag")
+
+    def __init__(self, kind, name, positions, main_positions, etag, main_etag):
+        self.kind = kind
+        self.name = name
+        self.positions = positions
+        self.main_positions = main_positions
+        self.etag = etag
+        self.main_etag = main_etag
+
+    @classmethod
+    def from_cards(cls, kind, name, positions, cards):
+        positions = tuple(positions)
+        main_positions = tuple(p for p in positions if not cards[p]["alternative"])
+        return cls(
+            kind,
+            name,
+            positions,
+            main_positions,
+            _etag([cards[p] for p in positions]),
+            _etag([cards[p] for p in main_positions]),
+        )
+
+
+class ShardIndex:
+    """
+    Precomputed set/color/card type -> cards index over a catalog snapshot.
+
+    Each shard has a content hash used as its ETag, so a client syncing the catalog
+    shard by shard only downloads the shards whose ETag changed.
+    """
+
+    def __init__(self, shards):
+        # (kind, casefolded name) -> Shard
+        self._shards = shards
+
+    @classmethod
+    def build(cls, catalog):
+        return cls.from_cards(catalog.cards)
+
+    @classmethod
+    def from_cards(cls, cards):
+        positions = {}
+        for position, card in enumerate(cards):
+            for kind, fields in SHARD_FIELDS.items():
+                for name in {card.get(field) for field in fields if card.get(field)}:
+                    positions.setdefault((kind, name), []).append(position)
+        return cls.from_shards(
+            Shard.from_cards(kind, name, shard_positions, cards)
+            for (kind, name), shard_positions in positions.items()
+        )
+
+    @classmethod
+    def from_shards(cls, shards):
+        return cls({(shard.kind, shard.name.casefold()): shard for shard in shards})
+
+    def shards(self):
+        """Returns every Shard."""
+        return list(self._shards.values())
+
+    def get(self, kind, name):
+        """Returns the Shard for a kind and name (case-insensitive), or None."""
+        return self._shards.get((kind, name.casefold()))
+
+    def manifest(self, include_alternative=True):
+        """
+        Returns:
+            list[dict]: kind, name, card count and ETag of every shard.
+        """
+        return [
+            {
+                "kind": shard.kind,
+                "name": shard.name,
+                "cards": len(shard.positions if include_alternative else shard.main_positions),
+                "etag": shard.etag if include_alternative else shard.main_etag,
+            }
+            for _, shard in sorted(self._shards.items())
+        ]
+
+
+def get_shard_index(catalog):
+    """Returns the shard index of a catalog snapshot, building it on first use."""
+    return catalog.derived("shards", ShardIndex.build)
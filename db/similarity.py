@@ -0,0 +1,168 @@
+import math
+import re
+import numpy as np
+
+# Size of the effect text vocabulary, the most frequent terms are kept
+MAX_TEXT_FEATURES = 512
+
+# Relative weight of each feature block in the cosine similarity
+CATEGORY_WEIGHT = 1.0
+NUMERIC_WEIGHT = 0.5
+TEXT_WEIGHT = 1.0
+
+CATEGORY_FIELDS = {
+    "card_type": ["card_type"],
+    "color": ["color_one", "color_two", "color_three"],
+    "stage": ["stage"],
+    "attribute": ["attribute"],
+    "type": ["type_one", "type_two"],
+}
+NUMERIC_FIELDS = ["cost", "dp", "evolution_cost_one", "evolution_cost_two"]
+TEXT_FIELDS = ["effect", "evolution_effect", "security_effect"]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_NUMBER_RE = re.compile(r"-?\d+")
+
+
+def _to_number(value):
+    """Returns the first integer found in value, or None."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_RE.search(str(value))
+    return float(match.group()) if match else None
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _category_block(cards):
+    vocab = {}
+    for field, columns in CATEGORY_FIELDS.items():
+        for card in cards:
+            for column in columns:
+                if card[column] is not None:
+                    vocab.setdefault((field, card[column]), len(vocab))
+
+    block = np.zeros((len(cards), len(vocab)), dtype=np.float32)
+    for row, card in enumerate(cards):
+        for field, columns in CATEGORY_FIELDS.items():
+            for column in columns:
+                if card[column] is not None:
+                    block[row, vocab[(field, card[column])]] = 1.0
+    return block
+
+
+def _numeric_block(cards):
+    block = np.zeros((len(cards), len(NUMERIC_FIELDS) * 2), dtype=np.float32)
+    for col, field in enumerate(NUMERIC_FIELDS):
+        values = [_to_number(card[field]) for card in cards]
+        present = [value for value in values if value is not None]
+        if not present:
+            continue
+        low, high = min(present), max(present)
+        span = (high - low) or 1.0
+        for row, value in enumerate(values):
+            if value is not None:
+                # Min-max scaled value plus a presence flag, so a missing DP differs from DP 0
+                block[row, col * 2] = (value - low) / span
+                block[row, col * 2 + 1] = 1.0
+    return block
+
+
+def _text_block(cards):
+    documents = []
+    document_frequency = {}
+    for card in cards:
+        text = " ".join(card[field] or "" for field in TEXT_FIELDS).lower()
+        terms = {}
+        for token in _TOKEN_RE.findall(text):
+            terms[token] = terms.get(token, 0) + 1
+        documents.append(terms)
+        for token in terms:
+            document_frequency[token] = document_frequency.get(token, 0) + 1
+
+    # Terms appearing on a single card say nothing about similarity
+    candidates = [term for term, df in document_frequency.items() if df > 1]
+    candidates.sort(key=lambda term: (-document_frequency[term], term))
+    vocab = {term: col for col, term in enumerate(candidates[:MAX_TEXT_FEATURES])}
+
+    total = len(cards)
+    idf = np.zeros(len(vocab), dtype=np.float32)
+    for term, col in vocab.items():
+        idf[col] = math.log((1 + total) / (1 + document_frequency[term])) + 1.0
+
+    block = np.zeros((total, len(vocab)), dtype=np.float32)
+    for row, terms in enumerate(documents):
+        for term, count in terms.items():
+            col = vocab.get(term)
+            if col is not None:
+                block[row, col] = count
+    return block * idf
+
+
+class SimilarityIndex:
+    """
+    Row-normalized feature matrix of every main card, so the cosine similarity of
+    all cards against a batch of cards is a single matrix product.
+
+    Features are one-hot auxiliary fields (type, colors, stage, attribute, Digimon types),
+    min-max scaled numbers (cost, DP, evolution costs) and TF-IDF of the effect texts.
+    """
+
+    def __init__(self, card_numbers, matrix):
+        self.card_numbers = card_numbers
+        self.positions = {card_number: row for row, card_number in enumerate(card_numbers)}
+        self.matrix = matrix
+
+    @classmethod
+    def build(cls, catalog):
+        cards = catalog.main_cards()
+        blocks = [
+            _normalize_rows(_category_block(cards)) * CATEGORY_WEIGHT,
+            _normalize_rows(_numeric_block(cards)) * NUMERIC_WEIGHT,
+            _normalize_rows(_text_block(cards)) * TEXT_WEIGHT,
+        ]
+        matrix = _normalize_rows(np.hstack(blocks)).astype(np.float32)
+        return cls([card["card_number"] for card in cards], matrix)
+
+    def top_k(self, card_numbers, k=10):
+        """
+        Finds the k most similar cards for each of the given cards.
+
+        Args:
+            card_numbers (list[str]): Cards to query, unknown numbers are skipped.
+            k (int): Number of similar cards per query card.
+
+        Returns:
+            dict[str, list[tuple[str, float]]]: Similar card numbers with their cosine similarity.
+        """
+        rows = [self.positions[number] for number in card_numbers if number in self.positions]
+        if not rows:
+            return {}
+
+        # (cards x features) @ (features x queries) gives every similarity at once
+        scores = self.matrix @ self.matrix[rows].T
+        scores[rows, range(len(rows))] = -np.inf
+        k = min(k, len(self.card_numbers) - 1)
+        if k <= 0:
+            return {self.card_numbers[row]: [] for row in rows}
+
+        results = {}
+        for col, row in enumerate(rows):
+            column = scores[:, col]
+            best = np.argpartition(-column, k - 1)[:k]
+            best = best[np.argsort(-column[best], kind="stable")]
+            results[self.card_numbers[row]] = [
+                (self.card_numbers[i], round(float(column[i]), 4)) for i in best
+            ]
+        return results
+
+
+def get_similarity_index(catalog):
+    """Returns the similarity index of a catalog snapshot, building it on first use."""
+    return catalog.derived("similarity", SimilarityIndex.build)
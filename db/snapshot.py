@@ -0,0 +1,230 @@
+import glob
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+# Directory holding the built snapshot files
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+# Snapshot files kept on disk, older ones are deleted after a build
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))
+# Rows per row group, a single row is read by decompressing one group of each column
+ROW_GROUP_SIZE = 512
+
+FORMAT_VERSION = 1
+MAGIC = b"DCGSNAP\x00"
+_HEADER_LENGTH = struct.Struct("<I")
+LATEST_FILE = "latest.json"
+
+
+def _pack(values):
+    return zlib.compress(
+        json.dumps(values, separators=(",", ":"), default=str).encode(), 9
+    )
+
+
+def write_snapshot(catalog, catalog_version, path):
+    """
+    Writes a catalog snapshot file.
+
+    Layout: MAGIC, the header length (uint32, little endian), the JSON header and
+    the compressed blocks. The header holds the column names, every card number in
+    row order and the offset/length of each block, relative to the end of the header.
+    Each block is one column of one row group (or the aux tables), stored as a
+    zlib-compressed JSON list.
+
+    Args:
+        catalog (Catalog): Catalog snapshot to export.
+        catalog_version (int): Catalog version (see get_catalog_version) of the data.
+        path (str): File to write.
+    """
+    columns = list(catalog.cards[0].keys()) if catalog.cards else []
+    blocks = []
+    offset = 0
+
+    def add_block(data):
+        nonlocal offset
+        blocks.append(data)
+        location = [offset, len(data)]
+        offset += len(data)
+        return location
+
+    aux = add_block(_pack(catalog.aux))
+    groups = []
+    for start in range(0, len(catalog.cards), ROW_GROUP_SIZE):
+        rows = catalog.cards[start:start + ROW_GROUP_SIZE]
+        groups.append([add_block(_pack([row[column] for row in rows])) for column in columns])
+
+    header = json.dumps(
+        {
+            "format": FORMAT_VERSION,
+            "catalog_version": catalog_version,
+            "rows": len(catalog.cards),
+            "row_group_size": ROW_GROUP_SIZE,
+            "columns": columns,
+            "card_numbers": [card["card_number"] for card in catalog.cards],
+            "aux": aux,
+            "groups": groups,
+        },
+        separators=(",", ":"),
+    ).encode()
+
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(_HEADER_LENGTH.pack(len(header)))
+        file.write(header)
+        for block in blocks:
+            file.write(block)
+
+
+class SnapshotReader:
+    """
+    Reads a snapshot file. Only the header is parsed when opened, rows and aux
+    tables are decompressed when requested.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a catalog snapshot")
+            (length,) = _HEADER_LENGTH.unpack(file.read(_HEADER_LENGTH.size))
+            self.header = json.loads(file.read(length))
+        if self.header["format"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {self.header['format']}")
+        self._data_start = len(MAGIC) + _HEADER_LENGTH.size + length
+        self._rows = {
+            card_number: row for row, card_number in enumerate(self.header["card_numbers"])
+        }
+
+    def _block(self, file, location):
+        offset, length = location
+        file.seek(self._data_start + offset)
+        return json.loads(zlib.decompress(file.read(length)))
+
+    def aux(self):
+        """Returns the auxiliary tables stored in the snapshot."""
+        with open(self.path, "rb") as file:
+            return self._block(file, self.header["aux"])
+
+    def row(self, card_number):
+        """Returns the card with this card number, or None if it is not in the snapshot."""
+        row = self._rows.get(card_number)
+        if row is None:
+            return None
+        group, position = divmod(row, self.header["row_group_size"])
+        with open(self.path, "rb") as file:
+            values = [
+                self._block(file, location)[position]
+                for location in self.header["groups"][group]
+            ]
+        return dict(zip(self.header["columns"], values))
+
+    def rows(self):
+        """Returns every card of the snapshot in row order."""
+        columns = self.header["columns"]
+        cards = []
+        with open(self.path, "rb") as file:
+            for group in self.header["groups"]:
+                values = [self._block(file, location) for location in group]
+                cards.extend(dict(zip(columns, row)) for row in zip(*values))
+        return cards
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_build_lock = threading.Lock()
+
+
+def build_snapshot(catalog, directory=SNAPSHOT_DIR):
+    """
+    Exports a catalog to a new snapshot file named after its content hash, and
+    points latest.json to it. The same data always gives the same file, and files
+    are never modified once written, so they can be served as immutable downloads.
+    The snapshot carries the version the catalog was loaded at (Catalog.version),
+    not the current one, so no change made since the load is skipped by clients.
+
+    Returns:
+        dict or None: The snapshot manifest (file, sha256, size, catalog_version,
+            built_at, rows), or None if the catalog is empty.
+    """
+    if catalog is None or not catalog.cards:
+        return None
+
+    with _build_lock:
+        os.makedirs(directory, exist_ok=True)
+        catalog_version = catalog.version or 0
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(descriptor)
+        try:
+            write_snapshot(catalog, catalog_version, temp_path)
+            sha256 = _file_sha256(temp_path)
+            file_name = f"catalog-{sha256[:16]}.dcgsnap"
+            os.replace(temp_path, os.path.join(directory, file_name))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        header = SnapshotReader(os.path.join(directory, file_name)).header
+        manifest = {
+            "file": file_name,
+            "sha256": sha256,
+            "size": os.path.getsize(os.path.join(directory, file_name)),
+            "catalog_version": header["catalog_version"],
+            "built_at": int(time.time()),
+            "rows": header["rows"],
+        }
+        latest_temp = os.path.join(directory, LATEST_FILE + ".tmp")
+        with open(latest_temp, "w") as file:
+            json.dump(manifest, file)
+        os.replace(latest_temp, os.path.join(directory, LATEST_FILE))
+
+        _prune_snapshots(directory, keep=file_name)
+        return manifest
+
+
+def _prune_snapshots(directory, keep):
+    files = sorted(
+        glob.glob(os.path.join(directory, "catalog-*.dcgsnap")),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for path in files[SNAPSHOT_KEEP:]:
+        if os.path.basename(path) != keep:
+            os.remove(path)
+
+
+def latest_snapshot(directory=SNAPSHOT_DIR):
+    """
+    Returns:
+        dict or None: The manifest of the latest built snapshot, or None if there is none.
+    """
+    try:
+        with open(os.path.join(directory, LATEST_FILE)) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(os.path.join(directory, manifest["file"])):
+        return None
+    return manifest
+
+
+def snapshot_path(file_name, directory=SNAPSHOT_DIR):
+    """
+    Returns:
+        str or None: Path of a built snapshot file, or None if the name is not a snapshot on disk.
+    """
+    if os.path.basename(file_name) != file_name or not file_name.endswith(".dcgsnap"):
+        return None
+    path = os.path.join(directory, file_name)
+    return path if os.path.isfile(path) else None
@@ -3,83 +3,408 @@ from dotenv import load_dotenv
 import mysql.connector
 from mysql.connector import Error
 from math import ceil
+from core.deadlines import mark_deadline_exceeded, time_remaining
+from db.breaker import db_breaker
+from db.records import CardRecords
 
 load_dotenv()
 
 
 # * Connection
+# Upper bound of a connection attempt, in seconds
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "3"))
+# Read timeout and statement time limit outside of requests (background jobs), in seconds
+DB_QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", "30"))
+
+
+# MySQL errors meaning the server is down or too slow, rather than a bad statement
+_UNAVAILABLE_ERRORS = {
+    2006,  # Server has gone away
+    2013,  # Lost connection during query (read timeout)
+    2055,  # Lost connection to the server
+    3024,  # max_execution_time exceeded
+}
+
+
+def _guarded(call, *args, **kwargs):
+    """
+    Runs a statement call, recording a failure in the circuit breaker if the
+    database is unreachable or timed out, so slow queries open the circuit like
+    failed connections do. Any answer of the server (a result or an error about
+    the statement) counts as a success.
+    """
+    try:
+        result = call(*args, **kwargs)
+    except Error as e:
+        if e.errno in _UNAVAILABLE_ERRORS or isinstance(
+            e, (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)
+        ):
+            db_breaker.record_failure()
+            remaining = time_remaining()
+            if remaining is not None and remaining <= 0:
+                mark_deadline_exceeded()
+        else:
+            db_breaker.record_success()
+        raise
+    db_breaker.record_success()
+    return result
+
+
+class _GuardedCursor:
+    """Cursor whose statements and fetches go through _guarded."""
+
+    _GUARDED = {"execute", "executemany", "fetchone", "fetchmany", "fetchall"}
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if name in self._GUARDED:
+            return lambda *args, **kwargs: _guarded(attribute, *args, **kwargs)
+        return attribute
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class _GuardedConnection:
+    """Connection handing out _GuardedCursor and guarding commit."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, *args, **kwargs):
+        return _GuardedCursor(self._connection.cursor(*args, **kwargs))
+
+    def commit(self):
+        _guarded(self._connection.commit)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
 def _create_connection():
     """
     Connects to the MySQL database using environment variables.
+    While the database circuit breaker is open, returns None at once instead of
+    waiting for the connection to fail. Statements that fail because the server
+    is unreachable or timed out are recorded in the circuit breaker too.
+
+    The time left before the request deadline (see core.deadlines) bounds the
+    connect and read timeouts and the session max_execution_time, which makes
+    MySQL abort SELECT statements running longer. Without time left, no
+    connection is attempted.
     Returns:
         connection: MySQL connection object or None if connection fails.
     """
+    remaining = time_remaining()
+    if remaining is not None and remaining <= 0:
+        mark_deadline_exceeded()
+        return None
+    timeout = DB_QUERY_TIMEOUT if remaining is None else remaining
+    if not db_breaker.allow():
+        return None
     try:
         connection = mysql.connector.connect(
             host=os.getenv("DB_HOST"),
             user=os.getenv("DB_USER"),
             password=os.getenv("DB_PASSWORD"),
             database=os.getenv("DB_NAME"),
+            connection_timeout=max(ceil(min(timeout, DB_CONNECT_TIMEOUT)), 1),
+            read_timeout=max(ceil(timeout), 1),
+            write_timeout=max(ceil(timeout), 1),
+            init_command=f"SET SESSION max_execution_time = {max(int(timeout * 1000), 1)}",
         )
-        return connection
     except Error as e:
+        db_breaker.record_failure()
+        remaining = time_remaining()
+        if remaining is not None and remaining <= 0:
+            mark_deadline_exceeded()
         print(f"MySQL connection error: {e}")
         return None
+    except Exception:
+        db_breaker.record_failure()
+        raise
+    if not db_breaker.available:
+        # The probe connection closes the circuit. Otherwise only statements reset the
+        # failure count, so connections that succeed do not hide queries timing out.
+        db_breaker.record_success()
+    return _GuardedConnection(connection)
+
+
+# * Write listeners
+_write_listeners = []
+
+
+def register_write_listener(listener):
+    """
+    Registers a callable that is notified after every committed write.
+
+    Args:
+        listener (callable): Called as listener(table, **details), where table is the
+            name of the modified table and details identify the changed row.
+    """
+    _write_listeners.append(listener)
+
+
+def _notify_write(table, **details):
+    """
+    Notifies every registered listener about a committed write.
+    A failing listener never breaks the write that triggered it.
+    """
+    for listener in _write_listeners:
+        try:
+            listener(table, **details)
+        except Exception as e:
+            print(f"Write listener error: {e}")
+
+
+# * Schema
+# Tables owned by the API, the card catalog tables are filled by the scraper
+SCHEMA_TABLES = {
+    "CollectionStats": """
+        CREATE TABLE IF NOT EXISTS CollectionStats (
+            dimension VARCHAR(16) NOT NULL,
+            value_id INT NOT NULL,
+            alternative TINYINT(1) NOT NULL,
+            unique_cards INT NOT NULL DEFAULT 0,
+            total_quantity INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value_id, alternative)
+        )
+    """,
+    "CardChanges": """
+        CREATE TABLE IF NOT EXISTS CardChanges (
+            version BIGINT NOT NULL PRIMARY KEY,
+            card_number VARCHAR(50) NOT NULL,
+            operation ENUM('insert', 'update', 'delete', 'reset') NOT NULL,
+            changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_card_changes_changed_at (changed_at)
+        )
+    """,
+    "DataVersions": """
+        CREATE TABLE IF NOT EXISTS DataVersions (
+            name VARCHAR(32) NOT NULL PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    """,
+}
+
+# Data versions bumped by the API writes, and 'catalog' by the CardChanges triggers
+DATA_VERSION_NAMES = ["collection", "decks", "catalog"]
+
+
+def _record_change(card_number, operation):
+    """
+    Trigger statements recording a catalog change. The version comes from the
+    DataVersions 'catalog' counter: the counter row stays locked until the writing
+    transaction commits, so catalog writers commit in version order and a reader
+    never sees a version before the smaller ones.
+    """
+    return f"""
+        UPDATE DataVersions SET version = version + 1 WHERE name = 'catalog';
+        INSERT INTO CardChanges (version, card_number, operation)
+            SELECT version, {card_number}, '{operation}' FROM DataVersions WHERE name = 'catalog';
+    """
+
+
+# Triggers recording every catalog change in CardChanges, whoever writes the catalog.
+# Changes to auxiliary tables rename fields of many cards, so they record a 'reset'.
+SCHEMA_TRIGGERS = {
+    "cards_changes_after_insert": f"""
+        CREATE TRIGGER cards_changes_after_insert AFTER INSERT ON Cards FOR EACH ROW
+        BEGIN
+            {_record_change("NEW.card_number", "insert")}
+        END
+    """,
+    "cards_changes_after_update": f"""
+        CREATE TRIGGER cards_changes_after_update AFTER UPDATE ON Cards FOR EACH ROW
+        BEGIN
+            IF NOT (OLD.card_number <=> NEW.card_number) THEN
+                {_record_change("OLD.card_number", "delete")}
+            END IF;
+            {_record_change("NEW.card_number", "update")}
+        END
+    """,
+    "cards_changes_after_delete": f"""
+        CREATE TRIGGER cards_changes_after_delete AFTER DELETE ON Cards FOR EACH ROW
+        BEGIN
+            {_record_change("OLD.card_number", "delete")}
+        END
+    """,
+}
+for _aux_table in ["BTs", "Colors", "CardTypes", "Rarities", "Stages", "Attributes", "Types"]:
+    for _event in ["UPDATE", "DELETE"]:
+        _trigger = f"{_aux_table.lower()}_changes_after_{_event.lower()}"
+        SCHEMA_TRIGGERS[_trigger] = f"""
+            CREATE TRIGGER {_trigger} AFTER {_event} ON {_aux_table} FOR EACH ROW
+            BEGIN
+                {_record_change("'*'", "reset")}
+            END
+        """
+
+# MySQL error raised when another worker created the trigger first
+_TRIGGER_EXISTS = 1359
+
+_schema_ready = False
+# False when the CardChanges triggers could not be created (TRIGGER privilege, or
+# SUPER / log_bin_trust_function_creators with binary logging): the change log is
+# then incomplete and /cards/changes always asks for a full reload
+_change_tracking = True
+
+
+def ensure_schema():
+    """
+    Creates the tables and triggers owned by the API if they are missing.
+    Runs once per process, a newly created CollectionStats table is filled from the collection.
+    A trigger that cannot be created only disables change tracking (see
+    change_tracking_available).
+
+    Returns:
+        bool: True if the schema is ready.
+    """
+    global _schema_ready, _change_tracking
+    if _schema_ready:
+        return True
+
+    connection = _create_connection()
+    if not connection:
+        return False
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SHOW TABLES")
+        existing = {row[0] for row in cursor.fetchall()}
+        for table, statement in SCHEMA_TABLES.items():
+            if table not in existing:
+                cursor.execute(statement)
+        cursor.executemany(
+            "INSERT IGNORE INTO DataVersions (name) VALUES (%s)",
+            [(name,) for name in DATA_VERSION_NAMES],
+        )
+        connection.commit()
+        cursor.execute("SHOW TRIGGERS")
+        existing_triggers = {row[0] for row in cursor.fetchall()}
+        for trigger, statement in SCHEMA_TRIGGERS.items():
+            if trigger not in existing_triggers:
+                try:
+                    cursor.execute(statement)
+                except Error as e:
+                    if e.errno != _TRIGGER_EXISTS:
+                        print(f"Could not create trigger {trigger}, catalog delta sync disabled: {e}")
+                        _change_tracking = False
+    except Error as e:
+        print(f"Schema error: {e}")
+        return False
+    finally:
+        connection.close()
+
+    _schema_ready = True
+    if "CollectionStats" not in existing:
+        rebuild_collection_stats()
+    return True
+
+
+def change_tracking_available():
+    """Returns False if the CardChanges triggers are missing, so the change log is incomplete."""
+    return _change_tracking
+
+
+# * Field projection
+# Card field -> (SQL expression, join it needs or None), in the order fields are returned
+CARD_FIELDS = {
+    "id": ("c.id", None),
+    "card_number": ("c.card_number", None),
+    "name": ("c.name", None),
+    "dp": ("c.dp", None),
+    "card_type": ("ct.name", "LEFT JOIN CardTypes ct ON ct.id = c.card_type_id"),
+    "rarity": ("r.name", "LEFT JOIN Rarities r ON r.id = c.rarity_id"),
+    "color_one": ("co1.name", "LEFT JOIN Colors co1 ON co1.id = c.color_one_id"),
+    "color_two": ("co2.name", "LEFT JOIN Colors co2 ON co2.id = c.color_two_id"),
+    "color_three": ("co3.name", "LEFT JOIN Colors co3 ON co3.id = c.color_three_id"),
+    "image_url": ("c.image_url", None),
+    "cost": ("c.cost", None),
+    "stage": ("s.name", "LEFT JOIN Stages s ON s.id = c.stage_id"),
+    "attribute": ("a.name", "LEFT JOIN Attributes a ON a.id = c.attribute_id"),
+    "type_one": ("t1.name", "LEFT JOIN Types t1 ON t1.id = c.type_one_id"),
+    "type_two": ("t2.name", "LEFT JOIN Types t2 ON t2.id = c.type_two_id"),
+    "evolution_cost_one": ("c.evolution_cost_one", None),
+    "evolution_cost_two": ("c.evolution_cost_two", None),
+    "effect": ("c.effect", None),
+    "evolution_effect": ("c.evolution_effect", None),
+    "security_effect": ("c.security_effect", None),
+    "bt_abbreviation": ("bt.abbreviation", "LEFT JOIN BTs bt ON bt.id = c.bt_id"),
+    "alternative": ("c.alternative", None),
+}
+
+# Fields returned by get_all_cards / get_all_cards_full_info when none are requested
+CARD_LIST_FIELDS = [
+    "id", "card_number", "name", "card_type", "rarity",
+    "color_one", "color_two", "color_three", "image_url", "cost",
+    "stage", "attribute", "type_one", "type_two",
+    "bt_abbreviation", "alternative",
+]
+CARD_FULL_FIELDS = list(CARD_FIELDS)
+# Fields of the main cards returned by search_cards_with_alternatives_by_name, which are never alternatives
+SEARCH_WITH_ALTERNATIVES_FIELDS = [field for field in CARD_FIELDS if field != "alternative"]
+
+
+def _card_projection(fields):
+    """
+    Builds the SELECT list and joins for a subset of CARD_FIELDS, so auxiliary
+    tables are only joined when one of their fields is requested.
+
+    Args:
+        fields (list[str]): Field names, all of them keys of CARD_FIELDS.
+
+    Returns:
+        tuple: (select_list, joins)
+    """
+    columns, joins = [], []
+    for field in dict.fromkeys(fields):
+        expression, join = CARD_FIELDS[field]
+        columns.append(f"{expression} AS {field}")
+        if join:
+            joins.append(join)
+    return ",\n            ".join(columns), "\n        ".join(joins)
 
 
 # * Cards list
-def get_all_cards(include_alternative=True):
+def get_all_cards(include_alternative=True, fields=None):
     """
     Fetches all cards with full descriptive data by replacing foreign key IDs with their names.
+
+    Args:
+        include_alternative (bool): Whether to include alternative artwork cards.
+        fields (list[str], optional): CARD_FIELDS to select (default: CARD_LIST_FIELDS).
+
+    Returns:
+        CardRecords or None: The cards, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
 
-    alt_filter = "" if include_alternative else "WHERE alternative = 0"
+    alt_filter = "" if include_alternative else "WHERE c.alternative = 0"
+    columns, joins = _card_projection(fields or CARD_LIST_FIELDS)
 
     query = f"""
         SELECT
-            c.id,
-            c.card_number,
-            c.name,
-            ct.name AS card_type,
-            r.name AS rarity,
-            co1.name AS color_one,
-            co2.name AS color_two,
-            co3.name AS color_three,
-            c.image_url,
-            c.cost,
-            s.name AS stage,
-            a.name AS attribute,
-            t1.name AS type_one,
-            t2.name AS type_two,
-            bt.abbreviation AS bt_abbreviation,
-            c.alternative
+            {columns}
         FROM Cards c
-        LEFT JOIN CardTypes ct ON ct.id = c.card_type_id
-        LEFT JOIN Rarities r ON r.id = c.rarity_id
-        LEFT JOIN Colors co1 ON co1.id = c.color_one_id
-        LEFT JOIN Colors co2 ON co2.id = c.color_two_id
-        LEFT JOIN Colors co3 ON co3.id = c.color_three_id
-        LEFT JOIN Stages s ON s.id = c.stage_id
-        LEFT JOIN Attributes a ON a.id = c.attribute_id
-        LEFT JOIN Types t1 ON t1.id = c.type_one_id
-        LEFT JOIN Types t2 ON t2.id = c.type_two_id
-        LEFT JOIN BTs bt ON bt.id = c.bt_id
+        {joins}
         {alt_filter}
         ORDER BY c.name ASC
     """
 
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         cursor.execute(query)
-        return cursor.fetchall()
+        return CardRecords.from_tuples(cursor.column_names, cursor.fetchall())
     finally:
         connection.close()
 
 
-def get_all_cards_with_ids(include_alternative: bool = True) -> list[dict]:
+def get_all_cards_with_ids(include_alternative: bool = True) -> CardRecords:
     """
     Fetches all cards with full descriptive data, returning the IDs of foreign keys instead of names.
     
@@ -87,11 +412,11 @@ def get_all_cards_with_ids(include_alternative: bool = True) -> list[dict]:
         include_alternative (bool): If False, excludes alternative cards (alternative = 1).
     
     Returns:
-        List of dictionaries, each representing a card with IDs for foreign keys.
+        CardRecords or None: The cards with IDs for foreign keys, or None if the query fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
 
     alt_filter = "" if include_alternative else "WHERE c.alternative = 0"
 
@@ -119,78 +444,63 @@ def get_all_cards_with_ids(include_alternative: bool = True) -> list[dict]:
     """
 
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         cursor.execute(query)
-        cards = cursor.fetchall()
-        return cards
+        return CardRecords.from_tuples(cursor.column_names, cursor.fetchall())
     except Exception as e:
         print(f"Error al obtener cartas: {e}")
-        return []
+        return None
     finally:
         connection.close()
 
 
-def get_all_cards_full_info(include_alternative=True):
+def get_all_cards_full_info(include_alternative=True, fields=None):
     """
     Fetches all cards with full descriptive data by replacing foreign key IDs with their names.
+
+    Args:
+        include_alternative (bool): Whether to include alternative artwork cards.
+        fields (list[str], optional): CARD_FIELDS to select (default: all of them).
+
+    Returns:
+        CardRecords or None: The cards, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
 
-    alt_filter = "" if include_alternative else "WHERE alternative = 0"
+    alt_filter = "" if include_alternative else "WHERE c.alternative = 0"
+    columns, joins = _card_projection(fields or CARD_FULL_FIELDS)
 
     query = f"""
         SELECT
-            c.id,
-            c.card_number,
-            c.name,
-            c.dp,
-            ct.name AS card_type,
-            r.name AS rarity,
-            co1.name AS color_one,
-            co2.name AS color_two,
-            co3.name AS color_three,
-            c.image_url,
-            c.cost,
-            s.name AS stage,
-            a.name AS attribute,
-            t1.name AS type_one,
-            t2.name AS type_two,
-            c.evolution_cost_one,
-            c.evolution_cost_two,
-            c.effect,
-            c.evolution_effect,
-            c.security_effect,
-            bt.abbreviation AS bt_abbreviation,
-            c.alternative
+            {columns}
         FROM Cards c
-        LEFT JOIN CardTypes ct ON ct.id = c.card_type_id
-        LEFT JOIN Rarities r ON r.id = c.rarity_id
-        LEFT JOIN Colors co1 ON co1.id = c.color_one_id
-        LEFT JOIN Colors co2 ON co2.id = c.color_two_id
-        LEFT JOIN Colors co3 ON co3.id = c.color_three_id
-        LEFT JOIN Stages s ON s.id = c.stage_id
-        LEFT JOIN Attributes a ON a.id = c.attribute_id
-        LEFT JOIN Types t1 ON t1.id = c.type_one_id
-        LEFT JOIN Types t2 ON t2.id = c.type_two_id
-        LEFT JOIN BTs bt ON bt.id = c.bt_id
+        {joins}
         {alt_filter}
         ORDER BY c.name ASC
     """
 
     try:
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         cursor.execute(query)
-        return cursor.fetchall()
+        return CardRecords.from_tuples(cursor.column_names, cursor.fetchall())
     finally:
         connection.close()
 
 
 
-def get_single_card_by_card_number(card_number):
+def get_single_card_by_card_number(card_number, fields=None):
     """
     Fetches a single main card (non-alternative) by its card_number.
+
+    Args:
+        card_number (str): Card number.
+        fields (list[str], optional): CARD_FIELDS to select (default: all of them).
+
+    Returns:
+        dict or None: Card, an empty dict if there is no such main card, or None if
+            the database could not be reached.
     """
     connection = _create_connection()
     if not connection:
@@ -199,98 +509,49 @@ def get_single_card_by_card_number(card_number):
     try:
         cursor = connection.cursor(dictionary=True)
 
-        query = """
+        columns, joins = _card_projection(fields or CARD_FULL_FIELDS)
+        query = f"""
             SELECT
-                c.id,
-                c.card_number,
-                c.name,
-                c.dp,
-                ct.name AS card_type,
-                r.name AS rarity,
-                co1.name AS color_one,
-                co2.name AS color_two,
-                co3.name AS color_three,
-                c.image_url,
-                c.cost,
-                s.name AS stage,
-                a.name AS attribute,
-                t1.name AS type_one,
-                t2.name AS type_two,
-                c.evolution_cost_one,
-                c.evolution_cost_two,
-                c.effect,
-                c.evolution_effect,
-                c.security_effect,
-                bt.abbreviation AS bt_abbreviation,
-                c.alternative
+                {columns}
             FROM Cards c
-            LEFT JOIN CardTypes ct ON ct.id = c.card_type_id
-            LEFT JOIN Rarities r ON r.id = c.rarity_id
-            LEFT JOIN Colors co1 ON co1.id = c.color_one_id
-            LEFT JOIN Colors co2 ON co2.id = c.color_two_id
-            LEFT JOIN Colors co3 ON co3.id = c.color_three_id
-            LEFT JOIN Stages s ON s.id = c.stage_id
-            LEFT JOIN Attributes a ON a.id = c.attribute_id
-            LEFT JOIN Types t1 ON t1.id = c.type_one_id
-            LEFT JOIN Types t2 ON t2.id = c.type_two_id
-            LEFT JOIN BTs bt ON bt.id = c.bt_id
+            {joins}
             WHERE c.card_number = %s AND c.alternative = 0
             LIMIT 1
         """
         cursor.execute(query, (card_number,))
-        return cursor.fetchone()
+        return cursor.fetchone() or {}
 
     finally:
         connection.close()
 
 
-def get_card_with_alternatives_by_card_number(card_number):
+def get_card_with_alternatives_by_card_number(card_number, fields=None):
     """
     Fetches a single card and its alternative versions.
+
+    Args:
+        card_number (str): Card number of the main card.
+        fields (list[str], optional): CARD_FIELDS of the main card to select (default:
+            all of them). Alternatives only have id and card_number.
+
+    Returns:
+        list[dict] or None: The main card followed by its alternatives, empty if the
+            card does not exist, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
 
     try:
         cursor = connection.cursor(dictionary=True)
 
         # Obtener la carta principal exacta
-        query = """
+        columns, joins = _card_projection(fields or CARD_FULL_FIELDS)
+        query = f"""
             SELECT
-                c.id,
-                c.card_number,
-                c.name,
-                c.dp,
-                ct.name AS card_type,
-                r.name AS rarity,
-                co1.name AS color_one,
-                co2.name AS color_two,
-                co3.name AS color_three,
-                c.image_url,
-                c.cost,
-                s.name AS stage,
-                a.name AS attribute,
-                t1.name AS type_one,
-                t2.name AS type_two,
-                c.evolution_cost_one,
-                c.evolution_cost_two,
-                c.effect,
-                c.evolution_effect,
-                c.security_effect,
-                bt.abbreviation AS bt_abbreviation,
-                c.alternative
+                {columns}
             FROM Cards c
-            LEFT JOIN CardTypes ct ON ct.id = c.card_type_id
-            LEFT JOIN Rarities r ON r.id = c.rarity_id
-            LEFT JOIN Colors co1 ON co1.id = c.color_one_id
-            LEFT JOIN Colors co2 ON co2.id = c.color_two_id
-            LEFT JOIN Colors co3 ON co3.id = c.color_three_id
-            LEFT JOIN Stages s ON s.id = c.stage_id
-            LEFT JOIN Attributes a ON a.id = c.attribute_id
-            LEFT JOIN Types t1 ON t1.id = c.type_one_id
-            LEFT JOIN Types t2 ON t2.id = c.type_two_id
-            LEFT JOIN BTs bt ON bt.id = c.bt_id
+            {joins}
             WHERE c.card_number = %s AND c.alternative = 0
             LIMIT 1
         """
@@ -316,55 +577,27 @@ def get_card_with_alternatives_by_card_number(card_number):
         connection.close()
 
 
-def search_cards_by_name(name_part):
+def search_cards_by_name(name_part, fields=None):
     """ Searches all main cards (non-alternative) whose names contain the given substring. 
     
     Args: name_part (str): Substring to search for in card names. 
+          fields (list[str], optional): CARD_FIELDS to select (default: all of them).
     
-    Returns: list[dict]: List of matching cards.
+    Returns: list[dict] or None: List of matching cards, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
 
     try:
         cursor = connection.cursor(dictionary=True)
 
-        query = """
+        columns, joins = _card_projection(fields or CARD_FULL_FIELDS)
+        query = f"""
             SELECT
-                c.id,
-                c.card_number,
-                c.name,
-                c.dp,
-                ct.name AS card_type,
-                r.name AS rarity,
-                co1.name AS color_one,
-                co2.name AS color_two,
-                co3.name AS color_three,
-                c.image_url,
-                c.cost,
-                s.name AS stage,
-                a.name AS attribute,
-                t1.name AS type_one,
-                t2.name AS type_two,
-                c.evolution_cost_one,
-                c.evolution_cost_two,
-                c.effect,
-                c.evolution_effect,
-                c.security_effect,
-                bt.abbreviation AS bt_abbreviation,
-                c.alternative
+                {columns}
             FROM Cards c
-            LEFT JOIN CardTypes ct ON ct.id = c.card_type_id
-            LEFT JOIN Rarities r ON r.id = c.rarity_id
-            LEFT JOIN Colors co1 ON co1.id = c.color_one_id
-            LEFT JOIN Colors co2 ON co2.id = c.color_two_id
-            LEFT JOIN Colors co3 ON co3.id = c.color_three_id
-            LEFT JOIN Stages s ON s.id = c.stage_id
-            LEFT JOIN Attributes a ON a.id = c.attribute_id
-            LEFT JOIN Types t1 ON t1.id = c.type_one_id
-            LEFT JOIN Types t2 ON t2.id = c.type_two_id
-            LEFT JOIN BTs bt ON bt.id = c.bt_id
+            {joins}
             WHERE c.name LIKE %s AND c.alternative = 0
             ORDER BY c.name ASC
         """
@@ -377,123 +610,288 @@ def search_cards_by_name(name_part):
         connection.close()
 
 
-def search_cards_with_alternatives_by_name(name_part):
+def search_cards_with_alternatives_by_name(name_part, fields=None):
     """ 
-    Searches all main cards (non-alternative) whose names contain the given substring, and includes their alternative versions, all in a single query. 
+    Searches all main cards (non-alternative) whose names contain the given substring, and includes their alternative versions. 
     
     Args: name_part (str): Substring to search for in card names. 
+          fields (list[str], optional): CARD_FIELDS of the main cards to select (default:
+              SEARCH_WITH_ALTERNATIVES_FIELDS). Alternatives always have id, card_number,
+              name, image_url and alternative.
     
-    Returns: list[dict]: List of main cards, each with an 'alternatives' key containing a list of its alternative versions.
+    Returns: list[dict] or None: List of main cards, each with an 'alternatives' key containing a list of its alternative versions, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
 
     try:
         cursor = connection.cursor(dictionary=True)
 
         search_term = f"%{name_part}%"
+        columns, joins = _card_projection(fields or SEARCH_WITH_ALTERNATIVES_FIELDS)
+        query = f"""
+            SELECT
+                {columns},
+                c.card_number AS main_card_number
+            FROM Cards c
+            {joins}
+            WHERE c.name LIKE %s AND c.alternative = 0
+            ORDER BY c.name ASC
+        """
+        cursor.execute(query, (search_term,))
+        cards = cursor.fetchall()
+        if not cards:
+            return cards
+
+        # Alternatives of every matching card, resolved on the same connection
         query = """
             SELECT
-                main.id AS main_id,
                 main.card_number AS main_card_number,
-                main.name AS main_name,
-                main.dp AS main_dp,
-                ct_main.name AS main_card_type,
-                r_main.name AS main_rarity,
-                co1_main.name AS main_color_one,
-                co2_main.name AS main_color_two,
-                co3_main.name AS main_color_three,
-                main.image_url AS main_image_url,
-                main.cost AS main_cost,
-                s_main.name AS main_stage,
-                a_main.name AS main_attribute,
-                t1_main.name AS main_type_one,
-                t2_main.name AS main_type_two,
-                main.evolution_cost_one AS main_evolution_cost_one,
-                main.evolution_cost_two AS main_evolution_cost_two,
-                main.effect AS main_effect,
-                main.evolution_effect AS main_evolution_effect,
-                main.security_effect AS main_security_effect,
-                bt_main.abbreviation AS main_bt_abbreviation,
-
-                alt.id AS alt_id,
-                alt.card_number AS alt_card_number,
-                alt.name AS alt_name,
-                alt.image_url AS alt_image_url,
-                alt.alternative AS alt_alternative
+                alt.id,
+                alt.card_number,
+                alt.name,
+                alt.image_url,
+                alt.alternative
             FROM Cards main
-            LEFT JOIN Cards alt ON alt.card_number LIKE CONCAT(main.card_number, '_%') AND alt.alternative = 1
-            LEFT JOIN CardTypes ct_main ON ct_main.id = main.card_type_id
-            LEFT JOIN Rarities r_main ON r_main.id = main.rarity_id
-            LEFT JOIN Colors co1_main ON co1_main.id = main.color_one_id
-            LEFT JOIN Colors co2_main ON co2_main.id = main.color_two_id
-            LEFT JOIN Colors co3_main ON co3_main.id = main.color_three_id
-            LEFT JOIN Stages s_main ON s_main.id = main.stage_id
-            LEFT JOIN Attributes a_main ON a_main.id = main.attribute_id
-            LEFT JOIN Types t1_main ON t1_main.id = main.type_one_id
-            LEFT JOIN Types t2_main ON t2_main.id = main.type_two_id
-            LEFT JOIN BTs bt_main ON bt_main.id = main.bt_id
+            JOIN Cards alt ON alt.card_number LIKE CONCAT(main.card_number, '_%') AND alt.alternative = 1
             WHERE main.name LIKE %s AND main.alternative = 0
-            ORDER BY main.name ASC, alt.name ASC
+            ORDER BY alt.name ASC
         """
         cursor.execute(query, (search_term,))
-        rows = cursor.fetchall()
-
-        grouped = {}
-        for row in rows:
-            key = row["main_card_number"]
-            if key not in grouped:
-                grouped[key] = {
-                    "id": row["main_id"],
-                    "card_number": row["main_card_number"],
-                    "name": row["main_name"],
-                    "dp": row["main_dp"],
-                    "card_type": row["main_card_type"],
-                    "rarity": row["main_rarity"],
-                    "color_one": row["main_color_one"],
-                    "color_two": row["main_color_two"],
-                    "color_three": row["main_color_three"],
-                    "image_url": row["main_image_url"],
-                    "cost": row["main_cost"],
-                    "stage": row["main_stage"],
-                    "attribute": row["main_attribute"],
-                    "type_one": row["main_type_one"],
-                    "type_two": row["main_type_two"],
-                    "evolution_cost_one": row["main_evolution_cost_one"],
-                    "evolution_cost_two": row["main_evolution_cost_two"],
-                    "effect": row["main_effect"],
-                    "evolution_effect": row["main_evolution_effect"],
-                    "security_effect": row["main_security_effect"],
-                    "bt_abbreviation": row["main_bt_abbreviation"],
-                    "alternatives": [],
-                }
+        alt_rows = cursor.fetchall()
 
-            if row["alt_id"]:
-                grouped[key]["alternatives"].append(
-                    {
-                        "id": row["alt_id"],
-                        "card_number": row["alt_card_number"],
-                        "name": row["alt_name"],
-                        "image_url": row["alt_image_url"],
-                        "alternative": row["alt_alternative"],
-                    }
-                )
+        by_number = {}
+        for card in cards:
+            card["alternatives"] = []
+            by_number[card.pop("main_card_number")] = card
 
-        return list(grouped.values())
+        for row in alt_rows:
+            main_card = by_number.get(row.pop("main_card_number"))
+            if main_card:
+                main_card["alternatives"].append(row)
+
+        return cards
 
     finally:
         connection.close()
 
 
+# * Catalog changes
+def get_catalog_version():
+    """
+    Retrieves the current catalog version, the DataVersions 'catalog' counter bumped
+    by the CardChanges triggers. Every change up to it is committed.
+
+    Returns:
+        int or None: Catalog version (0 if nothing changed yet), or None if connection fails.
+    """
+    ensure_schema()
+    connection = _create_connection()
+    if not connection:
+        return None
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM DataVersions WHERE name = 'catalog'")
+        return cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+
+def get_card_changes(since):
+    """
+    Retrieves the cards inserted, updated or deleted after a catalog version.
+
+    Only the last change of each card counts: a card updated and then deleted is
+    only reported as deleted. If the changes after 'since' are no longer complete
+    (pruned, an auxiliary table changed, or the triggers are missing) the client
+    must reload the whole catalog.
+
+    Args:
+        since (int or None): Catalog version the client already has, None if it has none.
+
+    Returns:
+        dict or None: 'version' (new version token), 'reset' (True when a full reload
+            is needed), 'upserted' (full card records) and 'deleted' (card numbers),
+            or None if connection fails.
+    """
+    ensure_schema()
+    connection = _create_connection()
+    if not connection:
+        return None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        # The committed counter, never a version whose transaction is still open
+        cursor.execute("""
+            SELECT
+                (SELECT COALESCE(MAX(version), 0) FROM DataVersions WHERE name = 'catalog') AS version,
+                (SELECT COALESCE(MIN(version), 1) FROM CardChanges) AS oldest
+        """)
+        bounds = cursor.fetchone()
+        version = bounds["version"]
+        result = {"version": version, "reset": False, "upserted": [], "deleted": []}
+
+        # Unknown versions, versions whose following changes were pruned, or no change log
+        if (
+            since is None
+            or since > version
+            or since < bounds["oldest"] - 1
+            or not _change_tracking
+        ):
+            result["reset"] = True
+            return result
+
+        query = """
+            SELECT card_number, operation
+            FROM CardChanges
+            WHERE version > %s AND version <= %s
+            ORDER BY version ASC
+        """
+        cursor.execute(query, (since, version))
+        last_operation = {}
+        for row in cursor.fetchall():
+            if row["operation"] == "reset":
+                result["reset"] = True
+                return result
+            last_operation[row["card_number"]] = row["operation"]
+
+        upserted = [number for number, operation in last_operation.items() if operation != "delete"]
+        result["deleted"] = sorted(
+            number for number, operation in last_operation.items() if operation == "delete"
+        )
+        if upserted:
+            placeholders = ", ".join(["%s"] * len(upserted))
+            columns, joins = _card_projection(CARD_FULL_FIELDS)
+            query = f"""
+                SELECT
+                    {columns}
+                FROM Cards c
+                {joins}
+                WHERE c.card_number IN ({placeholders})
+                ORDER BY c.name ASC
+            """
+            cursor.execute(query, tuple(upserted))
+            result["upserted"] = cursor.fetchall()
+        return result
+    finally:
+        connection.close()
+
+
+def prune_card_changes(keep_days):
+    """
+    Deletes change records older than keep_days, always keeping the latest one
+    so the current version stays known. Clients older than the pruned range get a reset.
+
+    Returns:
+        int or None: Number of deleted records, or None if connection fails.
+    """
+    ensure_schema()
+    connection = _create_connection()
+    if not connection:
+        return None
+    try:
+        cursor = connection.cursor()
+        query = """
+            DELETE FROM CardChanges
+            WHERE changed_at < NOW() - INTERVAL %s DAY
+              AND version < (SELECT latest FROM (SELECT MAX(version) AS latest FROM CardChanges) m)
+        """
+        cursor.execute(query, (keep_days,))
+        connection.commit()
+        return cursor.rowcount
+    finally:
+        connection.close()
+
+
+# * Data versions
+def _bump_data_version(cursor, name):
+    """
+    Increments a data version inside the caller's transaction.
+
+    Returns:
+        int: The new version.
+    """
+    cursor.execute(
+        "UPDATE DataVersions SET version = LAST_INSERT_ID(version + 1) WHERE name = %s",
+        (name,),
+    )
+    cursor.execute("SELECT LAST_INSERT_ID()")
+    return cursor.fetchone()[0]
+
+
+def get_data_versions(connection=None):
+    """
+    Reads every data version in one query: the catalog version (see
+    get_catalog_version) and the versions bumped by collection and deck writes.
+
+    Args:
+        connection (optional): Open connection to read with, left open. By default
+            a connection is opened for the read and closed.
+
+    Returns:
+        dict[str, int] or None: Version per name, or None if connection fails.
+    """
+    opened = connection is None
+    if opened:
+        connection = _create_connection()
+        if not connection:
+            return None
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT name, version FROM DataVersions")
+        versions = {name: version for name, version in cursor.fetchall()}
+        versions.setdefault("catalog", 0)
+        # Ends the read snapshot, so the next read on a kept connection sees new versions
+        connection.commit()
+        return versions
+    except Exception as e:
+        print(f"Error reading data versions: {e}")
+        return None
+    finally:
+        if opened:
+            connection.close()
+
+
+class DataVersionsReader:
+    """
+    Reads the data versions (see get_data_versions) over one connection kept open
+    between reads, so polling them does not open a connection each time. The
+    connection is dropped after a failed read and opened again by the next one.
+    """
+
+    def __init__(self):
+        self._connection = None
+
+    def __call__(self):
+        if self._connection is None:
+            self._connection = _create_connection()
+            if self._connection is None:
+                return None
+        versions = get_data_versions(self._connection)
+        if versions is None:
+            self.close()
+        return versions
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
 # * Auxiliary tables get all
 def get_all_bts():
     """
     Retrieves all BT sets from the database.
+
+    Returns:
+        list[dict] or None: The rows, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
     try:
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM BTs"
@@ -506,10 +904,13 @@ def get_all_bts():
 def get_all_colors():
     """
     Retrieves all color options.
+
+    Returns:
+        list[dict] or None: The rows, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
     try:
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM Colors"
@@ -522,10 +923,13 @@ def get_all_colors():
 def get_all_card_types():
     """
     Retrieves all card types.
+
+    Returns:
+        list[dict] or None: The rows, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
     try:
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM CardTypes"
@@ -538,10 +942,13 @@ def get_all_card_types():
 def get_all_rarities():
     """
     Retrieves all rarity types.
+
+    Returns:
+        list[dict] or None: The rows, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
     try:
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM Rarities"
@@ -554,10 +961,13 @@ def get_all_rarities():
 def get_all_stages():
     """
     Retrieves all evolution stages.
+
+    Returns:
+        list[dict] or None: The rows, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
     try:
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM Stages"
@@ -570,10 +980,13 @@ def get_all_stages():
 def get_all_attributes():
     """
     Retrieves all attributes.
+
+    Returns:
+        list[dict] or None: The rows, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
     try:
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM Attributes"
@@ -586,10 +999,13 @@ def get_all_attributes():
 def get_all_types():
     """
     Retrieves all types.
+
+    Returns:
+        list[dict] or None: The rows, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
     try:
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM Types"
@@ -608,7 +1024,8 @@ def get_bt_by_id(bt_id):
         bt_id (int): ID of the BT.
 
     Returns:
-        dict or None: BT record or None if not found.
+        dict or None: BT record, an empty dict if not found, or None if the
+            database could not be reached.
     """
     connection = _create_connection()
     if not connection:
@@ -617,7 +1034,7 @@ def get_bt_by_id(bt_id):
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM BTs WHERE id = %s"
         cursor.execute(query, (bt_id,))
-        return cursor.fetchone()
+        return cursor.fetchone() or {}
     finally:
         connection.close()
 
@@ -630,7 +1047,8 @@ def get_color_by_id(color_id):
         color_id (int): ID of the Color.
 
     Returns:
-        dict or None: Color record or None if not found.
+        dict or None: Color record, an empty dict if not found, or None if the
+            database could not be reached.
     """
     connection = _create_connection()
     if not connection:
@@ -639,7 +1057,7 @@ def get_color_by_id(color_id):
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM Colors WHERE id = %s"
         cursor.execute(query, (color_id,))
-        return cursor.fetchone()
+        return cursor.fetchone() or {}
     finally:
         connection.close()
 
@@ -652,7 +1070,8 @@ def get_card_type_by_id(card_type_id):
         card_type_id (int): ID of the Card Type.
 
     Returns:
-        dict or None: CardType record or None if not found.
+        dict or None: CardType record, an empty dict if not found, or None if the
+            database could not be reached.
     """
     connection = _create_connection()
     if not connection:
@@ -661,7 +1080,7 @@ def get_card_type_by_id(card_type_id):
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM CardTypes WHERE id = %s"
         cursor.execute(query, (card_type_id,))
-        return cursor.fetchone()
+        return cursor.fetchone() or {}
     finally:
         connection.close()
 
@@ -674,7 +1093,8 @@ def get_rarity_by_id(rarity_id):
         rarity_id (int): ID of the Rarity.
 
     Returns:
-        dict or None: Rarity record or None if not found.
+        dict or None: Rarity record, an empty dict if not found, or None if the
+            database could not be reached.
     """
     connection = _create_connection()
     if not connection:
@@ -683,7 +1103,7 @@ def get_rarity_by_id(rarity_id):
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM Rarities WHERE id = %s"
         cursor.execute(query, (rarity_id,))
-        return cursor.fetchone()
+        return cursor.fetchone() or {}
     finally:
         connection.close()
 
@@ -696,7 +1116,8 @@ def get_stage_by_id(stage_id):
         stage_id (int): ID of the Stage.
 
     Returns:
-        dict or None: Stage record or None if not found.
+        dict or None: Stage record, an empty dict if not found, or None if the
+            database could not be reached.
     """
     connection = _create_connection()
     if not connection:
@@ -705,7 +1126,7 @@ def get_stage_by_id(stage_id):
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM Stages WHERE id = %s"
         cursor.execute(query, (stage_id,))
-        return cursor.fetchone()
+        return cursor.fetchone() or {}
     finally:
         connection.close()
 
@@ -718,7 +1139,8 @@ def get_attribute_by_id(attribute_id):
         attribute_id (int): ID of the Attribute.
 
     Returns:
-        dict or None: Attribute record or None if not found.
+        dict or None: Attribute record, an empty dict if not found, or None if the
+            database could not be reached.
     """
     connection = _create_connection()
     if not connection:
@@ -727,7 +1149,7 @@ def get_attribute_by_id(attribute_id):
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM Attributes WHERE id = %s"
         cursor.execute(query, (attribute_id,))
-        return cursor.fetchone()
+        return cursor.fetchone() or {}
     finally:
         connection.close()
 
@@ -740,7 +1162,8 @@ def get_type_by_id(type_id):
         type_id (int): ID of the Type.
 
     Returns:
-        dict or None: Type record or None if not found.
+        dict or None: Type record, an empty dict if not found, or None if the
+            database could not be reached.
     """
     connection = _create_connection()
     if not connection:
@@ -749,79 +1172,204 @@ def get_type_by_id(type_id):
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM Types WHERE id = %s"
         cursor.execute(query, (type_id,))
-        return cursor.fetchone()
+        return cursor.fetchone() or {}
     finally:
         connection.close()
 
 
 # * Collection
-def get_collection(page=1, per_page=25, include_alternative=True):
+# Fields of get_collection: card fields plus the owned quantity
+COLLECTION_FIELDS = CARD_LIST_FIELDS + ["quantity"]
+
+# Sort keys accepted by get_collection, mapped to indexed columns where possible
+COLLECTION_SORT_COLUMNS = {
+    "card_number": "c.card_number",
+    "name": "c.name",
+    "quantity": "col.quantity",
+    "cost": "c.cost",
+    "rarity": "c.rarity_id",
+    "bt": "c.bt_id",
+}
+
+
+def _collection_filters(include_alternative=True, filters=None):
+    """
+    Builds the WHERE clause shared by get_collection and count_collection.
+    Auxiliary names are resolved to IDs in subqueries, so the filters compare the
+    foreign key columns of Cards instead of the joined names.
+
+    Args:
+        include_alternative (bool): Whether to include alternative artwork cards.
+        filters (dict, optional): Any of color, card_type, rarity, stage, bt (abbreviation),
+            name (substring), min_quantity and max_quantity.
+
+    Returns:
+        tuple: (where_clause, params)
+    """
+    filters = filters or {}
+    conditions = ["1=1"]
+    params = []
+
+    if not include_alternative:
+        conditions.append("c.alternative = 0")
+    if filters.get("color"):
+        conditions.append(
+            "(SELECT id FROM Colors WHERE name = %s) IN (c.color_one_id, c.color_two_id, c.color_three_id)"
+        )
+        params.append(filters["color"])
+    if filters.get("card_type"):
+        conditions.append("c.card_type_id = (SELECT id FROM CardTypes WHERE name = %s)")
+        params.append(filters["card_type"])
+    if filters.get("rarity"):
+        conditions.append("c.rarity_id = (SELECT id FROM Rarities WHERE name = %s)")
+        params.append(filters["rarity"])
+    if filters.get("stage"):
+        conditions.append("c.stage_id = (SELECT id FROM Stages WHERE name = %s)")
+        params.append(filters["stage"])
+    if filters.get("bt"):
+        conditions.append("c.bt_id = (SELECT id FROM BTs WHERE abbreviation = %s)")
+        params.append(filters["bt"])
+    if filters.get("name"):
+        conditions.append("c.name LIKE %s")
+        params.append(f"%{filters['name']}%")
+    if filters.get("min_quantity") is not None:
+        conditions.append("col.quantity >= %s")
+        params.append(filters["min_quantity"])
+    if filters.get("max_quantity") is not None:
+        conditions.append("col.quantity <= %s")
+        params.append(filters["max_quantity"])
+
+    return " AND ".join(conditions), params
+
+
+def get_collection(
+    page=1,
+    per_page=25,
+    include_alternative=True,
+    filters=None,
+    sort_by="card_number",
+    descending=False,
+    fields=None,
+):
     """
     Fetches cards from the collection with full descriptive data by replacing foreign key IDs with their names,
     including the quantity of each card in the collection.
-    Supports pagination.
+    Supports filtering, sorting, pagination and field projection.
 
     Args:
         page (int): Page number to fetch.
         per_page (int): Number of cards per page (10, 25, 50).
         include_alternative (bool): Whether to include alternative artwork cards (default: True)
+        filters (dict, optional): Filters accepted by _collection_filters.
+        sort_by (str): One of COLLECTION_SORT_COLUMNS (default: card_number).
+        descending (bool): Sort in descending order.
+        fields (list[str], optional): CARD_FIELDS and/or 'quantity' to select
+            (default: COLLECTION_FIELDS).
 
     Returns:
-        list[dict]: List of card records with full information and quantity.
+        list[dict] or None: List of card records with full information and quantity,
+            or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
 
     offset = (page - 1) * per_page
-    alt_filter = "" if include_alternative else "AND c.alternative = 0"
+    where, params = _collection_filters(include_alternative, filters)
+    direction = "DESC" if descending else "ASC"
+    order_by = f"{COLLECTION_SORT_COLUMNS[sort_by]} {direction}, c.card_number {direction}"
+
+    fields = fields or COLLECTION_FIELDS
+    columns, joins = _card_projection([field for field in fields if field in CARD_FIELDS])
+    if "quantity" in fields:
+        columns = ",\n            ".join(filter(None, [columns, "col.quantity AS quantity"]))
 
     query = f"""
         SELECT
-            c.id,
-            c.card_number,
-            c.name,
-            ct.name AS card_type,
-            r.name AS rarity,
-            co1.name AS color_one,
-            co2.name AS color_two,
-            co3.name AS color_three,
-            c.image_url,
-            c.cost,
-            s.name AS stage,
-            a.name AS attribute,
-            t1.name AS type_one,
-            t2.name AS type_two,
-            bt.abbreviation AS bt_abbreviation,
-            c.alternative,
-            col.quantity
+            {columns}
         FROM Collection col
         JOIN Cards c ON c.card_number = col.card_number
-        LEFT JOIN CardTypes ct ON ct.id = c.card_type_id
-        LEFT JOIN Rarities r ON r.id = c.rarity_id
-        LEFT JOIN Colors co1 ON co1.id = c.color_one_id
-        LEFT JOIN Colors co2 ON co2.id = c.color_two_id
-        LEFT JOIN Colors co3 ON co3.id = c.color_three_id
-        LEFT JOIN Stages s ON s.id = c.stage_id
-        LEFT JOIN Attributes a ON a.id = c.attribute_id
-        LEFT JOIN Types t1 ON t1.id = c.type_one_id
-        LEFT JOIN Types t2 ON t2.id = c.type_two_id
-        LEFT JOIN BTs bt ON bt.id = c.bt_id
-        WHERE 1=1 {alt_filter}
+        {joins}
+        WHERE {where}
+        ORDER BY {order_by}
         LIMIT %s OFFSET %s
     """
 
     try:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute(query, (per_page, offset))
+        cursor.execute(query, (*params, per_page, offset))
         return cursor.fetchall()
     finally:
         connection.close()
 
 
+def count_collection(include_alternative=True, filters=None):
+    """
+    Counts the collection entries matching the same filters as get_collection.
+    Only Collection and Cards are read, the auxiliary tables are not joined.
+
+    Returns:
+        int or None: Number of matching entries, or None if connection fails.
+    """
+    connection = _create_connection()
+    if not connection:
+        return None
+
+    where, params = _collection_filters(include_alternative, filters)
+    query = f"""
+        SELECT COUNT(*)
+        FROM Collection col
+        JOIN Cards c ON c.card_number = col.card_number
+        WHERE {where}
+    """
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(query, tuple(params))
+        return cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+
+def get_collection_quantities():
+    """
+    Retrieves the owned quantity of every card in the collection.
+
+    Returns:
+        dict[str, int] or None: Quantity by card number, or None if connection fails.
+    """
+    connection = _create_connection()
+    if not connection:
+        return None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        query = "SELECT card_number, quantity FROM Collection"
+        cursor.execute(query)
+        return {row["card_number"]: row["quantity"] for row in cursor.fetchall()}
+    finally:
+        connection.close()
+
+
+def _lock_collection_quantity(cursor, card_number):
+    """
+    Reads the current quantity of a card and locks its row until the transaction ends.
+    Only used before updates and deletes, never before an insert of the same card
+    (a missing row is gap locked, see add_card_to_collection).
+
+    Returns:
+        int: Current quantity, 0 if the card is not in the collection.
+    """
+    cursor.execute(
+        "SELECT quantity FROM Collection WHERE card_number = %s FOR UPDATE", (card_number,)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
 def add_card_to_collection(card_number, quantity=1):
     """
     Adds a new card to the collection or increases quantity if it already exists.
+    Collection statistics are updated in the same transaction.
 
     Args:
         card_number (str): Card number to add.
@@ -830,20 +1378,32 @@ def add_card_to_collection(card_number, quantity=1):
     Returns:
         bool: True if inserted or updated, False if failed.
     """
+    ensure_schema()
     connection = _create_connection()
     if not connection:
         return False
 
     try:
         cursor = connection.cursor()
+        # No SELECT ... FOR UPDATE first: on a missing card it takes a gap lock, and two
+        # concurrent adds of new cards in the same gap then deadlock on their inserts.
+        # The upsert locks the row itself and its rowcount tells what it did.
         query = """
             INSERT INTO Collection (card_number, quantity)
             VALUES (%s, %s)
             ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)
         """
         cursor.execute(query, (card_number, quantity))
+        # 1: inserted, 2: existing row updated, 0: existing row unchanged
+        success = cursor.rowcount > 0
+        if success:
+            _apply_collection_stats_delta(
+                cursor, card_number, 1 if cursor.rowcount == 1 else 0, quantity
+            )
+        version = _bump_data_version(cursor, "collection")
         connection.commit()
-        return cursor.rowcount > 0
+        _notify_write("Collection", card_number=card_number, version=version)
+        return success
     finally:
         connection.close()
 
@@ -851,6 +1411,7 @@ def add_card_to_collection(card_number, quantity=1):
 def delete_card_from_collection(card_number):
     """
     Deletes a card from the collection by its card number.
+    Collection statistics are updated in the same transaction.
 
     Args:
         card_number (str): Card number to delete.
@@ -858,19 +1419,27 @@ def delete_card_from_collection(card_number):
     Returns:
         bool: True if deleted, False if not found.
     """
+    ensure_schema()
     connection = _create_connection()
     if not connection:
         return False
 
     try:
         cursor = connection.cursor()
+        old_quantity = _lock_collection_quantity(cursor, card_number)
         query = """
             DELETE FROM Collection
             WHERE card_number = %s
         """
         cursor.execute(query, (card_number,))
+        deleted = cursor.rowcount > 0
+        if deleted:
+            _apply_collection_stats_delta(cursor, card_number, -1, -old_quantity)
+            version = _bump_data_version(cursor, "collection")
         connection.commit()
-        return cursor.rowcount > 0
+        if deleted:
+            _notify_write("Collection", card_number=card_number, version=version)
+        return deleted
     finally:
         connection.close()
 
@@ -879,6 +1448,7 @@ def update_card_in_collection(card_number: str, new_quantity: int):
     """
     Updates the quantity of a card in the collection.
     If the new quantity is 0 or less, the card is removed from the collection.
+    Collection statistics are updated in the same transaction.
 
     Args:
         card_number (str): Card number to update
@@ -889,12 +1459,14 @@ def update_card_in_collection(card_number: str, new_quantity: int):
                success: True if operation was successful
                action: 'updated', 'removed', or 'not_found'
     """
+    ensure_schema()
     connection = _create_connection()
     if not connection:
         return (False, "connection_error")
 
     try:
         cursor = connection.cursor()
+        old_quantity = _lock_collection_quantity(cursor, card_number)
 
         if new_quantity <= 0:
             # Remove the card completely if quantity is 0 or less
@@ -904,6 +1476,7 @@ def update_card_in_collection(card_number: str, new_quantity: int):
             """
             cursor.execute(query, (card_number,))
             action = "removed"
+            unique_delta, quantity_delta = -1, -old_quantity
         else:
             # Update to the new quantity
             query = """
@@ -913,12 +1486,17 @@ def update_card_in_collection(card_number: str, new_quantity: int):
             """
             cursor.execute(query, (new_quantity, card_number))
             action = "updated"
-
-        connection.commit()
+            unique_delta, quantity_delta = 0, new_quantity - old_quantity
 
         if cursor.rowcount == 0:
+            connection.rollback()
             return (False, "not_found")
 
+        _apply_collection_stats_delta(cursor, card_number, unique_delta, quantity_delta)
+        version = _bump_data_version(cursor, "collection")
+        connection.commit()
+
+        _notify_write("Collection", card_number=card_number, version=version)
         return (True, action)
 
     except Exception as e:
@@ -929,17 +1507,185 @@ def update_card_in_collection(card_number: str, new_quantity: int):
         connection.close()
 
 
+# * Collection statistics
+# Every card counts once in 'all' and once per set, rarity, card type and each of its colors
+_STATS_DIMENSIONS_QUERY = """
+    SELECT 'all' AS dimension, 0 AS value_id, c.alternative, c.card_number FROM Cards c {where}
+    UNION SELECT 'bt', c.bt_id, c.alternative, c.card_number FROM Cards c {where}
+    UNION SELECT 'rarity', c.rarity_id, c.alternative, c.card_number FROM Cards c {where}
+    UNION SELECT 'card_type', c.card_type_id, c.alternative, c.card_number FROM Cards c {where}
+    UNION SELECT 'color', c.color_one_id, c.alternative, c.card_number FROM Cards c {where}
+    UNION SELECT 'color', c.color_two_id, c.alternative, c.card_number FROM Cards c {where}
+    UNION SELECT 'color', c.color_three_id, c.alternative, c.card_number FROM Cards c {where}
+"""
+
+
+def _apply_collection_stats_delta(cursor, card_number, unique_delta, quantity_delta):
+    """
+    Adds a change of one collection entry to the CollectionStats counters of every
+    set, rarity, card type and color of the card. Runs in the caller's transaction.
+    """
+    if not unique_delta and not quantity_delta:
+        return
+    dimensions = _STATS_DIMENSIONS_QUERY.format(where="WHERE c.card_number = %s")
+    query = f"""
+        INSERT INTO CollectionStats (dimension, value_id, alternative, unique_cards, total_quantity)
+        SELECT d.dimension, d.value_id, d.alternative, %s, %s
+        FROM ({dimensions}) d
+        WHERE d.value_id IS NOT NULL
+        ON DUPLICATE KEY UPDATE
+            unique_cards = unique_cards + VALUES(unique_cards),
+            total_quantity = total_quantity + VALUES(total_quantity)
+    """
+    cursor.execute(query, (unique_delta, quantity_delta) + (card_number,) * 7)
+
+
+def _compute_collection_stats(cursor):
+    """Aggregates the statistics from scratch by joining Collection with Cards."""
+    dimensions = _STATS_DIMENSIONS_QUERY.format(
+        where="JOIN Collection col ON col.card_number = c.card_number"
+    )
+    query = f"""
+        SELECT d.dimension, d.value_id, d.alternative,
+               COUNT(*) AS unique_cards, SUM(col.quantity) AS total_quantity
+        FROM ({dimensions}) d
+        JOIN Collection col ON col.card_number = d.card_number
+        WHERE d.value_id IS NOT NULL
+        GROUP BY d.dimension, d.value_id, d.alternative
+    """
+    cursor.execute(query)
+    return {
+        (row["dimension"], row["value_id"], row["alternative"]): (
+            int(row["unique_cards"]),
+            int(row["total_quantity"]),
+        )
+        for row in cursor.fetchall()
+    }
+
+
+def check_collection_stats():
+    """
+    Compares the materialized statistics with a full recomputation.
+
+    Returns:
+        list[dict] or None: One entry per differing counter (empty if consistent),
+            or None if connection fails.
+    """
+    ensure_schema()
+    connection = _create_connection()
+    if not connection:
+        return None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        expected = _compute_collection_stats(cursor)
+        cursor.execute(
+            "SELECT dimension, value_id, alternative, unique_cards, total_quantity FROM CollectionStats"
+        )
+        stored = {
+            (row["dimension"], row["value_id"], row["alternative"]): (
+                row["unique_cards"],
+                row["total_quantity"],
+            )
+            for row in cursor.fetchall()
+        }
+    finally:
+        connection.close()
+
+    differences = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        # Counters that dropped to zero are equivalent to missing ones
+        expected_value = expected.get(key, (0, 0))
+        stored_value = stored.get(key, (0, 0))
+        if expected_value != stored_value:
+            differences.append(
+                {
+                    "dimension": key[0],
+                    "value_id": key[1],
+                    "alternative": key[2],
+                    "expected": expected_value,
+                    "stored": stored_value,
+                }
+            )
+    return differences
+
+
+def rebuild_collection_stats():
+    """
+    Recomputes every CollectionStats counter from the collection in one transaction.
+
+    Returns:
+        bool: True on success.
+    """
+    connection = _create_connection()
+    if not connection:
+        return False
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT card_number FROM Collection FOR UPDATE")
+        cursor.fetchall()
+        stats = _compute_collection_stats(cursor)
+        cursor.execute("DELETE FROM CollectionStats")
+        if stats:
+            cursor.executemany(
+                """
+                INSERT INTO CollectionStats (dimension, value_id, alternative, unique_cards, total_quantity)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                [key + value for key, value in stats.items()],
+            )
+        connection.commit()
+        return True
+    finally:
+        connection.close()
+
+
+def get_collection_stats():
+    """
+    Reads the materialized collection statistics with the name of each set, rarity,
+    card type and color. Reads one row per counter, independent of the collection size.
+
+    Returns:
+        list[dict] or None: dimension, value_id, name, alternative, unique_cards and
+            total_quantity of every counter, or None if connection fails.
+    """
+    ensure_schema()
+    connection = _create_connection()
+    if not connection:
+        return None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        query = """
+            SELECT
+                cs.dimension,
+                cs.value_id,
+                COALESCE(bt.abbreviation, r.name, ct.name, co.name) AS name,
+                cs.alternative,
+                cs.unique_cards,
+                cs.total_quantity
+            FROM CollectionStats cs
+            LEFT JOIN BTs bt ON cs.dimension = 'bt' AND bt.id = cs.value_id
+            LEFT JOIN Rarities r ON cs.dimension = 'rarity' AND r.id = cs.value_id
+            LEFT JOIN CardTypes ct ON cs.dimension = 'card_type' AND ct.id = cs.value_id
+            LEFT JOIN Colors co ON cs.dimension = 'color' AND co.id = cs.value_id
+            WHERE cs.unique_cards > 0
+        """
+        cursor.execute(query)
+        return cursor.fetchall()
+    finally:
+        connection.close()
+
+
 # * Decks
 def get_all_decks():
     """
     Fetches all existing decks.
 
     Returns:
-        list[dict]: List of decks.
+        list[dict] or None: List of decks, or None if connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
     try:
         cursor = connection.cursor(dictionary=True)
         query = "SELECT * FROM Decks"
@@ -949,6 +1695,29 @@ def get_all_decks():
         connection.close()
 
 
+def get_deck_by_id(deck_id):
+    """
+    Retrieves a deck by ID.
+
+    Args:
+        deck_id (int): ID of the deck.
+
+    Returns:
+        dict or None: Deck record, an empty dict if the deck does not exist, or None
+            if the database could not be reached.
+    """
+    connection = _create_connection()
+    if not connection:
+        return None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        query = "SELECT * FROM Decks WHERE id = %s"
+        cursor.execute(query, (deck_id,))
+        return cursor.fetchone() or {}
+    finally:
+        connection.close()
+
+
 def get_deck_cards(deck_id):
     """
     Retrieves all cards and their quantities from a given deck.
@@ -957,11 +1726,12 @@ def get_deck_cards(deck_id):
         deck_id (int): Deck ID to fetch cards for.
 
     Returns:
-        list[dict]: List of cards with quantity and name/image.
+        list[dict] or None: List of cards with quantity and name/image, or None if
+            connection fails.
     """
     connection = _create_connection()
     if not connection:
-        return []
+        return None
     try:
         cursor = connection.cursor(dictionary=True)
         query = """
@@ -976,6 +1746,131 @@ def get_deck_cards(deck_id):
         connection.close()
 
 
+def get_deck_cards_full(deck_id, include_alternatives=False):
+    """
+    Retrieves all cards in a deck with the same full details returned by
+    get_single_card_by_card_number, plus the quantity of each card.
+
+    Args:
+        deck_id (int): Deck ID to fetch cards for.
+        include_alternatives (bool): If True, each card gets an 'alternatives' key
+            with its alternative versions.
+
+    Returns:
+        list[dict] or None: List of full card records with quantity, or None if
+            connection fails.
+    """
+    connection = _create_connection()
+    if not connection:
+        return None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        columns, joins = _card_projection(CARD_FULL_FIELDS)
+        query = f"""
+            SELECT
+                {columns},
+                dc.quantity
+            FROM DeckCards dc
+            JOIN Cards c ON c.card_number = dc.card_number
+            {joins}
+            WHERE dc.deck_id = %s
+            ORDER BY c.name ASC
+        """
+        cursor.execute(query, (deck_id,))
+        cards = cursor.fetchall()
+
+        if not include_alternatives or not cards:
+            return cards
+
+        # Alternatives of every card in the deck, resolved on the same connection
+        query = """
+            SELECT
+                dc.card_number AS main_card_number,
+                alt.id,
+                alt.card_number,
+                alt.name,
+                alt.image_url,
+                alt.alternative
+            FROM DeckCards dc
+            JOIN Cards alt ON alt.card_number LIKE CONCAT(dc.card_number, '_%') AND alt.alternative = 1
+            WHERE dc.deck_id = %s
+            ORDER BY alt.name ASC
+        """
+        cursor.execute(query, (deck_id,))
+        alt_rows = cursor.fetchall()
+
+        by_number = {}
+        for card in cards:
+            card["alternatives"] = []
+            by_number[card["card_number"]] = card
+
+        for row in alt_rows:
+            main_card = by_number.get(row.pop("main_card_number"))
+            if main_card:
+                main_card["alternatives"].append(row)
+
+        return cards
+    finally:
+        connection.close()
+
+
+def get_all_deck_card_entries():
+    """
+    Retrieves every (deck, card, quantity) entry of all decks.
+    Used to build in-memory indexes over DeckCards.
+
+    Returns:
+        list[dict] or None: Entries with deck_id, card_number and quantity, or None if connection fails.
+    """
+    connection = _create_connection()
+    if not connection:
+        return None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        query = "SELECT deck_id, card_number, quantity FROM DeckCards"
+        cursor.execute(query)
+        return cursor.fetchall()
+    finally:
+        connection.close()
+
+
+def get_card_usage_details(card_number, deck_ids):
+    """
+    Retrieves the owned quantity of a card and the names of the given decks
+    using primary key lookups only.
+
+    Args:
+        card_number (str): Card number to look up in the collection.
+        deck_ids (list[int]): IDs of the decks whose names are needed.
+
+    Returns:
+        tuple or None: (owned_quantity, {deck_id: name}), or None if connection fails.
+    """
+    connection = _create_connection()
+    if not connection:
+        return None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT quantity FROM Collection WHERE card_number = %s", (card_number,)
+        )
+        row = cursor.fetchone()
+        owned_quantity = row["quantity"] if row else 0
+
+        deck_names = {}
+        if deck_ids:
+            placeholders = ", ".join(["%s"] * len(deck_ids))
+            cursor.execute(
+                f"SELECT id, name FROM Decks WHERE id IN ({placeholders})",
+                tuple(deck_ids),
+            )
+            deck_names = {deck["id"]: deck["name"] for deck in cursor.fetchall()}
+
+        return owned_quantity, deck_names
+    finally:
+        connection.close()
+
+
 def create_deck(name, color_id=None, image=None):
     """
     Creates a new deck with optional color and image.
@@ -988,6 +1883,7 @@ def create_deck(name, color_id=None, image=None):
     Returns:
         int: ID of the newly created deck.
     """
+    ensure_schema()
     connection = _create_connection()
     if not connection:
         return None
@@ -995,8 +1891,11 @@ def create_deck(name, color_id=None, image=None):
         cursor = connection.cursor()
         query = "INSERT INTO Decks (name, color_id, image) VALUES (%s, %s, %s)"
         cursor.execute(query, (name, color_id, image))
+        deck_id = cursor.lastrowid
+        version = _bump_data_version(cursor, "decks")
         connection.commit()
-        return cursor.lastrowid
+        _notify_write("Decks", deck_id=deck_id, version=version)
+        return deck_id
     finally:
         connection.close()
 
@@ -1013,6 +1912,7 @@ def add_card_to_deck(deck_id, card_number, quantity):
     Returns:
         bool: True on success.
     """
+    ensure_schema()
     connection = _create_connection()
     if not connection:
         return False
@@ -1024,7 +1924,11 @@ def add_card_to_deck(deck_id, card_number, quantity):
             ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
         """
         cursor.execute(query, (deck_id, card_number, quantity))
+        version = _bump_data_version(cursor, "decks")
         connection.commit()
+        _notify_write(
+            "DeckCards", deck_id=deck_id, card_number=card_number, quantity=quantity, version=version
+        )
         return True
     finally:
         connection.close()
@@ -1043,6 +1947,7 @@ def update_card_in_deck(deck_id, card_number, quantity):
     Returns:
         bool: True if updated or deleted, False otherwise.
     """
+    ensure_schema()
     connection = _create_connection()
     if not connection:
         return False
@@ -1066,8 +1971,15 @@ def update_card_in_deck(deck_id, card_number, quantity):
             """
             cursor.execute(query, (quantity, deck_id, card_number))
 
+        changed = cursor.rowcount > 0
+        if changed:
+            version = _bump_data_version(cursor, "decks")
         connection.commit()
-        return cursor.rowcount > 0
+        if changed:
+            _notify_write(
+                "DeckCards", deck_id=deck_id, card_number=card_number, quantity=quantity, version=version
+            )
+        return changed
     finally:
         connection.close()
 
@@ -1083,6 +1995,7 @@ def delete_card_from_deck(deck_id, card_number):
     Returns:
         bool: True if the card was deleted, False otherwise.
     """
+    ensure_schema()
     connection = _create_connection()
     if not connection:
         return False
@@ -1094,7 +2007,14 @@ def delete_card_from_deck(deck_id, card_number):
             WHERE deck_id = %s AND card_number = %s
         """
         cursor.execute(query, (deck_id, card_number))
+        deleted = cursor.rowcount > 0
+        if deleted:
+            version = _bump_data_version(cursor, "decks")
         connection.commit()
-        return cursor.rowcount > 0
+        if deleted:
+            _notify_write(
+                "DeckCards", deck_id=deck_id, card_number=card_number, quantity=0, version=version
+            )
+        return deleted
     finally:
         connection.close()
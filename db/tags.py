@@ -0,0 +1,123 @@
+import re
+
+TEXT_FIELDS = ["effect", "evolution_effect", "security_effect"]
+
+_KEYWORD_RE = re.compile(r"<([^<>]+)>")
+_BRACKET_RE = re.compile(r"\[([^\[\]]+)\]")
+# Numeric parameters and notes that vary between cards with the same keyword
+_KEYWORD_PARAMS_RE = re.compile(r"\([^)]*\)|[+-]?\d+")
+# Brackets are also used for names and traits, only these are timing markers
+_TIMING_RE = re.compile(
+    r"^(On |When |Start of |End of |Your Turn|Opponent's Turn|All Turns|"
+    r"Once Per Turn|Twice Per Turn|Main|Security|Hand|Breeding|Counter|Rule)",
+    re.IGNORECASE,
+)
+
+
+def _clean(tag):
+    return " ".join(tag.split())
+
+
+def extract_tags(text):
+    """
+    Extracts keyword and timing tags from an effect text.
+
+    Keywords are the bracketed abilities such as <Blocker> or <Security A. +1>, stored
+    without their numeric parameter ('Security A.'). Timing tags are markers such as
+    [On Play] or [When Digivolving].
+
+    Args:
+        text (str): Effect text, may be None.
+
+    Returns:
+        set[str]: Tags found in the text.
+    """
+    if not text:
+        return set()
+
+    tags = set()
+    for keyword in _KEYWORD_RE.findall(text):
+        keyword = _clean(_KEYWORD_PARAMS_RE.sub(" ", keyword))
+        if keyword:
+            tags.add(keyword)
+    for marker in _BRACKET_RE.findall(text):
+        marker = _clean(marker)
+        if _TIMING_RE.match(marker):
+            tags.add(marker)
+    return tags
+
+
+class TagIndex:
+    """
+    Tag -> bitmap index over the cards of a catalog, where bit i is the card at
+    position i of catalog.cards. Filtering on several tags is a bitwise AND of
+    Python integers, no text is scanned at query time.
+
+    Bitmaps mapped from a catalog file are little-endian bytes, turned into
+    integers when a query reads them.
+    """
+
+    def __init__(self, names, bitmaps, size):
+        # Case-insensitive lookup key -> display name
+        self._names = names
+        self._bitmaps = bitmaps
+        self._size = size
+
+    def _bitmap(self, key):
+        bitmap = self._bitmaps.get(key, 0)
+        if not isinstance(bitmap, int):
+            bitmap = int.from_bytes(bitmap, "little")
+        return bitmap
+
+    @classmethod
+    def build(cls, catalog):
+        return cls.from_cards(catalog.cards)
+
+    @classmethod
+    def from_cards(cls, cards):
+        names, bitmaps = {}, {}
+        for position, card in enumerate(cards):
+            card_tags = set()
+            for field in TEXT_FIELDS:
+                card_tags.update(extract_tags(card.get(field)))
+            bit = 1 << position
+            for tag in card_tags:
+                key = tag.casefold()
+                names.setdefault(key, tag)
+                bitmaps[key] = bitmaps.get(key, 0) | bit
+        return cls(names, bitmaps, len(cards))
+
+    def items(self):
+        """Returns (display name, bitmap) of every tag."""
+        return [(self._names[key], self._bitmap(key)) for key in self._bitmaps]
+
+    def counts(self):
+        """Returns every tag with the number of cards carrying it, most common first."""
+        counts = [
+            {"tag": self._names[key], "cards": self._bitmap(key).bit_count()}
+            for key in self._bitmaps
+        ]
+        counts.sort(key=lambda item: (-item["cards"], item["tag"]))
+        return counts
+
+    def match(self, tags):
+        """
+        Returns the catalog positions of the cards carrying all the given tags, in order.
+        """
+        bitmap = (1 << self._size) - 1
+        for tag in tags:
+            bitmap &= self._bitmap(_clean(tag).casefold())
+            if not bitmap:
+                return []
+
+        positions = []
+        while bitmap:
+            lowest = bitmap & -bitmap
+            positions.append(lowest.bit_length() - 1)
+            bitmap ^= lowest
+        return positions
+
+
+def get_tag_index(catalog):
+    """Returns the tag index of a catalog snapshot, building it on first use."""
+    return catalog.derived("tags", TagIndex.build)
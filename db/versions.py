@@ -0,0 +1,114 @@
+import os
+import threading
+from db.sql import DataVersionsReader, register_write_listener
+
+# Seconds between two reads of the data versions
+VERSION_POLL_INTERVAL = float(os.getenv("VERSION_POLL_INTERVAL", "2"))
+
+# Written table -> data version it bumps
+TABLE_VERSIONS = {
+    "Collection": "collection",
+    "Decks": "decks",
+    "DeckCards": "decks",
+}
+
+
+class VersionWatcher:
+    """
+    Polls the data versions (one cheap query, over a connection kept open by
+    DataVersionsReader) and calls the handlers registered for every version that
+    changed, so each worker refreshes its in-memory data after a catalog load or a
+    write made by another worker.
+
+    Writes made by this worker already update its data through the write
+    listeners. Their versions are recorded when they directly follow the last
+    known version; a gap means another worker wrote in between, and the next poll
+    runs the handlers.
+    """
+
+    def __init__(self, fetch=None, interval=VERSION_POLL_INTERVAL):
+        self._fetch = DataVersionsReader() if fetch is None else fetch
+        self._interval = interval
+        self._versions = None
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name, handler):
+        """
+        Registers a callable run (in the watcher thread) when a data version changes.
+        Handlers of a version run in registration order.
+
+        Args:
+            name (str): 'catalog', 'collection' or 'decks'.
+            handler (callable): Called without arguments.
+        """
+        self._handlers.setdefault(name, []).append(handler)
+
+    def observe_local(self, name, version):
+        """Records a version produced by a write of this worker."""
+        with self._lock:
+            if self._versions is not None and version == self._versions.get(name, 0) + 1:
+                self._versions[name] = version
+
+    def poll(self):
+        """
+        Reads the versions once and runs the handlers of the changed ones.
+
+        Returns:
+            list[str]: Names of the changed versions.
+        """
+        versions = self._fetch()
+        if versions is None:
+            return []
+        with self._lock:
+            previous = self._versions
+            self._versions = dict(versions)
+        if previous is None:
+            # First read, the in-memory data is loaded lazily from the current state
+            return []
+
+        changed = [name for name, version in versions.items() if previous.get(name) != version]
+        for name in changed:
+            for handler in self._handlers.get(name, []):
+                try:
+                    handler()
+                except Exception as e:
+                    print(f"Version handler error ({name}): {e}")
+        return changed
+
+    def start(self):
+        """Starts the polling thread unless it is already running."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="version-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            self.poll()
+            if self._stop.wait(self._interval):
+                close = getattr(self._fetch, "close", None)
+                if close is not None:
+                    close()
+                return
+
+
+version_watcher = VersionWatcher()
+
+
+def _on_write(table, version=None, **details):
+    name = TABLE_VERSIONS.get(table)
+    if name is not None and version is not None:
+        version_watcher.observe_local(name, version)
+
+
+register_write_listener(_on_write)
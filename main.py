@@ -1,13 +1,30 @@
 import os
 import uvicorn
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI, Depends
-from api import cards, auxiliary, collection, decks
-from core.middleware import CacheControlMiddleware
+from api import cards, auxiliary, collection, decks, admin
+from core.cache import ResponseCacheMiddleware
+from core.deadlines import DeadlineMiddleware
+from core.middleware import CacheControlMiddleware, StaleDataMiddleware
 from core.security import custom_openapi, api_key_auth
+from db.cooccurrence import cooccurrence_model
+from db.sql import ensure_schema
+from db.versions import version_watcher
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ensure_schema()
+    # Background jobs
+    cooccurrence_model.start()
+    version_watcher.start()
+    yield
+    version_watcher.stop()
+
+
 app = FastAPI(
     title="Digimon Card API",
     description="API for managing Digimon cards, collections, and decks",
@@ -23,10 +40,15 @@ app = FastAPI(
             "description": "Endpoints for managing user card collections",
         },
         {"name": "Decks", "description": "Endpoints for managing card decks"},
+        {"name": "Admin", "description": "Endpoints for operating the API"},
     ],
+    lifespan=lifespan,
 )
 
-# Middleware
+# Middleware (the last added runs first)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(StaleDataMiddleware)
+app.add_middleware(ResponseCacheMiddleware)
 app.add_middleware(CacheControlMiddleware)
 
 # Routers with global security dependency
@@ -34,6 +56,7 @@ app.include_router(cards.router, dependencies=[Depends(api_key_auth)])
 app.include_router(auxiliary.router, dependencies=[Depends(api_key_auth)])
 app.include_router(collection.router, dependencies=[Depends(api_key_auth)])
 app.include_router(decks.router, dependencies=[Depends(api_key_auth)])
+app.include_router(admin.router, dependencies=[Depends(api_key_auth)])
 
 # Custom OpenAPI with security
 app.openapi = lambda: custom_openapi(app)
@@ -0,0 +1,56 @@
+import pytest
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from the .env file
+load_dotenv()
+TOKEN = os.getenv("API_KEY")
+HEADERS = {"Authorization": f"Bearer {TOKEN}"}
+
+# Test that repeated requests are served from the response cache
+@pytest.mark.asyncio
+async def test_response_cache_hit(client):
+    response = await client.delete("/admin/cache", headers=HEADERS)
+    assert response.status_code == 200
+
+    first = await client.get("/aux/colors", headers=HEADERS)
+    second = await client.get("/aux/colors", headers=HEADERS)
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert first.json() == second.json()
+
+    response = await client.get("/admin/cache", headers=HEADERS)
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["hits"] >= 1
+    assert stats["entries"] >= 1
+
+# Test purging one cache namespace
+@pytest.mark.asyncio
+async def test_response_cache_purge(client):
+    await client.get("/aux/colors", headers=HEADERS)
+    response = await client.delete(
+        "/admin/cache", params={"namespace": "aux"}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    assert response.json()["namespaces"] == ["aux"]
+
+    response = await client.get("/aux/colors", headers=HEADERS)
+    assert response.headers["X-Cache"] == "MISS"
+
+# Test that a cached shard still answers If-None-Match with 304
+@pytest.mark.asyncio
+async def test_response_cache_conditional(client):
+    response = await client.get("/cards/shards/", headers=HEADERS)
+    shard = next(s for s in response.json() if s["kind"] == "set")
+    path = f"/cards/by-set/{shard['name']}"
+
+    first = await client.get(path, headers=HEADERS)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    for _ in range(2):
+        response = await client.get(path, headers={**HEADERS, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
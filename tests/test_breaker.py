@@ -0,0 +1,236 @@
+import threading
+import time
+import pytest
+from mysql.connector.errors import DatabaseError, ProgrammingError
+from db import sql
+from db.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, mark_stale, track_stale_data
+from db.coalesce import StaleWhileRevalidateCache
+
+# Test that the breaker opens after the failure threshold and closes after a good probe
+def test_circuit_breaker_transitions():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.25)
+    assert breaker.state == HALF_OPEN
+    # A single probe goes through
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    time.sleep(0.25)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.available
+    assert breaker.stats()["opened"] == 2
+
+# Test that an expired query result is served and marked stale when the reload fails
+def test_stale_result_on_failed_load():
+    cache = StaleWhileRevalidateCache(ttl=0.1, stale_ttl=0)
+    assert cache.get("full", lambda: ["card"]) == ["card"]
+    time.sleep(0.15)
+
+    stale = track_stale_data()
+    assert cache.get("full", lambda: None) == ["card"]
+    assert stale["age"] >= 0.1
+    assert cache.stats()["fallbacks"] == 1
+
+    mark_stale(0)
+    assert stale["age"] >= 0.1
+
+# Test that statements timing out count as breaker failures, and statement errors as successes
+def test_statement_failures(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2)
+    monkeypatch.setattr(sql, "db_breaker", breaker)
+
+    def timed_out():
+        raise DatabaseError(msg="Query execution was interrupted", errno=3024)
+
+    def bad_statement():
+        raise ProgrammingError(msg="Syntax error", errno=1064)
+
+    with pytest.raises(DatabaseError):
+        sql._guarded(timed_out)
+    assert breaker.stats()["consecutive_failures"] == 1
+    with pytest.raises(ProgrammingError):
+        sql._guarded(bad_statement)
+    assert breaker.stats()["consecutive_failures"] == 0
+
+    for _ in range(2):
+        with pytest.raises(DatabaseError):
+            sql._guarded(timed_out)
+    assert breaker.state == OPEN
+    assert sql._guarded(lambda: "rows") == "rows"
+    assert breaker.state == CLOSED
+
+# Test that a list served from the catalog after a failed query is marked stale, breaker closed or not
+def test_failed_query_catalog_fallback(monkeypatch):
+    from api import cards
+    from db.catalog import Catalog
+    from db.records import CardRecords
+
+    rows = [{"card_number": "BT1-001", "name": "Koromon", "alternative": 0}]
+    catalog = Catalog(CardRecords.from_dicts(rows), {}, built_at=time.time() - 60)
+    monkeypatch.setattr(cards, "get_catalog", lambda: catalog)
+    monkeypatch.setattr(cards, "search_cards_by_name", lambda name_part, fields=None: None)
+    assert cards.db_breaker.available
+
+    stale = track_stale_data()
+    assert cards.search_cards("Koro", None, "card_number") == [{"card_number": "BT1-001"}]
+    assert stale["age"] >= 60
+
+# Test that a card whose query cannot reach the database is served from the catalog, marked stale
+def test_card_catalog_fallback(monkeypatch):
+    from fastapi import HTTPException
+    from api import cards
+    from db.catalog import Catalog
+    from db.records import CardRecords
+
+    rows = [
+        {"card_number": "BT1-001", "name": "Koromon", "alternative": 0},
+        {"card_number": "BT1-001_P1", "name": "Koromon", "alternative": 1},
+    ]
+    catalog = Catalog(CardRecords.from_dicts(rows), {}, built_at=time.time() - 60)
+    monkeypatch.setattr(cards, "get_catalog", lambda: catalog)
+    monkeypatch.setattr(cards, "is_known_card", lambda card_number: None)
+    monkeypatch.setattr(cards, "get_single_card_by_card_number", lambda card_number, fields=None: None)
+
+    stale = track_stale_data()
+    assert cards.get_card("BT1-001", "name") == {"name": "Koromon"}
+    assert stale["age"] >= 60
+    with pytest.raises(HTTPException) as error:
+        cards.get_card("BT1-001_P1", None)
+    assert error.value.status_code == 404
+
+    monkeypatch.setattr(cards, "get_catalog", lambda: None)
+    with pytest.raises(HTTPException) as error:
+        cards.get_card("BT1-001", None)
+    assert error.value.status_code == 503
+
+# Test that deck suggestions answer 503 when the deck cannot be read or the model is still building
+def test_suggestions_unavailable(monkeypatch):
+    from fastapi import HTTPException
+    from api import decks
+
+    monkeypatch.setattr(decks, "get_deck_by_id", lambda deck_id: None)
+    with pytest.raises(HTTPException) as error:
+        decks.suggest_cards_for_deck(1, 10, "pmi", 1, True)
+    assert error.value.status_code == 503
+
+    monkeypatch.setattr(decks, "get_deck_by_id", lambda deck_id: {})
+    with pytest.raises(HTTPException) as error:
+        decks.suggest_cards_for_deck(1, 10, "pmi", 1, True)
+    assert error.value.status_code == 404
+
+    monkeypatch.setattr(decks, "get_deck_by_id", lambda deck_id: {"id": 1, "color_id": None})
+    # A model that never finishes building
+    monkeypatch.setattr(decks.cooccurrence_model, "_ready", threading.Event())
+    monkeypatch.setattr(decks.cooccurrence_model, "start", lambda: None)
+    monkeypatch.setattr(decks, "time_remaining", lambda: 0.02)
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as error:
+        decks.suggest_cards_for_deck(1, 10, "pmi", 1, True)
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == str(decks.MODEL_RETRY_AFTER)
+    assert time.monotonic() - started < 0.5
+
+    # The model is ready but the deck cards cannot be read
+    ready = threading.Event()
+    ready.set()
+    monkeypatch.setattr(decks.cooccurrence_model, "_ready", ready)
+    monkeypatch.setattr(decks.deck_card_index, "cards_in_deck", lambda deck_id: None)
+    with pytest.raises(HTTPException) as error:
+        decks.suggest_cards_for_deck(1, 10, "pmi", 1, True)
+    assert error.value.status_code == 503
+
+# Test that deck evolution lines answer 503 when the deck cards cannot be read
+def test_deck_evolution_lines_unavailable(monkeypatch):
+    from fastapi import HTTPException
+    from api import decks
+
+    monkeypatch.setattr(decks.deck_card_index, "cards_in_deck", lambda deck_id: None)
+    with pytest.raises(HTTPException) as error:
+        decks.get_deck_evolution_lines(1)
+    assert error.value.status_code == 503
+
+# Test that the routes built on the catalog answer 503 when no catalog could be loaded
+def test_catalog_routes_unavailable(monkeypatch):
+    from fastapi import HTTPException
+    from api import cards
+
+    monkeypatch.setattr(cards, "get_catalog", lambda: None)
+    monkeypatch.setattr(cards, "latest_snapshot", lambda: None)
+    routes = [
+        lambda: cards.list_card_tags(),
+        lambda: cards.list_card_shards(True),
+        lambda: cards.list_cards_by_set(None, None, "BT1", True, None),
+        lambda: cards.get_similar_cards("BT1-001", 10, None),
+        lambda: cards.get_card_evolves_to("BT1-001", None),
+        lambda: cards.autocomplete_cards("agu", 10),
+        lambda: cards.get_catalog_snapshot(),
+        lambda: cards._cards_with_tags(["Blocker"]),
+    ]
+    for route in routes:
+        with pytest.raises(HTTPException) as error:
+            route()
+        assert error.value.status_code == 503
+
+# Test that an auxiliary table served from the catalog after a failed read is marked stale and not cached
+@pytest.mark.asyncio
+async def test_aux_catalog_fallback(client, monkeypatch):
+    from api import auxiliary
+    from core import cache, security
+    from db.catalog import Catalog
+
+    bts = [{"id": 1, "name": "Release Special", "abbreviation": "BT1"}]
+    catalog = Catalog([], {"bts": bts}, built_at=time.time() - 60)
+    monkeypatch.setattr(security, "API_KEY", "test-key")
+    monkeypatch.setattr(cache, "API_KEY", "test-key")
+    monkeypatch.setattr(auxiliary, "get_all_bts", lambda: None)
+    monkeypatch.setattr(auxiliary, "get_catalog", lambda: catalog)
+    stores = cache.response_cache.stats()["stores"]
+
+    for _ in range(2):
+        response = await client.get("/aux/bts", headers={"Authorization": "Bearer test-key"})
+        assert response.status_code == 200
+        assert response.json() == bts
+        assert int(response.headers["X-Data-Stale"]) >= 60
+        assert response.headers["Cache-Control"] == "no-cache"
+        assert "X-Cache" not in response.headers
+    assert cache.response_cache.stats()["stores"] == stores
+
+# Test that an auxiliary row whose read cannot reach the database is taken from the catalog, or answers 503
+def test_aux_row_catalog_fallback(monkeypatch):
+    from fastapi import HTTPException
+    from api import auxiliary
+    from db.catalog import Catalog
+
+    bts = [{"id": 1, "name": "Release Special", "abbreviation": "BT1"}]
+    catalog = Catalog([], {"bts": bts}, built_at=time.time() - 60)
+    monkeypatch.setattr(auxiliary, "get_bt_by_id", lambda bt_id: None)
+    monkeypatch.setattr(auxiliary, "get_catalog", lambda: catalog)
+
+    stale = track_stale_data()
+    assert auxiliary.get_bt(1) == bts[0]
+    assert stale["age"] >= 60
+    with pytest.raises(HTTPException) as error:
+        auxiliary.get_bt(2)
+    assert error.value.status_code == 404
+
+    monkeypatch.setattr(auxiliary, "get_catalog", lambda: None)
+    with pytest.raises(HTTPException) as error:
+        auxiliary.get_bt(1)
+    assert error.value.status_code == 503
+
+    # A row missing from the database is still a 404
+    monkeypatch.setattr(auxiliary, "get_bt_by_id", lambda bt_id: {})
+    with pytest.raises(HTTPException) as error:
+        auxiliary.get_bt(1)
+    assert error.value.status_code == 404
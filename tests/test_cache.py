@@ -0,0 +1,317 @@
+import socketserver
+import sqlite3
+import threading
+import time
+import pytest
+from starlette.requests import Request
+from core.cache import ResponseCache, cache_key
+from core.cache_backends import MemoryBackend, SQLiteBackend, RedisBackend
+from db.coalesce import SingleFlight, StaleWhileRevalidateCache
+from db.versions import VersionWatcher
+
+
+class RespStandIn(socketserver.ThreadingTCPServer):
+    """Minimal Redis protocol server (GET, SET PX, INCR, INCRBY, DEL, SCAN) for the tests."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RespHandler)
+        self.data = {}
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def bulk(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        data = self.server.data
+        while (args := self.read_command()) is not None:
+            command = args[0].upper()
+            if command == b"GET":
+                value, expires_at = data.get(args[1], (None, None))
+                if expires_at is not None and expires_at <= time.monotonic():
+                    value = None
+                self.wfile.write(self.bulk(value))
+            elif command == b"SET":
+                expires_at = time.monotonic() + int(args[4]) / 1000 if len(args) > 4 else None
+                data[args[1]] = (args[2], expires_at)
+                self.wfile.write(b"+OK\r\n")
+            elif command in (b"INCR", b"INCRBY"):
+                increment = int(args[2]) if command == b"INCRBY" else 1
+                value = int(data.get(args[1], (b"0", None))[0]) + increment
+                data[args[1]] = (str(value).encode(), None)
+                self.wfile.write(b":%d\r\n" % value)
+            elif command == b"DEL":
+                removed = sum(data.pop(key, None) is not None for key in args[1:])
+                self.wfile.write(b":%d\r\n" % removed)
+            elif command == b"SCAN":
+                prefix = args[3].rstrip(b"*")
+                keys = [key for key in data if key.startswith(prefix)]
+                self.wfile.write(
+                    b"*2\r\n" + self.bulk(b"0") + b"*%d\r\n" % len(keys)
+                    + b"".join(self.bulk(key) for key in keys)
+                )
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+
+
+@pytest.fixture
+def resp_server():
+    server = RespStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    server = request.getfixturevalue("resp_server")
+    host, port = server.server_address
+    return RedisBackend(f"redis://{host}:{port}/0")
+
+# Test get/set, expiry and counters on every backend
+def test_backend_roundtrip(backend):
+    assert backend.get("missing") is None
+    backend.set("key", b"value", 60)
+    assert backend.get("key") == b"value"
+
+    backend.set("short", b"value", 0.05)
+    time.sleep(0.1)
+    assert backend.get("short") is None
+
+    assert backend.counter("generation") == 0
+    assert backend.incr("generation") == 1
+    assert backend.incr("generation") == 2
+    assert backend.counter("generation") == 2
+
+    backend.clear()
+    assert backend.get("key") is None
+    assert backend.counter("generation") == 0
+
+# Test that two processes' views of the sqlite file share entries
+def test_sqlite_backend_shared(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+    first.set("key", b"value", 60)
+    first.incr("generation")
+    assert second.get("key") == b"value"
+    assert second.counter("generation") == 1
+
+# Test size-bounded LRU eviction of the memory backend
+def test_memory_backend_eviction():
+    backend = MemoryBackend(max_bytes=10)
+    backend.set("a", b"12345", 60)
+    backend.set("b", b"12345", 60)
+    assert backend.get("a") == b"12345"
+    backend.set("c", b"12345", 60)
+    assert backend.get("b") is None
+    assert backend.get("a") == b"12345"
+    assert backend.stats()["evictions"] == 1
+
+# Test that an unreachable Redis server behaves as an empty cache
+def test_redis_backend_unreachable():
+    backend = RedisBackend("redis://127.0.0.1:1/0", timeout=0.1)
+    backend.set("key", b"value", 60)
+    assert backend.get("key") is None
+    assert backend.counter("generation") is None
+    assert backend.errors > 0
+
+# Test that an unreachable Redis server is skipped once the failure threshold is reached
+def test_redis_backend_backoff():
+    backend = RedisBackend("redis://127.0.0.1:1/0", timeout=0.1)
+    for _ in range(5):
+        assert backend.get("key") is None
+    stats = backend.stats()
+    assert stats["errors"] == 3
+    assert stats["breaker"]["state"] == "open"
+    assert stats["breaker"]["rejected"] == 2
+
+# Test that a failed invalidation bypasses the namespace until the generation is incremented
+def test_response_cache_failed_invalidation():
+    class FlakyBackend(MemoryBackend):
+        down = False
+
+        def incr(self, key):
+            return None if self.down else super().incr(key)
+
+    backend = FlakyBackend()
+    cache = ResponseCache(backend)
+    generation = cache.generation("cards")
+    cache.set("cards", generation, "/cards/", 200, {}, b"old", 60)
+
+    backend.down = True
+    cache.purge(["cards"])
+    assert cache.generation("cards") is None
+    assert cache.stats()["failed_invalidations"] == 1
+    assert cache.stats()["pending_invalidations"] == ["cards"]
+
+    backend.down = False
+    new_generation = cache.generation("cards")
+    assert new_generation == generation + 1
+    assert cache.get("cards", new_generation, "/cards/") is None
+    assert cache.stats()["pending_invalidations"] == []
+
+# Test that a generation the backend cannot read bypasses the cache instead of reading or storing generation 0
+def test_response_cache_failed_generation(tmp_path):
+    class FailingBackend(SQLiteBackend):
+        down = False
+
+        def _connection(self):
+            if self.down:
+                raise sqlite3.OperationalError("disk I/O error")
+            return super()._connection()
+
+    backend = FailingBackend(str(tmp_path / "cache.sqlite3"))
+    cache = ResponseCache(backend)
+    assert cache.generation("cards") == 0
+    cache.set("cards", 0, "/cards/", 200, {}, b"old", 60)
+    cache.purge(["cards"])
+
+    backend.down = True
+    generation = cache.generation("cards")
+    assert generation is None
+    assert cache.get("cards", generation, "/cards/") is None
+    cache.set("cards", generation, "/cards/", 200, {}, b"new", 60)
+
+    # Only the first response was stored
+    assert cache.stats()["stores"] == 1
+    backend.down = False
+    assert cache.generation("cards") == 1
+    assert cache.get("cards", 1, "/cards/") is None
+
+# Test that concurrent identical calls share one execution
+def test_single_flight_coalesces():
+    flight = SingleFlight()
+    calls = []
+
+    def query():
+        calls.append(1)
+        time.sleep(0.2)
+        return ["result"]
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("full", query)))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [["result"]] * 10
+
+# Test that a stale result is served while it is refreshed in the background
+def test_stale_while_revalidate():
+    cache = StaleWhileRevalidateCache(ttl=0.5, stale_ttl=10)
+    versions = iter(range(1, 100))
+    loader = lambda: [next(versions)]
+
+    assert cache.get("full", loader) == [1]
+    time.sleep(0.6)
+    assert cache.get("full", loader) == [1]
+    time.sleep(0.1)
+    assert cache.get("full", loader) == [2]
+    assert cache.stats()["refreshes"] == 1
+
+# Test that only versions changed by another process run the handlers
+def test_version_watcher():
+    versions = {"catalog": 3, "collection": 10, "decks": 5}
+    watcher = VersionWatcher(fetch=lambda: dict(versions))
+    calls = []
+    watcher.register("collection", lambda: calls.append("collection"))
+    watcher.register("decks", lambda: calls.append("decks"))
+
+    assert watcher.poll() == []
+    # A write of this worker directly following the known version
+    versions["collection"] = 11
+    watcher.observe_local("collection", 11)
+    assert watcher.poll() == []
+    # Another worker wrote in between: a gap
+    versions["decks"] = 7
+    watcher.observe_local("decks", 7)
+    versions["catalog"] = 4
+    assert sorted(watcher.poll()) == ["catalog", "decks"]
+    assert calls == ["decks"]
+
+# Test that the data versions are read over one kept connection, reopened only after a failed read
+def test_data_versions_reader(monkeypatch):
+    from db import sql
+
+    class FakeConnection:
+        fail = False
+        closed = False
+
+        def cursor(self):
+            return self
+
+        def execute(self, query):
+            if self.fail:
+                raise RuntimeError("Lost connection to MySQL server")
+
+        def fetchall(self):
+            return [("collection", 4)]
+
+        def commit(self):
+            pass
+
+        def close(self):
+            self.closed = True
+
+    connections = []
+
+    def create_connection():
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(sql, "_create_connection", create_connection)
+    reader = sql.DataVersionsReader()
+
+    assert reader() == {"collection": 4, "catalog": 0}
+    assert reader() == {"collection": 4, "catalog": 0}
+    assert len(connections) == 1 and not connections[0].closed
+
+    connections[0].fail = True
+    assert reader() is None
+    assert connections[0].closed
+    assert reader() == {"collection": 4, "catalog": 0}
+    assert len(connections) == 2
+
+# Test that the encoding of a request follows the qualities of its Accept header
+def test_accept_negotiation():
+    def request(accept):
+        return Request({
+            "type": "http",
+            "method": "GET",
+            "path": "/cards/",
+            "query_string": b"",
+            "headers": [(b"accept", accept.encode())],
+        })
+
+    assert cache_key(request("application/msgpack")).endswith("#msgpack")
+    assert cache_key(request("application/json, application/x-msgpack;q=1")).endswith("#msgpack")
+    assert cache_key(request("application/msgpack;q=0, application/json")).endswith("#json")
+    assert cache_key(request("application/msgpack;q=0.5, application/json")).endswith("#json")
+    assert cache_key(request("Application/MsgPack;q=0.9, */*;q=0.1")).endswith("#msgpack")
+    assert cache_key(request("*/*")).endswith("#json")
+    assert cache_key(request("application/vnd.msgpack-like")).endswith("#json")
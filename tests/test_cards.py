@@ -1,3 +1,5 @@
+import hashlib
+import msgpack
 import pytest
 import os
 from dotenv import load_dotenv
@@ -193,3 +195,202 @@ async def test_get_cards_with_ids(client):
         for fk_field in ["card_type", "rarity", "color_one", "color_two", "color_three",
                          "stage", "attribute", "type_one", "type_two", "bt_abbreviation"]:
             assert isinstance(card[fk_field], (int, type(None)))
+
+# Test retrieving cards similar to a given card
+@pytest.mark.asyncio
+async def test_get_similar_cards(client):
+    card_number = "EX9-001"
+    response = await client.get(
+        f"/cards/{card_number}/similar", params={"limit": 5}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert isinstance(data, list)
+    assert 1 <= len(data) <= 5
+
+    similarities = [card["similarity"] for card in data]
+    assert similarities == sorted(similarities, reverse=True)
+    for card in data:
+        assert card["card_number"] != card_number
+        for field in ["id", "card_number", "name", "card_type", "image_url"]:
+            assert field in card
+
+# Test that a nonexistent card number is answered with 404
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", ["/cards/NOPE-000", "/cards/NOPE-000/alternatives"])
+async def test_get_card_not_found(client, path):
+    response = await client.get(path, headers=HEADERS)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Card not found"
+
+# Test similar cards of a nonexistent card
+@pytest.mark.asyncio
+async def test_get_similar_cards_not_found(client):
+    response = await client.get("/cards/NOPE-000/similar", headers=HEADERS)
+    assert response.status_code == 404
+
+# Test forward and backward digivolution options of a card
+@pytest.mark.asyncio
+@pytest.mark.parametrize("direction", ["evolves-to", "evolves-from"])
+async def test_get_card_evolution_options(client, direction):
+    response = await client.get(f"/cards/EX9-001/{direction}", headers=HEADERS)
+    assert response.status_code == 200
+    data = response.json()
+    assert isinstance(data, list)
+
+    for card in data:
+        for field in ["card_number", "name", "stage", "color_one", "card_type"]:
+            assert field in card
+
+# Test listing tags and filtering cards by a keyword tag
+@pytest.mark.asyncio
+async def test_filter_cards_by_tag(client):
+    response = await client.get("/cards/tags/", headers=HEADERS)
+    assert response.status_code == 200
+    tags = response.json()
+    assert isinstance(tags, list)
+    assert any(item["tag"] == "Blocker" for item in tags)
+
+    response = await client.get(
+        "/cards/full/", params={"tags": "Blocker"}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) > 0
+
+    for card in data:
+        texts = [card["effect"], card["evolution_effect"], card["security_effect"]]
+        assert any(text and "<Blocker>" in text for text in texts)
+
+# Test autocomplete by card name prefix and card number prefix
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query, key, expected_prefix", [
+    ("demidev", "name", "demidevi"),
+    ("EX9-0", "card_number", "ex9-0"),
+])
+async def test_autocomplete(client, query, key, expected_prefix):
+    response = await client.get(
+        "/cards/autocomplete", params={"q": query, "limit": 5}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert 1 <= len(data) <= 5
+    assert any(item[key].lower().startswith(expected_prefix) for item in data)
+
+# Test set shard download and revalidation with its ETag
+@pytest.mark.asyncio
+async def test_cards_by_set_etag(client):
+    response = await client.get("/cards/shards/", headers=HEADERS)
+    assert response.status_code == 200
+    shards = response.json()
+    shard = next(s for s in shards if s["kind"] == "set")
+
+    response = await client.get(f"/cards/by-set/{shard['name']}", headers=HEADERS)
+    assert response.status_code == 200
+    assert len(response.json()) == shard["cards"]
+    assert response.headers["ETag"] == shard["etag"]
+    assert all(card["bt_abbreviation"] == shard["name"] for card in response.json())
+
+    response = await client.get(
+        f"/cards/by-set/{shard['name']}",
+        headers={**HEADERS, "If-None-Match": shard["etag"]},
+    )
+    assert response.status_code == 304
+
+# Test catalog changes: no version forces a reset, the current version has no changes
+@pytest.mark.asyncio
+async def test_card_changes(client):
+    response = await client.get("/cards/changes", headers=HEADERS)
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-store"
+    data = response.json()
+    assert data["reset"] is True
+    version = data["version"]
+
+    response = await client.get(
+        "/cards/changes", params={"since": version}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["reset"] is False
+    assert data["version"] >= version
+    if data["version"] == version:
+        assert data["upserted"] == []
+        assert data["deleted"] == []
+
+# Test catalog snapshot manifest and immutable download
+@pytest.mark.asyncio
+async def test_catalog_snapshot(client):
+    response = await client.get("/cards/snapshot/", headers=HEADERS)
+    assert response.status_code == 200
+    manifest = response.json()
+    assert manifest["rows"] > 0
+
+    response = await client.get(manifest["url"], headers=HEADERS)
+    assert response.status_code == 200
+    assert len(response.content) == manifest["size"]
+    assert hashlib.sha256(response.content).hexdigest() == manifest["sha256"]
+    assert "immutable" in response.headers["Cache-Control"]
+
+# Test columnar and normalized card list formats
+@pytest.mark.asyncio
+async def test_get_cards_columnar_normalized(client):
+    response = await client.get("/cards/", headers=HEADERS)
+    assert response.status_code == 200
+    rows = response.json()
+
+    response = await client.get(
+        "/cards/", params={"format": "columnar", "normalize": 1}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == len(rows)
+    assert data["columns"]["card_number"] == [row["card_number"] for row in rows]
+
+    colors = data["aux"]["colors"]
+    for row, color_id in zip(rows, data["columns"]["color_one"]):
+        if color_id is not None:
+            assert colors[str(color_id)] == row["color_one"]
+
+# Test MessagePack content negotiation on the bulk card endpoints
+@pytest.mark.asyncio
+async def test_cards_msgpack(client):
+    response = await client.get("/cards/ids/", headers=HEADERS)
+    assert response.status_code == 200
+    rows = response.json()
+
+    response = await client.get(
+        "/cards/ids/", headers={**HEADERS, "Accept": "application/msgpack"}
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/msgpack"
+    assert response.headers["Vary"] == "Accept"
+    assert msgpack.unpackb(response.content) == rows
+
+# Test field projection and rejection of unknown fields
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", ["/cards/", "/cards/full/"])
+async def test_get_cards_fields(client, path):
+    response = await client.get(
+        path, params={"fields": "card_number,name,image_url"}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) > 0
+    assert all(set(card) == {"card_number", "name", "image_url"} for card in data)
+
+    response = await client.get(path, params={"fields": "name,password"}, headers=HEADERS)
+    assert response.status_code == 400
+
+# Test that the searched cards with alternatives only carry the requested fields
+@pytest.mark.asyncio
+async def test_search_cards_with_alternatives_fields(client):
+    response = await client.get(
+        "/cards/search-with-alternatives/",
+        params={"name_part": "Agumon", "fields": "name,image_url"},
+        headers=HEADERS,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) > 0
+    assert all(set(card) == {"name", "image_url", "alternatives"} for card in data)
@@ -0,0 +1,252 @@
+import gc
+import json
+import os
+import threading
+import time
+import tracemalloc
+from array import array
+import pytest
+from core.formats import format_rows
+from db import catalog as catalog_module
+from db.catalog import Catalog, is_known_card
+from db.catalog_file import MappedCatalogFile, write_catalog_file
+from db.records import CardRecords
+from db.shards import ShardIndex
+from db.tags import TagIndex
+
+CARDS = [
+    {"id": 2, "card_number": "BT1-010", "name": "Agumon", "dp": 2000, "color_two": None, "alternative": 0},
+    {"id": 1, "card_number": "BT1-001", "name": "Koromon", "dp": None, "color_two": "Red", "alternative": 0},
+    {"id": 3, "card_number": "BT1-010_P1", "name": "Agumon", "dp": 2000, "color_two": None, "alternative": 1},
+]
+AUX = {"colors": [{"id": 1, "name": "Red"}]}
+
+# Test that a mapped catalog file returns the rows it was written from
+def test_catalog_file_roundtrip(tmp_path):
+    path = str(tmp_path / "catalog.dcgcat")
+    write_catalog_file(CARDS, AUX, 7, path)
+    mapped = MappedCatalogFile(path)
+
+    assert mapped.catalog_version == 7
+    assert mapped.aux == AUX
+    assert len(mapped.cards) == 3
+    assert list(mapped.cards) == CARDS
+    assert mapped.cards[-1] == CARDS[2]
+    assert mapped.cards[1:] == CARDS[1:]
+    assert mapped.cards.column("dp") == [2000, None, 2000]
+    assert mapped.by_number["BT1-001"] == CARDS[1]
+    assert mapped.by_number.get("BT1-010_P1") == CARDS[2]
+    assert mapped.by_number.get("BT9-999") is None
+    assert "BT1-010" in mapped.by_number
+    assert "BT1-011" not in mapped.by_number
+
+    catalog = Catalog(mapped.cards, mapped.aux, by_number=mapped.by_number)
+    assert catalog.records(["card_number", "dp"], include_alternative=False).to_list() == [
+        {"card_number": "BT1-010", "dp": 2000},
+        {"card_number": "BT1-001", "dp": None},
+    ]
+    assert list(catalog.main_positions()) == [0, 1]
+    records = catalog.records(["card_number", "dp"])
+    assert json.loads(records.json_rows()) == [
+        {"card_number": card["card_number"], "dp": card["dp"]} for card in CARDS
+    ]
+
+# Test that a replaced file does not affect a worker still mapping the old one
+def test_catalog_file_replace(tmp_path):
+    path = str(tmp_path / "catalog.dcgcat")
+    write_catalog_file(CARDS, AUX, 7, path)
+    old = MappedCatalogFile(path)
+
+    write_catalog_file(CARDS[:1], AUX, 8, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    new = MappedCatalogFile(path)
+
+    assert list(old.cards) == CARDS
+    assert list(new.cards) == CARDS[:1]
+    assert new.catalog_version == 8
+
+# Test that mapped records encode the JSON a serializer would give for the decoded rows
+def test_mapped_records_json(tmp_path):
+    cards = [
+        dict(CARDS[0], name='Agumon "X"\n', traits=["Dragon", 2]),
+        dict(CARDS[1], name="Koromon é\\", traits=None),
+        dict(CARDS[2], traits={"form": "Rookie"}),
+    ]
+    path = str(tmp_path / "catalog.dcgcat")
+    write_catalog_file(cards, AUX, 7, path)
+    mapped = MappedCatalogFile(path)
+    catalog = Catalog(mapped.cards, mapped.aux, by_number=mapped.by_number)
+    fields = list(cards[0])
+
+    records = catalog.records(fields)
+    assert json.loads(records.json_rows()) == cards
+    assert records.to_list() == cards
+    assert json.loads(format_rows(records, "columnar").body) == {
+        "count": 3,
+        "columns": {field: [card[field] for card in cards] for field in fields},
+    }
+
+    with_ids = catalog.records(
+        ["id", "color_two"], include_alternative=False, lookups={"color_two": {"Red": 1}}
+    )
+    assert json.loads(format_rows(with_ids).body) == [
+        {"id": 2, "color_two": None},
+        {"id": 1, "color_two": 1},
+    ]
+    assert with_ids.column("color_two") == [None, 1]
+
+# Test that serving lists from a mapped catalog leaves no decoded copy in the worker's memory
+@pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs Linux")
+def test_mapped_catalog_memory(tmp_path):
+    def anonymous_memory():
+        # Private memory of the process: the mapped file pages are not counted
+        with open("/proc/self/smaps_rollup") as file:
+            for line in file:
+                if line.startswith("Anonymous:"):
+                    return int(line.split()[1]) * 1024
+
+    cards = [
+        {
+            "id": i,
+            "card_number": f"BT1-{i:05d}",
+            "name": f"Digimon {i}",
+            "effect": f"[On Play] Delete 1 of your opponent's Digimon with {i} DP or less. " * 4,
+            "dp": i * 1000,
+            "alternative": int(i % 10 == 0),
+        }
+        for i in range(20000)
+    ]
+    path = str(tmp_path / "catalog.dcgcat")
+    write_catalog_file(cards, AUX, 7, path)
+    mapped = MappedCatalogFile(path)
+    catalog = Catalog(
+        mapped.cards, mapped.aux, by_number=mapped.by_number,
+        derived={"main_positions": mapped.main_positions},
+    )
+    fields = list(cards[0])
+    size = len(json.dumps(cards))
+    del cards
+
+    def serve():
+        for include_alternative in (True, False):
+            format_rows(catalog.records(fields, include_alternative))
+            format_rows(catalog.records(fields, include_alternative), "columnar")
+
+    # Nothing decoded outlives the requests
+    tracemalloc.start()
+    serve()
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert retained < size // 100
+
+    # Once the allocator holds a response buffer, serving more does not grow the worker
+    gc.collect()
+    before = anonymous_memory()
+    for _ in range(3):
+        serve()
+    gc.collect()
+    assert anonymous_memory() - before < size // 2
+
+# Test that card records behave as the rows they were built from
+def test_card_records():
+    records = CardRecords.from_tuples(
+        ["id", "card_number", "name", "dp", "color_two", "alternative"],
+        [tuple(card.values()) for card in CARDS],
+    )
+    assert len(records) == 3
+    assert list(records) == CARDS
+    assert records[1] == CARDS[1]
+    assert records[:2] == CARDS[:2]
+    assert isinstance(records.column("id"), array)
+    assert records.column("dp") == (2000, None, 2000)
+    # Equal strings share one object
+    assert records.column("name")[0] is records.column("name")[2]
+    assert CardRecords.from_columns(records.to_columns()).to_list() == CARDS
+
+    by_number = records.index("card_number")
+    assert by_number["BT1-010_P1"] == CARDS[2]
+    assert by_number.get("BT9-999") is None
+    assert "BT1-001" in by_number
+
+# Test that the shard and tag indexes read from a catalog file match the built ones
+def test_catalog_file_indexes(tmp_path):
+    cards = [
+        dict(card, bt_abbreviation="BT1", color_one=card["color_two"] or "Yellow", effect=effect)
+        for card, effect in zip(CARDS, ["<Blocker>", "[On Play] Draw 1.", "<Blocker> [On Play]"])
+    ]
+    path = str(tmp_path / "catalog.dcgcat")
+    write_catalog_file(cards, AUX, 7, path)
+    mapped = MappedCatalogFile(path)
+
+    built = ShardIndex.from_cards(cards)
+    assert mapped.shards.manifest() == built.manifest()
+    assert mapped.shards.manifest(include_alternative=False) == built.manifest(include_alternative=False)
+    assert list(mapped.shards.get("set", "bt1").positions) == [0, 1, 2]
+    assert list(mapped.shards.get("color", "RED").main_positions) == [1]
+    assert mapped.tags.counts() == TagIndex.from_cards(cards).counts()
+    assert mapped.tags.match(["blocker", "On Play"]) == [2]
+
+# Test that the card number check does not wait for the first catalog load
+def test_is_known_card_background_load(monkeypatch):
+    release = threading.Event()
+
+    def load_catalog(use_cache=True):
+        release.wait(1)
+        return Catalog(CardRecords.from_dicts(CARDS), AUX)
+
+    monkeypatch.setattr(catalog_module, "load_catalog", load_catalog)
+    monkeypatch.setattr(catalog_module, "_catalog", None)
+    assert is_known_card("BT1-001") is None
+    release.set()
+    for _ in range(100):
+        if catalog_module._catalog is not None:
+            break
+        time.sleep(0.01)
+    assert is_known_card("BT1-001") is True
+    assert is_known_card("BT9-999") is False
+
+# Test that an index built from the catalog can use other derived indexes
+def test_nested_derived_index():
+    catalog = Catalog(CardRecords.from_dicts(CARDS), AUX)
+    main_numbers = catalog.derived(
+        "main_numbers", lambda catalog: [card["card_number"] for card in catalog.main_cards()]
+    )
+    assert main_numbers == ["BT1-010", "BT1-001"]
+    assert catalog.alternative_positions("BT1-010") == (2,)
+
+def _next_index(cache, catalog, index):
+    # Serves the current index while it is rebuilt in the background, then the new one
+    for _ in range(100):
+        current = cache.get(catalog)
+        if current is not index:
+            return current
+        time.sleep(0.01)
+    raise AssertionError("the autocomplete index was not rebuilt")
+
+# Test that an autocomplete index missing the collection is served until its retry, and that writes rebuild it in the background
+def test_autocomplete_index_refresh(monkeypatch):
+    from db import autocomplete
+
+    cards = [dict(card, image_url=None) for card in CARDS]
+    catalog = Catalog(CardRecords.from_dicts(cards), AUX)
+    monkeypatch.setattr(autocomplete.deck_card_index, "all_decks", lambda: {1: {"BT1-001": 4}})
+    reads = []
+    monkeypatch.setattr(autocomplete, "get_collection_quantities", lambda: reads.append(1))
+    cache = autocomplete.AutocompleteCache(retry_seconds=0.2)
+
+    index = cache.get(catalog)
+    assert [entry["card_number"] for entry in index.suggest("bt1")] == ["BT1-001", "BT1-010"]
+    assert cache.get(catalog) is index
+    assert len(reads) == 1
+
+    monkeypatch.setattr(autocomplete, "get_collection_quantities", lambda: {"BT1-010": 9})
+    time.sleep(0.25)
+    index = _next_index(cache, catalog, index)
+    assert [entry["card_number"] for entry in index.suggest("bt1")] == ["BT1-010", "BT1-001"]
+    assert cache.get(catalog) is index
+
+    monkeypatch.setattr(autocomplete, "get_collection_quantities", lambda: {"BT1-001": 20})
+    cache.mark_outdated()
+    index = _next_index(cache, catalog, index)
+    assert [entry["card_number"] for entry in index.suggest("bt1")] == ["BT1-001", "BT1-010"]
@@ -93,6 +93,51 @@ async def test_increment_quantity(client):
 
 @pytest.mark.order(5)
 @pytest.mark.asyncio
+async def test_filter_and_sort(client):
+    """
+    Filters the collection by owned quantity and sorts it,
+    checking the results and the X-Total-Count header.
+    """
+    if not card_added:
+        pytest.skip("Card was not added successfully in the previous test.")
+
+    response = await client.get(
+        "/collection/",
+        params={"min_quantity": 3, "sort_by": "quantity", "order": "desc", "per_page": 100},
+        headers=HEADERS,
+    )
+    assert response.status_code == 200
+
+    cards = response.json()
+    assert all(c["quantity"] >= 3 for c in cards)
+    assert [c["quantity"] for c in cards] == sorted((c["quantity"] for c in cards), reverse=True)
+    assert any(c["card_number"] == TEST_CARD_NUMBER for c in cards)
+    assert int(response.headers["X-Total-Count"]) >= len(cards)
+
+
+@pytest.mark.order(6)
+@pytest.mark.asyncio
+async def test_collection_stats(client):
+    """
+    Checks that the collection statistics count the added card
+    and report owned versus existing cards per set.
+    """
+    if not card_added:
+        pytest.skip("Card was not added successfully in the previous test.")
+
+    response = await client.get("/collection/stats", headers=HEADERS)
+    assert response.status_code == 200
+
+    stats = response.json()
+    assert stats["all"]["owned_cards"] + stats["all"]["owned_alternatives"] >= 1
+    assert stats["all"]["total_quantity"] >= 3
+    for group in stats["bt"]:
+        assert "name" in group
+        assert group["owned_cards"] <= group["catalog_cards"]
+
+
+@pytest.mark.order(7)
+@pytest.mark.asyncio
 async def test_pagination(client):
     """
     Validates that pagination parameters are respected by the /collection/ endpoint.
@@ -108,8 +153,15 @@ async def test_pagination(client):
     assert isinstance(resp2.json(), list)
     assert len(resp2.json()) <= 1
 
+    # Page metadata headers
+    total = int(resp1.headers["X-Total-Count"])
+    assert int(resp1.headers["X-Total-Pages"]) == total
+    assert 'rel="first"' in resp1.headers["Link"]
+    if total > 1:
+        assert 'rel="next"' in resp1.headers["Link"]
 
-@pytest.mark.order(6)
+
+@pytest.mark.order(8)
 @pytest.mark.asyncio
 async def test_delete_card(client):
     """
@@ -129,7 +181,7 @@ async def test_delete_card(client):
     assert card is None
 
 
-@pytest.mark.order(7)
+@pytest.mark.order(9)
 @pytest.mark.asyncio
 async def test_delete_card_again_should_fail(client):
     """
@@ -143,12 +195,12 @@ async def test_delete_card_again_should_fail(client):
     assert response.json()["detail"] == "Card not found in collection"
 
 
-@pytest.mark.order(8)
+@pytest.mark.order(10)
 @pytest.mark.asyncio
 async def test_invalid_parameters(client):
     """
     Validates error handling for invalid query and input parameters.
-    Covers page numbers, per_page limits, and invalid card quantities.
+    Covers page numbers, per_page limits, invalid card quantities and unknown cards.
     """
 
     # Invalid page number (must be >= 1)
@@ -159,6 +211,10 @@ async def test_invalid_parameters(client):
     resp2 = await client.get("/collection/?per_page=999", headers=HEADERS)
     assert resp2.status_code == 422
 
+    # Unknown sort key
+    resp_sort = await client.get("/collection/?sort_by=price", headers=HEADERS)
+    assert resp_sort.status_code == 422
+
     # Negative quantity not allowed when adding a card
     resp3 = await client.post(
         "/collection/add",
@@ -166,3 +222,12 @@ async def test_invalid_parameters(client):
         headers=HEADERS,
     )
     assert resp3.status_code == 422
+
+    # Card number missing from the catalog
+    resp4 = await client.post(
+        "/collection/add",
+        params={"card_number": "NOPE-000", "quantity": 1},
+        headers=HEADERS,
+    )
+    assert resp4.status_code == 400
+    assert resp4.json()["detail"] == "Unknown card number"
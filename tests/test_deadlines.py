@@ -0,0 +1,121 @@
+import contextvars
+import time
+import pytest
+from fastapi import FastAPI, HTTPException
+from httpx import AsyncClient
+from httpx import ASGITransport
+from core.deadlines import (
+    DeadlineMiddleware,
+    deadline_stats,
+    mark_deadline_exceeded,
+    route_deadline,
+    start_deadline,
+    time_remaining,
+    REQUEST_DEADLINE,
+)
+from db.sql import _create_connection
+
+# Test that the longest matching prefix sets the deadline of a route
+def test_route_deadline():
+    assert route_deadline("/cards/BT1-001") == 5
+    assert route_deadline("/cards/snapshot/") == 60
+    assert route_deadline("/") == REQUEST_DEADLINE
+
+# Test that no connection is attempted once the request deadline has passed
+def test_connection_after_deadline():
+    assert time_remaining() is None
+
+    def request():
+        state = start_deadline(0.05)
+        assert 0 < time_remaining() <= 0.05
+        time.sleep(0.06)
+        assert _create_connection() is None
+        assert state["exceeded"] is True
+
+    # Run in a copy of the context, as a request does, so the deadline does not leak
+    contextvars.copy_context().run(request)
+    assert time_remaining() is None
+
+# Test that an exception raised after the deadline is answered with 504, and other exceptions propagate
+@pytest.mark.asyncio
+async def test_deadline_middleware_exception():
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware)
+
+    @app.get("/decks/timed-out")
+    def timed_out():
+        mark_deadline_exceeded()
+        raise RuntimeError("query interrupted")
+
+    @app.get("/decks/broken")
+    def broken():
+        raise RuntimeError("bug")
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/decks/timed-out")
+        assert response.status_code == 504
+        assert deadline_stats.stats()["timeouts"]["/decks/timed-out"] == 1
+
+        with pytest.raises(RuntimeError):
+            await client.get("/decks/broken")
+
+# Test that a response built after the data layer hit the deadline, such as a catalog fallback, is kept
+@pytest.mark.asyncio
+async def test_deadline_middleware_fallback():
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware)
+
+    @app.get("/cards/fallback")
+    def fallback():
+        mark_deadline_exceeded()
+        return [{"card_number": "BT1-001"}]
+
+    @app.get("/cards/failed")
+    def failed():
+        mark_deadline_exceeded()
+        raise HTTPException(status_code=500, detail="query interrupted")
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/cards/fallback")
+        assert response.status_code == 200
+        assert response.json() == [{"card_number": "BT1-001"}]
+        assert deadline_stats.stats()["fallbacks"]["/cards/fallback"] == 1
+        assert "/cards/fallback" not in deadline_stats.stats()["timeouts"]
+
+        response = await client.get("/cards/failed")
+        assert response.status_code == 504
+
+# Test that a coalesced query ignores its callers' deadlines and each caller, the first one included, gives up at its own
+def test_coalesced_load_deadline():
+    import threading
+    from db.coalesce import StaleWhileRevalidateCache
+
+    cache = StaleWhileRevalidateCache()
+    started, release = threading.Event(), threading.Event()
+    seen = {"loads": 0}
+
+    def loader():
+        seen["loads"] += 1
+        seen["remaining"] = time_remaining()
+        started.set()
+        release.wait(1)
+        return ["card"]
+
+    def caller():
+        state = start_deadline(0.05)
+        began = time.monotonic()
+        assert cache.get("full", loader) is None
+        assert time.monotonic() - began < 0.5
+        assert state["exceeded"]
+
+    # The caller that starts the load and one that joins it
+    contextvars.copy_context().run(caller)
+    assert started.wait(1)
+    contextvars.copy_context().run(caller)
+
+    release.set()
+    assert cache.get("full", loader) == ["card"]
+    assert seen["loads"] == 1
+    assert seen["remaining"] is None
@@ -121,6 +121,86 @@ async def test_update_card_quantity(client):
 
 @pytest.mark.order(7)
 @pytest.mark.asyncio
+async def test_get_deck_cards_expanded(client):
+    """
+    Verify that expand=full returns complete card details with alternatives.
+    """
+    if deck_id is None or not card_added_to_deck:
+        pytest.skip("Previous tests did not complete successfully")
+
+    response = await client.get(
+        f"/decks/{deck_id}/cards",
+        params={"expand": "full", "include_alternatives": True},
+        headers=HEADERS
+    )
+    assert response.status_code == 200
+    card = next((c for c in response.json() if c["card_number"] == TEST_CARD_NUMBER), None)
+    assert card is not None
+    assert card["quantity"] == 5
+
+    expected_fields = [
+        "id", "card_number", "name", "dp", "card_type", "rarity",
+        "color_one", "color_two", "color_three", "image_url", "cost",
+        "stage", "attribute", "type_one", "type_two",
+        "evolution_cost_one", "evolution_cost_two",
+        "effect", "evolution_effect", "security_effect",
+        "bt_abbreviation", "alternative", "alternatives"
+    ]
+    for field in expected_fields:
+        assert field in card
+
+
+@pytest.mark.order(8)
+@pytest.mark.asyncio
+async def test_card_reverse_index(client):
+    """
+    Verify that the card reports the deck that uses it and the committed quantity.
+    """
+    if deck_id is None or not card_added_to_deck:
+        pytest.skip("Previous tests did not complete successfully")
+
+    response = await client.get(f"/cards/{TEST_CARD_NUMBER}/decks", headers=HEADERS)
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-cache"
+    data = response.json()
+    assert "owned_quantity" in data
+    assert data["committed_quantity"] >= 5
+
+    deck = next((d for d in data["decks"] if d["deck_id"] == deck_id), None)
+    assert deck is not None
+    assert deck["name"] == TEST_DECK_NAME
+    assert deck["quantity"] == 5
+
+    # Unknown card numbers are rejected from the catalog
+    response = await client.get("/cards/ZZ9-999/decks", headers=HEADERS)
+    assert response.status_code == 404
+
+
+@pytest.mark.order(9)
+@pytest.mark.asyncio
+async def test_deck_suggestions(client):
+    """
+    Verify that suggestions never include cards already in the deck.
+    """
+    if deck_id is None or not card_added_to_deck:
+        pytest.skip("Previous tests did not complete successfully")
+
+    response = await client.get(
+        f"/decks/{deck_id}/suggestions", params={"limit": 5}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    suggestions = response.json()
+    assert isinstance(suggestions, list)
+    assert len(suggestions) <= 5
+
+    for suggestion in suggestions:
+        assert suggestion["card_number"] != TEST_CARD_NUMBER
+        assert "score" in suggestion
+        assert "co_occurrences" in suggestion
+
+
+@pytest.mark.order(10)
+@pytest.mark.asyncio
 async def test_remove_card_from_deck(client):
     """
     Remove the test card from the deck completely.
@@ -137,7 +217,7 @@ async def test_remove_card_from_deck(client):
     assert response_check.status_code == 404
 
 
-@pytest.mark.order(8)
+@pytest.mark.order(11)
 @pytest.mark.asyncio
 async def test_invalid_parameters(client):
     """